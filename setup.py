@@ -28,14 +28,25 @@ def setup_package():
         url="https://github.com/SoulXP/adrtools",
         entry_points={
             'console_scripts': [
+                'adr = cltools.adr:main',
                 'adr-pftscript2tsv = cltools.pftscript2tsv:main',
                 'adr-pftgenspeakers = cltools.pftgenspeakers:main',
                 'adr-pftgetcharacters = cltools.pftgetcharacters:main',
+                'adr-pftsearch = cltools.pftsearch:main',
                 'adr-mediaruntime = cltools.mediaruntime:main',
                 'adr-mergecues = cltools.mergecues:main',
+                'adr-mergereels = cltools.mergereels:main',
+                'adr-cueconflicts = cltools.cueconflicts:main',
                 'adr-cuedensity = cltools.cuedensity:main',
+                'adr-cuegaps = cltools.cuegaps:main',
                 'adr-worddensity = cltools.worddensity:main',
-                'adr-characterdensity = cltools.characterdensity:main'
+                'adr-characterdensity = cltools.characterdensity:main',
+                'adr-pipeline = cltools.pipeline:main',
+                'adr-sessionplan = cltools.sessionplan:main',
+                'adr-daemon = cltools.adrdaemon:main',
+                'adr-benchimports = bench.importtime:main',
+                'adr-bench = bench.harness:main',
+                'adr-benchsynthetic = bench.synthetic:main'
             ]
         },
         license="MIT",
@@ -46,6 +57,7 @@ def setup_package():
         author_email="s.olivier1194@gmail.com",
         platforms=["Windows", "Linux", "Unix", "Mac OS-X"],
         install_requires=['python-docx', 'tableschema', 'fuzzywuzzy', 'pandas', 'termcolor', 'python-Levenshtein'],
+        extras_require={'columnar': ['pyarrow']},
         classifiers=[
             "Development Status :: 1 - Planning",
             "License :: OSI Approved :: MIT License",
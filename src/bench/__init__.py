@@ -0,0 +1 @@
+# Benchmarks are run through their own entry points
@@ -0,0 +1,224 @@
+import argparse
+import json
+import os
+import platform
+import re
+import subprocess as sp
+import sys
+import tempfile
+import time
+from bench.synthetic import generate_fixtures
+
+PROGRAM_NAME = "bench"
+
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+#  @SECTION: Globals
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+
+
+SIZES_DEFAULT = [200, 2000]
+WORKERS_DEFAULT = [1, 4]
+THRESHOLD_DEFAULT = 0.2
+STAGES = ['script_to_list', 'normalised_script', 'merge_cues', 'cuedensity', 'worddensity', 'characterdensity']
+TOOLS = {
+    'pftscript2tsv': lambda f, out: [*f['scripts'], '--schema', f['schema'], '--speaker-cfg', f['speaker_cfg'], '--out', out],
+    'mergecues': lambda f, out: [*f['cues'], '--out', out],
+    'cuedensity': lambda f, out: [*f['cues'], '--out', out],
+    'worddensity': lambda f, out: [*f['cues'], '--out', out],
+    'characterdensity': lambda f, out: [*f['cues'], '--out', out],
+}
+TOOL_OUTPUTS = {
+    'pftscript2tsv': lambda f, out: output_paths(f['scripts'], out, 'gen.TAB'),
+    'mergecues': lambda f, out: output_paths(f['cues'], out, 'merged.TAB'),
+    'cuedensity': lambda f, out: output_paths(f['cues'], out, 'cuedensity.csv'),
+    'worddensity': lambda f, out: output_paths(f['cues'], out, 'worddensity.csv'),
+    'characterdensity': lambda f, out: output_paths(f['cues'], out, 'characterdensity.csv'),
+}
+# cltools report a file they could not process with a '[!]' line, possibly coloured, and go on
+FAILURE_MARKER = re.compile(r'\[(?:\x1b\[[\d;]*m)*!(?:\x1b\[[\d;]*m)*\]')
+
+
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+#  @SECTION: Timing
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+
+# every measurement is the best of several repeats, in seconds, keyed '<name>@<rows>' for stages
+# and '<tool>@<rows>x<workers>' for cltools
+
+
+def best_time(run, repeat):
+    best = None
+    for _ in range(max(1, repeat)):
+        start = time.perf_counter()
+        run()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    return best
+
+
+def stage_runs(fixtures):
+    from cues import density_timeline, merge_cues, program_frames, read_cues, script_lines_to_cues
+    from pft import normalised_script, script_to_list
+
+    script = fixtures['scripts'][0]
+    cues_path = fixtures['cues'][0]
+    normalised = normalised_script(script, fixtures['schema'], fixtures['speaker_cfg'])
+    cues = script_lines_to_cues(normalised[1:])
+    read_cues(cues_path, ['tcin', 'tcout'])  # keeps the lazy pandas import out of the first density timing
+
+    def density(kind):
+        columns = ['tcin', 'tcout'] if kind == 'cuedensity' else ['tcin', 'tcout', 'character', 'line']
+
+        def run():
+            x = read_cues(cues_path, columns)
+            return density_timeline(x, program_frames(x), kind)
+
+        return run
+
+    return {
+               'script_to_list': lambda: script_to_list(script, fixtures['schema']),
+               'normalised_script': lambda: normalised_script(script, fixtures['schema'], fixtures['speaker_cfg']),
+               'merge_cues': lambda: merge_cues(cues),
+               'cuedensity': density('cuedensity'),
+               'worddensity': density('worddensity'),
+               'characterdensity': density('characterdensity'),
+           }
+
+
+def output_paths(paths, out, suffix):
+    return [os.path.join(out, f'{os.path.splitext(os.path.basename(x))[0]}.{suffix}') for x in paths]
+
+
+def run_tool(tool, args, workers, env, outputs=[]):
+    # a run only counts when every expected output was written by it, so outputs of an earlier
+    # repeat are removed first
+    for p in outputs:
+        if os.path.isfile(p):
+            os.remove(p)
+
+    cmd_args = [sys.executable, '-W', 'ignore', '-m', 'cltools.adr', tool, *args, '--process-count', str(workers)]
+    result = sp.run(args=cmd_args, capture_output=True, text=True, env=env)
+    if result.returncode != 0:
+        raise Exception(f'{tool} exited with {result.returncode}: {result.stderr.strip()}')
+
+    failures = [x for x in (result.stdout + result.stderr).splitlines() if FAILURE_MARKER.search(x)]
+    if len(failures) > 0:
+        raise Exception(f'{tool} failed to process files: {failures[0].strip()}')
+
+    missing = [x for x in outputs if not os.path.isfile(x)]
+    if len(missing) > 0:
+        raise Exception(f'{tool} did not write {", ".join(os.path.basename(x) for x in missing)}')
+
+
+def run_benchmarks(sizes, workers, stages, tools, repeat, characters, scripts, seed, log=print):
+    env = dict(os.environ)
+    src_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env['PYTHONPATH'] = os.pathsep.join([src_path, *[x for x in [env.get('PYTHONPATH')] if x]])
+
+    results = {}
+    for rows in sizes:
+        with tempfile.TemporaryDirectory(prefix='adrtools-bench-') as tmp:
+            fixtures = generate_fixtures(tmp, rows, characters, scripts, seed)
+
+            runs = stage_runs(fixtures) if len(stages) > 0 else {}
+            for name in stages:
+                key = f'{name}@{rows}'
+                results[key] = best_time(runs[name], repeat)
+                log(f'{key.ljust(32)}{results[key] * 1000:>12.2f} ms')
+
+            for tool in tools:
+                for w in workers:
+                    out = os.path.join(tmp, f'out-{tool}-{w}')
+                    os.makedirs(out)
+                    key = f'{tool}@{rows}x{w}'
+                    outputs = TOOL_OUTPUTS[tool](fixtures, out)
+                    results[key] = best_time(lambda: run_tool(tool, TOOLS[tool](fixtures, out), w, env, outputs), repeat)
+                    log(f'{key.ljust(32)}{results[key] * 1000:>12.2f} ms')
+
+    return results
+
+
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+#  @SECTION: Baselines
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+
+
+def load_baseline(path):
+    if path is None or not os.path.isfile(path):
+        return None
+    with open(path, 'r') as file:
+        return json.load(file)
+
+
+def save_baseline(path, results):
+    baseline = load_baseline(path) or {'results': {}}
+    baseline['machine'] = {'python': platform.python_version(), 'platform': platform.platform(), 'cpus': os.cpu_count()}
+    baseline['results'].update(results)
+    with open(path, 'w') as file:
+        json.dump(baseline, file, indent=2, sort_keys=True)
+
+
+def compare_baseline(results, baseline, threshold=THRESHOLD_DEFAULT):
+    # returns [(key, baseline seconds, current seconds, ratio)] for results slower than the threshold allows
+    regressions = []
+    for key, seconds in results.items():
+        previous = baseline['results'].get(key)
+        if previous is not None and previous > 0 and seconds / previous > 1 + threshold:
+            regressions.append((key, previous, seconds, seconds / previous))
+
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='benchmark processing stages and cltools on synthetic scripts and cue tables')
+    parser.add_argument('--sizes', type=int, nargs='+', default=SIZES_DEFAULT,
+                        help='rows per generated script and cue table')
+    parser.add_argument('--workers', type=int, nargs='+', default=WORKERS_DEFAULT,
+                        help='process counts to run each cltool with')
+    parser.add_argument('--stages', type=str, nargs='*', default=STAGES, choices=STAGES,
+                        help='in-process stages to time')
+    parser.add_argument('--tools', type=str, nargs='*', default=list(TOOLS.keys()), choices=list(TOOLS.keys()),
+                        help='cltools to time end to end')
+    parser.add_argument('--scripts', type=int, nargs='?', default=4,
+                        help='number of scripts and cue tables each cltool processes')
+    parser.add_argument('--characters', type=int, nargs='?', default=12,
+                        help='number of distinct characters in generated data')
+    parser.add_argument('--repeat', type=int, nargs='?', default=3,
+                        help='runs per measurement; the best is kept')
+    parser.add_argument('--seed', type=int, nargs='?', default=1,
+                        help='random seed for generated data')
+    parser.add_argument('--baseline', type=str, nargs='?', default=None,
+                        help='path to baseline results to compare against')
+    parser.add_argument('--save-baseline', action='store_true',
+                        help='record these results into the baseline file')
+    parser.add_argument('--threshold', type=float, nargs='?', default=THRESHOLD_DEFAULT,
+                        help='fraction a measurement may exceed its baseline before it is flagged as a regression')
+    parser.add_argument('--results', type=str, nargs='?', default=None,
+                        help='path to write these results as JSON')
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.sizes, args.workers, args.stages, args.tools, args.repeat, args.characters, args.scripts, args.seed)
+
+    if args.results is not None:
+        with open(args.results, 'w') as file:
+            json.dump({'results': results}, file, indent=2, sort_keys=True)
+
+    baseline = load_baseline(args.baseline)
+    regressions = [] if baseline is None else compare_baseline(results, baseline, args.threshold)
+
+    if args.save_baseline:
+        if args.baseline is None:
+            print(f'{PROGRAM_NAME}: --save-baseline requires --baseline', file=sys.stderr)
+            sys.exit(1)
+        save_baseline(args.baseline, results)
+        print(f'{PROGRAM_NAME}: saved baseline to {args.baseline}')
+
+    if len(regressions) > 0:
+        for key, previous, seconds, ratio in regressions:
+            print(f'{PROGRAM_NAME}: regression: {key} took {seconds * 1000:.2f} ms, baseline {previous * 1000:.2f} ms ({ratio:.2f}x)', file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
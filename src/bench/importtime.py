@@ -0,0 +1,79 @@
+import argparse
+import json
+import os
+import subprocess as sp
+import sys
+from cltools.adr import SUBCOMMANDS
+
+PROGRAM_NAME = "benchimports"
+BUDGET_MS_DEFAULT = 150
+HEAVY_MODULES = ['pandas', 'numpy', 'docx', 'fuzzywuzzy', 'pyarrow']
+
+
+def import_time_us(module, env):
+    cmd_args = [sys.executable, '-X', 'importtime', '-c', f'import {module}']
+    result = sp.run(args=cmd_args, capture_output=True, text=True, env=env)
+    if result.returncode != 0:
+        raise Exception(result.stderr.strip().splitlines()[-1])
+
+    # import time: self [us] | cumulative | imported package
+    for line in result.stderr.splitlines():
+        parts = line.split('|')
+        if len(parts) == 3 and parts[2].rstrip() == f' {module}':
+            return int(parts[1].strip())
+
+    return 0
+
+
+def heavy_imports(module, env):
+    script = (f'import json, sys, {module}\n'
+              f'print(json.dumps([x for x in {HEAVY_MODULES} if x in sys.modules]))')
+    result = sp.run(args=[sys.executable, '-c', script], capture_output=True, text=True, env=env)
+    if result.returncode != 0:
+        raise Exception(result.stderr.strip().splitlines()[-1])
+
+    return json.loads(result.stdout)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='benchmark start-up import time of adr subcommands')
+    parser.add_argument('subcommands', type=str, nargs='*', default=[],
+                        help='subcommands to benchmark; defaults to all')
+    parser.add_argument('--repeat', type=int, nargs='?', default=5,
+                        help='number of fresh interpreters to time per subcommand')
+    parser.add_argument('--budget-ms', type=float, nargs='?', default=BUDGET_MS_DEFAULT,
+                        help='maximum allowed import time in milliseconds per subcommand')
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    src_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env['PYTHONPATH'] = os.pathsep.join([src_path, *[x for x in [env.get('PYTHONPATH')] if x]])
+
+    names = args.subcommands if len(args.subcommands) > 0 else list(SUBCOMMANDS.keys())
+    modules = [('adr', 'cltools.adr'), *[(x, SUBCOMMANDS[x][0]) for x in names]]
+
+    failures = []
+    for name, module in modules:
+        try:
+            best_us = min(import_time_us(module, env) for _ in range(max(1, args.repeat)))
+            heavy = heavy_imports(module, env)
+        except Exception as e:
+            failures.append(f'{name}: import failed: {e}')
+            continue
+
+        best_ms = best_us / 1000
+        print(f'{name.ljust(20)}{best_ms:>10.2f} ms\t{",".join(heavy) if len(heavy) > 0 else "-"}')
+
+        if best_ms > args.budget_ms:
+            failures.append(f'{name}: import time {best_ms:.2f} ms exceeds budget of {args.budget_ms} ms')
+        if len(heavy) > 0:
+            failures.append(f'{name}: imports heavy modules at start-up: {", ".join(heavy)}')
+
+    if len(failures) > 0:
+        for msg in failures:
+            print(f'{PROGRAM_NAME}: {msg}', file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
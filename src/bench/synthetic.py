@@ -0,0 +1,204 @@
+import argparse
+import json
+import os
+import random
+from chrono import frames_to_timecode, FPS_DEFAULT
+
+PROGRAM_NAME = "benchsynthetic"
+
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+#  @SECTION: Globals
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+
+
+SCHEMA_DEFAULT = {
+    'header_fields': [
+        {'key': 'id', 'synonyms': ['#']},
+        {'key': 'tcin', 'synonyms': ['Time IN']},
+        {'key': 'tcout', 'synonyms': ['Time OUT']},
+        {'key': 'speaker', 'synonyms': ['Character']},
+        {'key': 'line', 'synonyms': ['Dialogue']},
+    ]
+}
+NAME_SYLLABLES = ['ja', 'mar', 'ro', 'li', 'ken', 'sa', 'to', 'bel', 'na', 'dro', 'vi', 'el', 'an', 'tes', 'mo', 'ra']
+ROLE_NAMES = ['detective', 'doctor', 'officer', 'waiter', 'nurse', 'captain', 'teacher', 'driver']
+GLOBBED_SPEAKERS = ['Everyone', 'Multiple', 'Multiple voices']
+VARIATION_SUFFIXES = ["'s voice", ' voice', ' on phone', ' over the phone', ' thinking', ' in head', "'s inside voice", ' reading']
+LINE_WORDS = ['i', 'you', 'we', 'the', 'a', 'is', 'was', 'not', 'here', 'there', 'now', 'never', 'where', 'go', 'come',
+              'back', 'please', 'wait', 'what', 'why', 'think', 'know', 'said', 'home', 'night', 'again', 'tell', 'me',
+              'him', 'her', 'them', 'money', 'car', 'door', 'phone', 'listen', 'stop', 'right', 'okay', 'sorry']
+CASTING_GENDERS = ['M', 'F']
+
+
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+#  @SECTION: Generators
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+
+# generated data is deterministic for a given seed so benchmark inputs are identical between runs
+
+
+def synthetic_characters(count, rng):
+    names = []
+    while len(names) < count:
+        if len(names) < len(ROLE_NAMES) and rng.random() < 0.25:
+            name = ROLE_NAMES[len(names)]
+        else:
+            name = ''.join(rng.choice(NAME_SYLLABLES) for _ in range(rng.randint(2, 3)))
+        if name not in names:
+            names.append(name)
+
+    return names
+
+
+def synthetic_speaker_config(characters, rng):
+    speakers = []
+    for c in characters:
+        lo = rng.randint(2, 7) * 10
+        speakers.append({
+                            'name': c.upper(),
+                            'nicknames': [c[:max(3, len(c) - 2)]] if rng.random() < 0.3 else [],
+                            'ignore': [],
+                            'casting': {'gender': rng.choice(CASTING_GENDERS), 'lo': lo, 'hi': lo + 10},
+                        })
+
+    return {'speakers': speakers}
+
+
+def synthetic_sentence(rng, words=None):
+    count = words if words is not None else rng.randint(3, 16)
+    sentence = ' '.join(rng.choice(LINE_WORDS) for _ in range(count))
+    return sentence[0].upper() + sentence[1:] + rng.choice(['.', '?', '!', '...'])
+
+
+def synthetic_rows(rows, characters, rng, globbed=0.05, variations=0.1, multiple=0.08, addressed=0.1, fps=FPS_DEFAULT):
+    # returns [{'id', 'tcin', 'tcout', 'speaker', 'line'}] with ascending, sometimes overlapping, timecodes
+    collect = []
+    frame = int(10 * 60 * 60 * fps)
+    for i in range(rows):
+        frame += rng.randint(0, int(8 * fps))
+        length = rng.randint(int(fps // 2), int(7 * fps))
+        roll = rng.random()
+
+        if roll < globbed:
+            speaker = rng.choice(GLOBBED_SPEAKERS)
+            line = synthetic_sentence(rng)
+        elif roll < globbed + multiple:
+            speakers = rng.sample(characters, min(len(characters), rng.randint(2, 3)))
+            speaker = ', '.join(x.title() for x in speakers)
+            line = ' '.join(f'- {synthetic_sentence(rng)}' for _ in speakers)
+        elif roll < globbed + multiple + variations:
+            speaker = f'{rng.choice(characters).title()}{rng.choice(VARIATION_SUFFIXES)}'
+            line = synthetic_sentence(rng)
+        elif roll < globbed + multiple + variations + addressed:
+            speaker = f'{rng.choice(characters).title()} to {rng.choice(characters).title()}'
+            line = synthetic_sentence(rng)
+        else:
+            speaker = rng.choice(characters)
+            speaker = speaker.upper() if rng.random() < 0.5 else speaker.title()
+            line = synthetic_sentence(rng)
+
+        collect.append({
+                           'id': str(i + 1),
+                           'tcin': frames_to_timecode(frame, fps),
+                           'tcout': frames_to_timecode(frame + length, fps),
+                           'speaker': speaker,
+                           'line': line,
+                       })
+
+    return collect
+
+
+def write_synthetic_script(path, rows, schema=SCHEMA_DEFAULT):
+    from docx import Document
+
+    fields = [(x['key'], x['synonyms'][0]) for x in schema['header_fields']]
+    document = Document()
+    table = document.add_table(rows=1, cols=len(fields))
+    for cell, (_, title) in zip(table.rows[0].cells, fields):
+        cell.text = title
+
+    for r in rows:
+        cells = table.add_row().cells
+        for cell, (key, _) in zip(cells, fields):
+            cell.text = r.get(key, '')
+
+    document.save(path)
+
+
+def synthetic_cues(rows, characters, rng, fps=FPS_DEFAULT):
+    # cue records in the shape written by pftscript2tsv, one per row
+    config = {c.upper(): f"{rng.choice(CASTING_GENDERS)}{rng.randint(2, 7) * 10}-{rng.randint(2, 7) * 10 + 10}" for c in characters}
+    collect = []
+    for r in synthetic_rows(rows, characters, rng, globbed=0.0, multiple=0.0, variations=0.0, addressed=0.0, fps=fps):
+        character = r['speaker'].upper()
+        collect.append({**r, 'character': character, 'actor': config[character]})
+
+    return collect
+
+
+def write_synthetic_cue_table(path, cues):
+    # .csv tables use the legacy tab separated layout read by the density tools
+    with open(path, 'w') as file:
+        if os.path.splitext(path)[1].lower() == '.csv':
+            file.write('id\ttc_start\ttc_end\ttcin\ttcout\tcharacter\tcasting\tline\n')
+            for i, c in enumerate(cues):
+                file.write(f"{i}\t{c['tcin']}\t{c['tcout']}\t{c['tcin']}\t{c['tcout']}\t{c['character']}\t{c['actor']}\t[{c['character']}] {c['line']}\n")
+        else:
+            file.write('#\ttcin\ttcout\tcharacter\tactor\tline\n')
+            for i, c in enumerate(cues):
+                file.write(f"{i}\t{c['tcin']}\t{c['tcout']}\t{c['character']}\t{c['actor']}\t[{c['character']}] {c['line']}\n")
+
+
+def generate_fixtures(out, rows, characters=12, scripts=1, seed=1, globbed=0.05, variations=0.1, multiple=0.08, cue_ext='csv'):
+    # writes schema.json, speakers.json, BENCH_EPnn.docx scripts and BENCH_EPnn.<cue_ext> cue tables into out
+    rng = random.Random(seed)
+    names = synthetic_characters(characters, rng)
+
+    paths = {'schema': os.path.join(out, 'schema.json'), 'speaker_cfg': os.path.join(out, 'speakers.json'), 'scripts': [], 'cues': []}
+    with open(paths['schema'], 'w') as file:
+        json.dump(SCHEMA_DEFAULT, file)
+    with open(paths['speaker_cfg'], 'w') as file:
+        json.dump(synthetic_speaker_config(names, rng), file)
+
+    for i in range(scripts):
+        script_path = os.path.join(out, f'BENCH_EP{i + 1:02d}.docx')
+        write_synthetic_script(script_path, synthetic_rows(rows, names, rng, globbed, variations, multiple))
+        paths['scripts'].append(script_path)
+
+        cues_path = os.path.join(out, f'BENCH_EP{i + 1:02d}.{cue_ext}')
+        write_synthetic_cue_table(cues_path, synthetic_cues(rows, names, rng))
+        paths['cues'].append(cues_path)
+
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description='generate synthetic PFT scripts, speaker configs and cue tables')
+    parser.add_argument('out', type=str,
+                        help='output directory')
+    parser.add_argument('--rows', type=int, nargs='?', default=1000,
+                        help='rows per script and cue table')
+    parser.add_argument('--characters', type=int, nargs='?', default=12,
+                        help='number of distinct characters')
+    parser.add_argument('--scripts', type=int, nargs='?', default=1,
+                        help='number of scripts and cue tables to generate')
+    parser.add_argument('--globbed', type=float, nargs='?', default=0.05,
+                        help='fraction of rows spoken by globbed speakers such as EVERYONE')
+    parser.add_argument('--variations', type=float, nargs='?', default=0.1,
+                        help="fraction of rows spoken by speaker variations such as JOHN'S VOICE")
+    parser.add_argument('--multiple', type=float, nargs='?', default=0.08,
+                        help='fraction of rows shared by several comma separated speakers')
+    parser.add_argument('--cue-ext', type=str, nargs='?', default='csv', choices=['csv', 'TAB'],
+                        help='cue table layout: legacy csv read by the density tools or TAB as written by pftscript2tsv')
+    parser.add_argument('--seed', type=int, nargs='?', default=1,
+                        help='random seed')
+    args = parser.parse_args()
+
+    os.makedirs(args.out, exist_ok=True)
+    paths = generate_fixtures(args.out, args.rows, args.characters, args.scripts, args.seed, args.globbed, args.variations, args.multiple, args.cue_ext)
+    for p in [paths['schema'], paths['speaker_cfg'], *paths['scripts'], *paths['cues']]:
+        print(f'{PROGRAM_NAME}: wrote {p}')
+
+
+if __name__ == '__main__':
+    main()
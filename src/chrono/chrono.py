@@ -18,18 +18,27 @@ TICKS_MAX_LENGTH = MAX_SECONDS * TICKS_RESOLUTION
 #     return "CAST ME"
 
 
-def normalise_entries(entries):
-    regular_entries = [x for x in entries if re.search("^.+/.+$", x.split('\t')[4].strip()) is None]
-    globbed_entries = [x for x in entries if re.search("^.+/.+$", x.split('\t')[4].strip()) is not None]
+CHARACTER_GLOB_PATTERN = re.compile(r'^.+/.+$')
+
 
-    normalised_entries = []
-    for e in globbed_entries:
-        parts = e.split("\t")
-        characters = parts[4].split("/")
-        for c in characters:
-            normalised_entries.append(f"{parts[0].strip()}\t{parts[1].strip()}\t{parts[2].strip()}\t{parts[3].strip()}\t{c.strip()}\t{parts[5]}\t{parts[6].strip()}")
+def iter_normalised_entries(entries):
+    # lazily expands TSV entries whose character column lists several names, 'A/B/C', into one entry
+    # per name in place of the original, so the output keeps the input order and any iterable, such as
+    # an open file, is processed in constant memory; other entries pass through untouched
+    for e in entries:
+        parts = e.split('\t')
+        if len(parts) < 7 or CHARACTER_GLOB_PATTERN.match(parts[4].strip()) is None:
+            yield e
+            continue
 
-    return [*regular_entries, *normalised_entries]
+        prefix = f"{parts[0].strip()}\t{parts[1].strip()}\t{parts[2].strip()}\t{parts[3].strip()}\t"
+        suffix = f"\t{parts[5]}\t{parts[6].strip()}"
+        for c in parts[4].split('/'):
+            yield f"{prefix}{c.strip()}{suffix}"
+
+
+def normalise_entries(entries):
+    return list(iter_normalised_entries(entries))
 
 
 def ticks_to_timecode(ticks, fps=FPS_DEFAULT):
@@ -62,6 +71,19 @@ def timecode_to_frames(timecode, fps=FPS_DEFAULT):
     return (tc_parts[0] * 3600) + (tc_parts[1] * 60) + (tc_parts[2]) + (tc_parts[3] // fps)
 
 
+def frames_to_timecode(frames, fps=FPS_DEFAULT):
+    # non-drop timecode counts whole frames at the nominal rate, i.e. 30 for 29.97
+    nominal_fps = max(1, int(round(fps)))
+    h = int(frames // (3600 * nominal_fps))
+    frames %= 3600 * nominal_fps
+    m = int(frames // (60 * nominal_fps))
+    frames %= 60 * nominal_fps
+    s = int(frames // nominal_fps)
+    f = int(frames % nominal_fps)
+
+    return f"{str(h).rjust(2, '0')}:{str(m).rjust(2, '0')}:{str(s).rjust(2, '0')}:{str(f).rjust(2, '0')}"
+
+
 def timeregion_merge_sequence(sequence):
     # TODO: assert sequence is, in fact, in sequential order
     start = sequence[0]._start
@@ -70,9 +92,10 @@ def timeregion_merge_sequence(sequence):
     return TimeRegion(start, end, fps)
 
 
-def timeregion_make_subsequences(sequence, ignore=[], ideal_duration=IDEAL_SECONDS, max_duration=MAX_SECONDS):
+def iter_subsequences(sequence, ignore=[], ideal_duration=IDEAL_SECONDS, max_duration=MAX_SECONDS):
+    # streaming form of timeregion_make_subsequences; consumes any iterable of one character's entries
+    # in start order with a single entry of lookahead and yields every merged entry as soon as it closes
     sub_sequence = []
-    merged_sequences = []
 
     ideal_duration_ticks = ideal_duration * TICKS_RESOLUTION
     max_duration_ticks = max_duration * TICKS_RESOLUTION
@@ -82,9 +105,11 @@ def timeregion_make_subsequences(sequence, ignore=[], ideal_duration=IDEAL_SECON
     merged_english = ""
     actor = ""
     character = ""
-    total_entries = len(sequence)
 
-    for i, seq in enumerate(sequence):
+    entries = iter(sequence)
+    seq = next(entries, None)
+    while seq is not None:
+        next_seq = next(entries, None)
         region = seq["region"]
 
         if len(sub_sequence) == 0:
@@ -97,13 +122,14 @@ def timeregion_make_subsequences(sequence, ignore=[], ideal_duration=IDEAL_SECON
         character = seq["character"]
 
         if character in ignore:
+            seq = next_seq
             continue
 
         merge_early = False
         shared_boundary = False
         gt_max_length = False
-        if i + 1 < total_entries:
-            next_region = sequence[i + 1]['region']
+        if next_seq is not None:
+            next_region = next_seq['region']
             next_duration = (next_region._end - current_start)._ticks
 
             if next_duration >= ideal_duration_ticks * region._fps:
@@ -115,22 +141,26 @@ def timeregion_make_subsequences(sequence, ignore=[], ideal_duration=IDEAL_SECON
             if next_duration >= max_duration_ticks * region._fps:
                 gt_max_length = True
 
-        if (acc >= (ideal_duration_ticks * region._fps) and not shared_boundary) or (merge_early and not shared_boundary) or (gt_max_length) or i + 1 == total_entries:
+        if (acc >= (ideal_duration_ticks * region._fps) and not shared_boundary) or (merge_early and not shared_boundary) or (gt_max_length) or next_seq is None:
             merged_region = timeregion_merge_sequence(sub_sequence)
-            merged_sequences.append({
-                                        "age": actor,
-                                        "line": merged_english.strip(),
-                                        "character": character,
-                                        "region": merged_region,
-                                    })
-            sub_sequence.clear()
+            yield {
+                      "age": actor,
+                      "line": merged_english.strip(),
+                      "character": character,
+                      "region": merged_region,
+                  }
+            sub_sequence = []
             acc = 0.0
             current_start = 0.0
             merged_english = ""
             actor = ""
             character = ""
 
-    return merged_sequences
+        seq = next_seq
+
+
+def timeregion_make_subsequences(sequence, ignore=[], ideal_duration=IDEAL_SECONDS, max_duration=MAX_SECONDS):
+    return list(iter_subsequences(sequence, ignore, ideal_duration, max_duration))
 
 
 class Timecode:
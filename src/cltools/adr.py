@@ -0,0 +1,57 @@
+import importlib
+import sys
+
+PROGRAM_NAME = "adr"
+
+# subcommand -> (module, description); modules are only imported once selected
+SUBCOMMANDS = {
+    'pftscript2tsv': ('cltools.pftscript2tsv', 'convert PFT scripts into tab separated cue tables'),
+    'pftgenspeakers': ('cltools.pftgenspeakers', 'generate speaker configuration from castings'),
+    'pftgetcharacters': ('cltools.pftgetcharacters', 'collect character names from PFT scripts'),
+    'pftlineexamples': ('cltools.pftlineexamples', 'find line examples for characters in PFT scripts'),
+    'pftsearch': ('cltools.pftsearch', 'search dialogue across an indexed library of PFT scripts'),
+    'mediaruntime': ('cltools.mediaruntime', 'get run-times of media files'),
+    'mergecues': ('cltools.mergecues', 'merge ADR cue lines by factor'),
+    'mergereels': ('cltools.mergereels', 'merge per-reel cue tables into one programme timeline'),
+    'cueconflicts': ('cltools.cueconflicts', 'report overlapping cues, crowded stretches and run-time overruns'),
+    'cuedensity': ('cltools.cuedensity', 'compute cue density data'),
+    'cuegaps': ('cltools.cuegaps', 'report free gaps between cues and silences across programmes'),
+    'worddensity': ('cltools.worddensity', 'compute word density data'),
+    'characterdensity': ('cltools.characterdensity', 'compute character density data'),
+    'sessionplan': ('cltools.sessionplan', "pack each actor's or character's merged cues into recording sessions"),
+    'pipeline': ('cltools.pipeline', 'normalise, merge and compute densities for scripts in one pass'),
+    'daemon': ('cltools.adrdaemon', 'run a warm worker daemon for pftscript2tsv and mergecues'),
+}
+
+
+def usage():
+    width = max(len(x) for x in SUBCOMMANDS)
+    lines = [f"usage: {PROGRAM_NAME} <subcommand> [args...]", "", "subcommands:"]
+    for name, (_, description) in SUBCOMMANDS.items():
+        lines.append(f"  {name.ljust(width)}  {description}")
+    return "\n".join(lines)
+
+
+def load_subcommand(name):
+    module_name, _ = SUBCOMMANDS[name]
+    return importlib.import_module(module_name)
+
+
+def main():
+    if len(sys.argv) < 2 or sys.argv[1] in ['-h', '--help']:
+        print(usage())
+        sys.exit(0 if len(sys.argv) >= 2 else 1)
+
+    name = sys.argv[1]
+    if name not in SUBCOMMANDS:
+        print(f"{PROGRAM_NAME}: unknown subcommand '{name}'", file=sys.stderr)
+        print(usage(), file=sys.stderr)
+        sys.exit(1)
+
+    module = load_subcommand(name)
+    sys.argv = [f"{PROGRAM_NAME} {name}", *sys.argv[2:]]
+    return module.main()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+from debug.console import eprint
+from daemon.client import DAEMON_SOCKET_DEFAULT, connect_daemon, request_daemon
+import argparse
+import json
+import os
+import sys
+
+PROGRAM_NAME = "daemon"
+MEMORY_BUDGET_MB_DEFAULT = 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description='long-running worker daemon for pftscript2tsv and mergecues')
+    parser.add_argument('--socket', type=str, nargs='?', default=DAEMON_SOCKET_DEFAULT,
+                        help='path to unix socket to listen on')
+    parser.add_argument('--process-count', type=int, nargs='?', default=4,
+                        help='total worker processes to keep warm; cannot be higher than system total')
+    parser.add_argument('--memory-budget', type=int, nargs='?', default=MEMORY_BUDGET_MB_DEFAULT,
+                        help='memory budget in MB shared by the caches of all workers')
+    parser.add_argument('--max-entries', type=int, nargs='?', default=0,
+                        help='maximum cached entries per worker; 0 for no limit')
+    parser.add_argument('--status', action='store_true',
+                        help='print the status of a running daemon')
+    parser.add_argument('--stop', action='store_true',
+                        help='stop a running daemon')
+    args = parser.parse_args()
+
+    socket_path = os.path.abspath(args.socket)
+
+    if args.status or args.stop:
+        try:
+            conn = connect_daemon(socket_path)
+        except (FileNotFoundError, ConnectionRefusedError):
+            eprint(f'{PROGRAM_NAME}: no daemon is listening on {socket_path}')
+            sys.exit(1)
+
+        for message in request_daemon(conn, {'command': 'status' if args.status else 'shutdown'}):
+            print(json.dumps({k: v for k, v in message.items() if k != 'type'}, indent=4))
+        return
+
+    from daemon.server import serve
+
+    max_proc = min(max(1, args.process_count), os.cpu_count())
+    print(f'{PROGRAM_NAME}: starting on {socket_path} with {max_proc} workers')
+
+    try:
+        serve(socket_path, max_proc, args.memory_budget * 1024 * 1024, args.max_entries)
+    except KeyboardInterrupt:
+        pass
+    except Exception as e:
+        eprint(f'{PROGRAM_NAME}: {e}')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
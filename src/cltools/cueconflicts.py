@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+import argparse
+from termcolor import colored
+from chrono import FPS_DEFAULT, timecode_to_ticks
+from cues import CONFLICT_MAX_SPEAKERS_DEFAULT, MERGE_IGNORE_DEFAULT, conflict_counts, find_conflicts, format_tsv_cue, read_cues, run_time_to_ticks, write_conflicts
+from debug.console import eprint
+from utils import file_names, get_ext_files, validate_directory
+
+PROGRAM_NAME = "cueconflicts"
+CONFLICT_COLUMNS = ['tcin', 'tcout', 'character', 'actor', 'line']
+TSV_CONFLICT_COLUMNS = {'tc_start': 'tcin', 'tc_end': 'tcout', 'casting': 'actor'}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Report overlapping cues, crowded stretches and run-time overruns in cue tables')
+    parser.add_argument('paths', type=str, nargs='+',
+                        help='cue tables or directories containing them')
+    parser.add_argument('--ext', type=str, nargs='?', default='tab',
+                        help='specific files to process')
+    parser.add_argument('--recursive', action='store_true',
+                        help='search directories recursively')
+    parser.add_argument('--max-speakers', type=int, nargs='?', default=CONFLICT_MAX_SPEAKERS_DEFAULT,
+                        help='flag stretches where more characters than this speak at once')
+    parser.add_argument('--run-time', type=int, nargs='?', default=0,
+                        help='total run time in seconds of the programme; cues ending later are flagged')
+    parser.add_argument('--start', type=str, nargs='?', default=None,
+                        help='timecode the programme starts at, e.g. 10:00:00:00; by default the hour of each table\'s first cue')
+    parser.add_argument('--frame-rate', type=float, nargs='?', default=FPS_DEFAULT,
+                        help='frame rate of the cue tables')
+    parser.add_argument('--ignore', type=str, nargs='*', default=MERGE_IGNORE_DEFAULT,
+                        help='characters left out of every check')
+    parser.add_argument('--out', type=str, nargs='?', default=None,
+                        help='directory to write <title>_<episode>.conflicts.TAB reports to; otherwise conflicts are printed')
+    args = parser.parse_args()
+
+    out_path = None
+    if args.out is not None:
+        valid_out_path, out_path = validate_directory(args.out)
+        if not valid_out_path:
+            eprint(f'Please specify a valid output path\nspecified path: {out_path}')
+            sys.exit(1)
+
+    run_time_ticks = run_time_to_ticks(args.run_time, args.frame_rate)
+    start_ticks = None
+    if args.start is not None:
+        try:
+            start_ticks = timecode_to_ticks(args.start, args.frame_rate)
+        except Exception:
+            eprint(f'Please specify the start as a timecode\nspecified start: {args.start}')
+            sys.exit(1)
+
+    for data_path in get_ext_files(args.paths, args.ext, args.recursive):
+        try:
+            cues = read_cues(data_path, CONFLICT_COLUMNS, TSV_CONFLICT_COLUMNS, args.frame_rate)
+            conflicts = find_conflicts(cues, args.max_speakers, run_time_ticks, args.ignore, start_ticks, args.frame_rate)
+        except Exception as e:
+            eprint(f"{PROGRAM_NAME}: [{colored('!', 'red')}] exception was raised for file @ {data_path}")
+            eprint(f"{PROGRAM_NAME}: [{colored('!', 'red')}] reason: {e}")
+            continue
+
+        counts = conflict_counts(conflicts)
+        status = colored('!', 'red') if len(conflicts) > 0 else colored('+', 'green')
+        print(f"{PROGRAM_NAME}: [{status}] {data_path}: {', '.join(f'{v} {k}' for k, v in counts.items())}")
+
+        if out_path is not None:
+            tokens = file_names(data_path)
+            write_conflicts(os.path.join(out_path, f'{tokens[0].upper()}_{tokens[1].upper()}.conflicts.TAB'), conflicts, args.frame_rate)
+            continue
+
+        for c in conflicts:
+            print(f"  {c['kind']}\t{', '.join(c['characters'])}")
+            for i in c['cues']:
+                print(f"    {format_tsv_cue(cues[i], args.frame_rate)}")
+
+
+if __name__ == '__main__':
+    main()
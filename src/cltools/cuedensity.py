@@ -1,5 +1,7 @@
 #!/usr/bin/env python3.11
 from debug.console import eprint
+from debug.metrics import MetricsCollector, enable_metrics, metrics_file
+from debug.profiling import PROFILE_LIMIT_DEFAULT, ProfileCollector, worker_profile
 from utils import file_names, get_ext_files, group_items, validate_directory
 import os
 import sys
@@ -7,76 +9,35 @@ import argparse
 import math
 import multiprocessing as mp
 from termcolor import colored
-from chrono import timecode_to_frames
-import pandas as pd
+from cues import density_timeline, program_frames, read_cues, write_density
 
 PROGRAM_NAME = "cuedensity"
 
 
-def cue_weight(window_start, window_end, cue_start, cue_end):
-    cue_length = cue_end - cue_start
-    window_length = window_end - window_start
+def process(paths, run_time_seconds, frame_rate, ext, out, prefix, dry_run, metrics_channel=None, profile_paths=None):
+    if metrics_channel is not None:
+        enable_metrics(PROGRAM_NAME, metrics_channel)
 
-    if cue_start + cue_length >= window_start and cue_end - cue_length <= window_end:
-        mn = max(cue_start, window_start)
-        mx = min(cue_end, window_end)
-        return 1 - ((cue_length - (mx - mn)) / cue_length)
+    with worker_profile(profile_paths):
+        for data_path in paths:
+            with metrics_file(data_path):
+                try:
+                    print(f"{PROGRAM_NAME}: [{colored('-', 'yellow')}] processing file @ {data_path}")
 
-    return 0.0
+                    cues = read_cues(data_path, ['tcin', 'tcout'], fps=frame_rate)
+                    timeline = density_timeline(cues, program_frames(cues, run_time_seconds, frame_rate), PROGRAM_NAME)
 
+                except Exception as e:
+                    print(f"{PROGRAM_NAME}: [{colored('!', 'red')}] exception was raised for file @ {data_path}")
+                    print(f"{PROGRAM_NAME}: [{colored('!', 'red')}] reason: {e}")
+                    continue
 
-def get_largest_timecode(data_frame, fps):
-    sorted_data_frame = data_frame.sort_values(by=["id"], ascending=False)
-    return timecode_to_frames(sorted_data_frame.iloc[0].loc["tcout"], fps)
+                out_tokens = file_names(data_path)
+                file_name = os.path.join(out, f'{out_tokens[0].upper()}_{out_tokens[1].upper()}.{PROGRAM_NAME}.csv')
+                if not dry_run:
+                    write_density(file_name, timeline)
 
-
-def process(paths, run_time_seconds, frame_rate, ext, out, prefix, dry_run):
-    for data_path in paths:
-        try:
-            print(f"{PROGRAM_NAME}: [{colored('-', 'yellow')}] processing file @ {data_path}")
-
-            all_lines = pd.read_csv(data_path, delimiter='\t')
-            total_program_frames = run_time_seconds * frame_rate if run_time_seconds > 0 else get_largest_timecode(all_lines, frame_rate) * frame_rate
-            timeline_window_size = 100
-            program_window_size = total_program_frames // timeline_window_size
-            empty_timeline = [[x, x * program_window_size, 0.0] for x in range(timeline_window_size)]
-
-            tc_start_column = all_lines.columns.get_loc("tcin")
-            tc_end_column = all_lines.columns.get_loc("tcout")
-
-            for i, (_, line) in enumerate(all_lines.iterrows()):
-                frames_start = timecode_to_frames(line[tc_start_column], frame_rate)
-                frames_end = timecode_to_frames(line[tc_end_column], frame_rate)
-                window_start = (frames_start // program_window_size)
-                window_end = (frames_end // program_window_size) + 1
-
-                for sample_frame in empty_timeline[window_start:window_end]:
-                    current_cue_weight = cue_weight(sample_frame[0] * program_window_size,
-                                                    (sample_frame[0] * program_window_size) + program_window_size,
-                                                    frames_start,
-                                                    frames_end)
-
-                    sample_frame[2] += current_cue_weight
-
-        except Exception as e:
-            print(f"{PROGRAM_NAME}: [{colored('!', 'red')}] exception was raised for file @ {data_path}")
-            print(f"{PROGRAM_NAME}: [{colored('!', 'red')}] reason: {e}")
-            continue
-
-    out_tokens = file_names(data_path)
-    file_name = os.path.join(out, f'{out_tokens[0].upper()}_{out_tokens[1].upper()}.cuedensity.csv')
-    if not dry_run:
-        with open(file_name, 'w') as file:
-            for i, title in enumerate(["frame", "frame_start", "value"]):
-                file.write(f"{title}")
-                for j, sample_frame in enumerate(empty_timeline):
-                    file.write(f"\t{sample_frame[i]}")
-                file.write("\n")
-            file.close()
-    else:
-        pass
-
-    print(f"{PROGRAM_NAME}: [{colored('+', 'green')}] completed file @ {data_path}")
+                print(f"{PROGRAM_NAME}: [{colored('+', 'green')}] completed file @ {data_path}")
 
 
 def main():
@@ -85,6 +46,12 @@ def main():
                         help='path to CSV file containing dub cues')
     parser.add_argument('--ext', type=str, nargs='?', default='csv',
                         help='specific files to process')
+    parser.add_argument('--recursive', action='store_true',
+                        help='search directories recursively')
+    parser.add_argument('--include', type=str, nargs='+', default=None,
+                        help='only process files matching one of these glob patterns; patterns with a / match the path below the given directory')
+    parser.add_argument('--exclude', type=str, nargs='+', default=None,
+                        help='skip files and directories matching one of these glob patterns')
     parser.add_argument('--frame-rate', type=int, nargs='?', default=25,
                         help='frame rate of data in source file')
     parser.add_argument('--run-time', type=int, nargs='?', default=0,
@@ -95,6 +62,16 @@ def main():
                         help='total processes to spawn in pool; cannot be higher than system total')
     parser.add_argument('--dry-run', action='store_true',
                         help='perform a dry run')
+    parser.add_argument('--metrics', type=str, nargs='?', const='', default=None,
+                        help='record per-file, per-stage timings and counters as JSONL, by default to <out>/<tool>.metrics.jsonl, and print a summary')
+    parser.add_argument('--trace-heap', action='store_true',
+                        help='with --metrics, also record the peak python heap of each file with tracemalloc; slows processing')
+    parser.add_argument('--profile', type=str, nargs='?', const='', default=None,
+                        help='profile every worker with cProfile and merge the results, by default into <out>/<tool>.prof')
+    parser.add_argument('--profile-collapsed', type=str, nargs='?', const='', default=None,
+                        help='also sample worker stacks and write them as collapsed stacks for flamegraphs, by default to <out>/<tool>.collapsed')
+    parser.add_argument('--profile-limit', type=int, nargs='?', default=PROFILE_LIMIT_DEFAULT,
+                        help='number of functions to show in the profile report')
     args = parser.parse_args()
 
     errors = []
@@ -108,13 +85,25 @@ def main():
         sys.exit(1)
 
     max_proc = min(max(1, args.process_count), os.cpu_count())
-    all_paths = get_ext_files(args.paths, args.ext)
+    all_paths = get_ext_files(args.paths, args.ext, args.recursive, args.include, args.exclude)
     group_size = math.ceil(len(all_paths) / max_proc)
     grouped_paths = group_items(all_paths, group_size)
 
     print(f'total cpus: {os.cpu_count()}, user selected: {max_proc}')
     print(f'group size: {group_size}')
 
+    collector = None
+    if args.metrics is not None:
+        collector = MetricsCollector(os.path.abspath(args.metrics) if args.metrics != '' else os.path.join(out_path, f'{PROGRAM_NAME}.metrics.jsonl'), args.trace_heap)
+
+    profiler = None
+    if args.profile is not None or args.profile_collapsed is not None:
+        profile_path = os.path.abspath(args.profile) if args.profile else os.path.join(out_path, f'{PROGRAM_NAME}.prof')
+        collapsed_path = None
+        if args.profile_collapsed is not None:
+            collapsed_path = os.path.abspath(args.profile_collapsed) if args.profile_collapsed != '' else os.path.join(out_path, f'{PROGRAM_NAME}.collapsed')
+        profiler = ProfileCollector(profile_path, collapsed_path)
+
     pool = []
     for i, p in enumerate(grouped_paths):
         proc = mp.Process(target=process, args=(p,
@@ -123,13 +112,22 @@ def main():
                                                 args.ext,
                                                 out_path,
                                                 f'cpu{i}',
-                                                args.dry_run))
+                                                args.dry_run,
+                                                None if collector is None else collector.channel,
+                                                None if profiler is None else profiler.worker_paths()))
         proc.start()
         pool.append(proc)
 
+    if collector is not None:
+        collector.wait(pool)
+        collector.summary()
+
     for p in pool:
         p.join()
 
+    if profiler is not None:
+        profiler.finish(args.profile_limit)
+
 
 if __name__ == '__main__':
     main()
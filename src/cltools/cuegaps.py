@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+import time
+import argparse
+from termcolor import colored
+from chrono import FPS_DEFAULT, TICKS_RESOLUTION, timecode_to_ticks
+from cues import analyse_gaps, histogram_labels, programme_start, read_cues, run_time_to_ticks, write_gaps
+from debug.console import eprint
+from utils import file_names, get_ext_files, validate_directory
+
+PROGRAM_NAME = "cuegaps"
+GAP_COLUMNS = ['tcin', 'tcout', 'character']
+TSV_GAP_COLUMNS = {'tc_start': 'tcin', 'tc_end': 'tcout'}
+
+
+def print_histograms(histograms, labels, stream=sys.stdout):
+    width = max([len('character'), *[len(x) for x in histograms]])
+    print(f"{'character'.ljust(width)}{''.join(x.rjust(8) for x in labels)}{'total'.rjust(8)}", file=stream)
+    for name, counts in histograms.items():
+        print(f"{name.ljust(width)}{''.join(str(x).rjust(8) for x in counts)}{str(sum(counts)).rjust(8)}", file=stream)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Report free gaps between each character\'s cues and silences across programmes')
+    parser.add_argument('paths', type=str, nargs='+',
+                        help='cue tables or directories containing them, e.g. a whole season')
+    parser.add_argument('--ext', type=str, nargs='?', default='tab',
+                        help='specific files to process')
+    parser.add_argument('--recursive', action='store_true',
+                        help='search directories recursively')
+    parser.add_argument('--run-time', type=int, nargs='?', default=0,
+                        help='total run time in seconds of each programme; adds leading and trailing silence')
+    parser.add_argument('--start', type=str, nargs='?', default=None,
+                        help='timecode each programme starts at, e.g. 10:00:00:00; by default the hour of its first cue')
+    parser.add_argument('--frame-rate', type=float, nargs='?', default=FPS_DEFAULT,
+                        help='frame rate of the cue tables')
+    parser.add_argument('-c', '--characters', type=str, nargs='+', default=None,
+                        help='only show histograms of these characters')
+    parser.add_argument('--per-file', action='store_true',
+                        help='print histograms of every file, not only the totals')
+    parser.add_argument('--out', type=str, nargs='?', default=None,
+                        help='directory to write <title>_<episode>.gaps.TAB listings of every gap and silence to')
+    args = parser.parse_args()
+
+    out_path = None
+    if args.out is not None:
+        valid_out_path, out_path = validate_directory(args.out)
+        if not valid_out_path:
+            eprint(f'Please specify a valid output path\nspecified path: {out_path}')
+            sys.exit(1)
+
+    start_time = time.perf_counter()
+    run_time_ticks = run_time_to_ticks(args.run_time, args.frame_rate)
+    start_ticks = None
+    if args.start is not None:
+        try:
+            start_ticks = timecode_to_ticks(args.start, args.frame_rate)
+        except Exception:
+            eprint(f'Please specify the start as a timecode\nspecified start: {args.start}')
+            sys.exit(1)
+
+    wanted = None if args.characters is None else set(x.strip().upper() for x in args.characters)
+    totals = {}
+    silence_total = None
+    labels = None
+    processed = 0
+
+    for data_path in get_ext_files(args.paths, args.ext, args.recursive):
+        try:
+            cues = read_cues(data_path, GAP_COLUMNS, TSV_GAP_COLUMNS, args.frame_rate)
+            start = programme_start(cues, args.frame_rate) if start_ticks is None else start_ticks
+            analysis = analyse_gaps(cues, args.frame_rate, *((None, None) if run_time_ticks is None else (start, start + run_time_ticks)))
+        except Exception as e:
+            eprint(f"{PROGRAM_NAME}: [{colored('!', 'red')}] exception was raised for file @ {data_path}")
+            eprint(f"{PROGRAM_NAME}: [{colored('!', 'red')}] reason: {e}")
+            continue
+
+        processed += 1
+        labels = histogram_labels(analysis['edges'], args.frame_rate)
+        histograms = {k: v for k, v in analysis['histograms'].items() if wanted is None or k.upper() in wanted}
+        for name, counts in histograms.items():
+            totals[name] = [a + b for a, b in zip(totals.get(name, [0] * len(counts)), counts)]
+        silence_total = analysis['silence_histogram'] if silence_total is None else [a + b for a, b in zip(silence_total, analysis['silence_histogram'])]
+
+        silence_seconds = sum(x['length'] for x in analysis['silences']) / (args.frame_rate * TICKS_RESOLUTION)
+        print(f"{PROGRAM_NAME}: [{colored('+', 'green')}] {data_path}: {len(analysis['gaps'])} gaps, "
+              f"{len(analysis['silences'])} silences totalling {silence_seconds:.1f}s")
+        if args.per_file:
+            print_histograms({**histograms, '(silence)': analysis['silence_histogram']}, labels)
+
+        if out_path is not None:
+            tokens = file_names(data_path)
+            write_gaps(os.path.join(out_path, f'{tokens[0].upper()}_{tokens[1].upper()}.gaps.TAB'), analysis, args.frame_rate)
+
+    if processed == 0:
+        eprint(f'{PROGRAM_NAME}: no cue tables were analysed')
+        sys.exit(1)
+
+    print('')
+    print_histograms({**dict(sorted(totals.items())), '(silence)': silence_total}, labels)
+    eprint(f'{PROGRAM_NAME}: {processed} files in {time.perf_counter() - start_time:.2f}s')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,74 +1,198 @@
 import argparse
+import asyncio
 import json
 import os
 import subprocess as sp
+import sys
+from fractions import Fraction
+from chrono import frames_to_timecode, FPS_DEFAULT
+from debug.console import eprint
+from media import read_native_runtime
+from utils import discover_files, file_signatures
 
-TICK_RATE = 1000000
-
-def hms_parts(hms):
-    split_hms = hms.split(':')
-    h = ''
-    m = ''
-    s = ''
-
-    if len(split_hms[0]) < 2:
-        h += '0' + split_hms[0]
-    else:
-        h += split_hms[0]
-    if len(split_hms[1]) < 2:
-        m += '0' + split_hms[1]
-    else:
-        m += split_hms[1]
-    if len(split_hms[2]) < 2:
-        s += '0' + split_hms[2]
-    else:
-        s += split_hms[2]
-
-    return h, m, s
-
-def ffprobe_dur_to_tc(path):
-    # TODO: check if ffprobe is in user path
-    abs_path = os.path.abspath(path)
-    cmd_args = ['ffprobe',
-                '-v',
-                'quiet',
+PROGRAM_NAME = "mediaruntime"
+MEDIA_EXTENSIONS_DEFAULT = ['mov', 'mp4', 'mxf', 'wav']
+CACHE_PATH_DEFAULT = os.path.join(os.path.expanduser('~'), '.cache', 'adrtools', 'mediaruntime.json')
+FFPROBE_ARGS = ['-v',
+                'error',
                 '-select_streams',
                 'v:0',
                 '-show_entries',
                 'stream=duration,r_frame_rate',
-                '-sexagesimal',
                 '-of',
-                'json',
-                '-i',
-                abs_path]
+                'json']
+
+
+def ffprobe_cmd_args(path):
+    return ['ffprobe', *FFPROBE_ARGS, '-i', os.path.abspath(path)]
+
+
+def check_ffprobe_result(returncode, stderr):
+    # a failed probe can still print an empty but valid json document, so the exit status is checked first
+    if returncode != 0:
+        message = stderr.strip().splitlines()
+        raise Exception(f'ffprobe exited with {returncode}' + (f': {message[-1]}' if len(message) > 0 else ''))
+
+
+def parse_ffprobe_result(stdout):
+    result = json.loads(stdout)
+    if len(result.get('streams', [])) == 0:
+        raise Exception('no video stream found')
+
+    stream = result['streams'][0]
+    frame_rate = Fraction(stream['r_frame_rate'])
+    frames = round(Fraction(stream['duration']) * frame_rate)
+
+    return frames, frame_rate
+
+
+def runtime_entry(frames, frame_rate, start_frames=None):
+    return {
+               'frames': frames,
+               'fps': str(frame_rate),
+               'tc': frames_to_timecode(frames, frame_rate),
+               'start_tc': None if start_frames is None else frames_to_timecode(start_frames, frame_rate),
+           }
+
+
+def native_runtime(path, fps=FPS_DEFAULT):
+    try:
+        result = read_native_runtime(path, fps)
+    except Exception:
+        return None
+
+    if result is None:
+        return None
+
+    return runtime_entry(result['frames'], result['fps'], result['start_frames'])
+
+
+def ffprobe_dur_to_tc(path):
+    # TODO: check if ffprobe is in user path
+    result = sp.run(args=ffprobe_cmd_args(path), capture_output=True, text=True)
+    check_ffprobe_result(result.returncode, result.stderr)
+    frames, frame_rate = parse_ffprobe_result(result.stdout)
+
+    return frames_to_timecode(frames, frame_rate), float(frame_rate)
+
+
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+#  @SECTION: Batch Probing
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+
+
+async def ffprobe_async(path, semaphore):
+    async with semaphore:
+        proc = await asyncio.create_subprocess_exec(*ffprobe_cmd_args(path),
+                                                    stdout=asyncio.subprocess.PIPE,
+                                                    stderr=asyncio.subprocess.PIPE)
+        stdout, stderr = await proc.communicate()
+
+    check_ffprobe_result(proc.returncode, stderr.decode(errors='replace'))
+    frames, frame_rate = parse_ffprobe_result(stdout.decode())
+    return runtime_entry(frames, frame_rate)
+
+
+async def ffprobe_many(paths, jobs):
+    semaphore = asyncio.Semaphore(max(1, jobs))
+    return await asyncio.gather(*[ffprobe_async(p, semaphore) for p in paths], return_exceptions=True)
+
 
-    result = json.loads(sp.run(args=cmd_args, capture_output=True, text=True).stdout)
+def load_cache(path):
+    if path is None or not os.path.isfile(path):
+        return {}
 
-    raw_duration = result['streams'][0]['duration'].split('.')
-    frame_rate = float(result['streams'][0]['r_frame_rate'].split('/')[0])
-    h, m, s = hms_parts(raw_duration[0])
-    dur_frames = int(round(float(raw_duration[1]) / TICK_RATE * frame_rate))
+    try:
+        with open(path, 'r') as file:
+            return json.load(file)
+    except Exception:
+        return {}
 
-    tc = f'{h}:{m}:{s}:'
-    if dur_frames < 10:
-        tc += '0' + str(dur_frames)
-    else:
-        tc += str(dur_frames)
 
-    return tc, frame_rate
+def save_cache(path, cache):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w') as file:
+        json.dump(cache, file)
+    os.replace(tmp_path, path)
+
+
+def probe_paths(paths, jobs=os.cpu_count(), cache=None, fps=FPS_DEFAULT, native=True, files=None):
+    # maps each path to its run-time entry, or the exception raised while probing it;
+    # container headers are read directly where possible and ffprobe is only spawned for the rest
+    cache = {} if cache is None else cache
+    results = {}
+    pending = []
+
+    signatures = file_signatures(paths, files)
+    for p in paths:
+        size, mtime_ns = signatures[p]
+        cached = cache.get(p)
+        if cached is not None and cached['size'] == size and cached['mtime_ns'] == mtime_ns:
+            results[p] = cached['runtime']
+            continue
+
+        entry = native_runtime(p, fps) if native else None
+        if entry is not None:
+            results[p] = entry
+        else:
+            pending.append((p, size, mtime_ns))
+
+    probed = asyncio.run(ffprobe_many([x[0] for x in pending], jobs)) if len(pending) > 0 else []
+    for (p, size, mtime_ns), entry in zip(pending, probed):
+        results[p] = entry
+        if not isinstance(entry, BaseException):
+            cache[p] = {'size': size, 'mtime_ns': mtime_ns, 'runtime': entry}
+
+    return results
 
 
 def main():
     parser = argparse.ArgumentParser(description='Get run-times of video files in folder')
-    parser.add_argument('path', nargs='?', type=str,
-                        help='path to file or directory to search for files')
-    parser.add_argument('--ext', nargs=1, type=str, default='',
-                        help='extension of file to process')
+    parser.add_argument('paths', nargs='+', type=str,
+                        help='paths to files or directories to search for files')
+    parser.add_argument('--ext', nargs='+', type=str, default=MEDIA_EXTENSIONS_DEFAULT,
+                        help='extensions of files to process')
+    parser.add_argument('--recursive', action='store_true',
+                        help='search directories recursively')
+    parser.add_argument('--include', type=str, nargs='+', default=None,
+                        help='only process files matching one of these glob patterns; patterns with a / match the path below the given directory')
+    parser.add_argument('--exclude', type=str, nargs='+', default=None,
+                        help='skip files and directories matching one of these glob patterns')
+    parser.add_argument('--jobs', type=int, nargs='?', default=os.cpu_count(),
+                        help='maximum number of concurrent ffprobe processes')
+    parser.add_argument('--cache', type=str, nargs='?', default=CACHE_PATH_DEFAULT,
+                        help='path to cache file of previously probed run-times')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='ignore and do not update the run-time cache')
+    parser.add_argument('--no-native', action='store_true',
+                        help='always use ffprobe instead of reading container headers directly')
+    parser.add_argument('--frame-rate', type=float, nargs='?', default=FPS_DEFAULT,
+                        help='frame rate used for audio-only files such as WAV/BWF')
     args = parser.parse_args()
 
-    tc, fps = ffprobe_dur_to_tc(args.path)
+    all_files = discover_files(args.paths, args.ext, args.recursive, args.include, args.exclude)
+    all_paths = [x['path'] for x in all_files]
+
+    if len(all_paths) == 0:
+        eprint(f'{PROGRAM_NAME}: no files found with extensions: {", ".join(args.ext)}')
+        sys.exit(1)
+
+    cache_path = None if args.no_cache else os.path.abspath(args.cache)
+    cache = load_cache(cache_path)
+
+    results = probe_paths(all_paths, args.jobs, cache, args.frame_rate, not args.no_native, {x['path']: x for x in all_files})
+
+    if cache_path is not None:
+        save_cache(cache_path, cache)
 
-    print(f'{args.path}: fps: {fps}\trun time: {tc}')
+    for p in all_paths:
+        entry = results[p]
+        if isinstance(entry, BaseException):
+            eprint(f'{p}: error: {entry}')
+            continue
+        start = f'\tstart: {entry["start_tc"]}' if entry.get('start_tc') is not None else ''
+        print(f'{p}: fps: {float(Fraction(entry["fps"]))}\trun time: {entry["tc"]}\tframes: {entry["frames"]}{start}')
 
 
 if __name__ == "__main__":
@@ -1,5 +1,9 @@
 from debug.console import eprint
-from pft import normalised_script
+from debug.metrics import MetricsCollector, enable_metrics, metrics_file
+from debug.profiling import PROFILE_LIMIT_DEFAULT, ProfileCollector, worker_profile
+from cues import (CUE_TABLE_FORMATS, SPILL_CHUNK_ROWS_DEFAULT, cue_table_name, format_tsv_cue, iter_cues, merge_cues, merge_cues_chunked,
+                  read_cues, write_cues)
+from daemon.client import DAEMON_SOCKET_DEFAULT, submit_to_daemon
 from utils import file_names, get_ext_files, group_items, validate_directory
 import os
 import sys
@@ -7,73 +11,55 @@ import argparse
 import math
 import multiprocessing as mp
 from termcolor import colored
-from chrono import timeregion_make_subsequences, TimeRegion, IDEAL_SECONDS, MAX_SECONDS
-import pandas as pd
+from chrono import IDEAL_SECONDS, MAX_SECONDS
 
 PROGRAM_NAME = "mergecues"
-
-
-def process(paths, ideal_duration, max_duration, ext, out, prefix, dry_run):
-    for data_path in paths:
-        all_lines = None
-        sorted_cues = []
-
-        try:
-            print(f"{PROGRAM_NAME}: [{colored('-', 'yellow')}] processing file @ {data_path}")
-            all_lines = pd.read_csv(data_path, delimiter='\t')
-            character_column = all_lines.columns.get_loc("character")
-            casting_column = all_lines.columns.get_loc("casting")
-            line_column = all_lines.columns.get_loc("line")
-            tc_start_column = all_lines.columns.get_loc("tc_start")
-            tc_end_column = all_lines.columns.get_loc("tc_end")
-
-
-            characters = {c[character_column]: [] for (_, c) in all_lines.iterrows()}
-
-            for (k, v) in characters.items():
-                cues = timeregion_make_subsequences(sorted([{
-                                                        'age': x[casting_column],
-                                                        'character': k,
-                                                        'line': x[line_column].replace(f"[{k}]", ""),
-                                                        'region': TimeRegion.from_timecode_strings(x[tc_start_column], x[tc_end_column])
-                                                    } for (_, x) in all_lines.iterrows() if k == x[character_column]], key=lambda x: x["region"]._start), ["UNKNOWN"],
-                                                    ideal_duration,
-                                                    max_duration)
-                characters[k] = cues
-
-            flattened_cues = []
-            for k, v in characters.items():
-                for e in v:
-                    flattened_cues.append({
-                                              'start': str(e['region']._start),
-                                              'end': str(e['region']._end),
-                                              'actor': e['age'],
-                                              'character': k,
-                                              'line': e['line'],
-                                          })
-
-            sorted_cues = sorted(flattened_cues, key=lambda x: x['start'])
-
-        except Exception as e:
-            print(f"{PROGRAM_NAME}: [{colored('!', 'red')}] exception was raised for file @ {data_path}")
-            print(f"{PROGRAM_NAME}: [{colored('!', 'red')}] reason: {e}")
-            continue
-
-        out_tokens = file_names(data_path)
-        file_name = os.path.join(out, f'{out_tokens[0].upper()}_{out_tokens[1].upper()}.merged.TAB')
-        if not dry_run:
-            with open(file_name, 'w') as file:
-                file.write("#\ttcin\ttcout\tcharacter\tactor\tline\n")
-                for i, line in enumerate(sorted_cues):
-                    file.write(f"{i}\t{line['start']}\t{line['end']}\t{line['character']}\t{line['actor']}\t[{line['character']}] {line['line']}\n")
-                file.close()
-            # all_lines.clear()
-        else:
-            print('')
-            for line in sorted_cues:
-                print(f"{line['start']}\t{line['end']}\t{line['character']}\t{line['actor']}\t[{line['character']}] {line['line']}")
-
-        print(f"{PROGRAM_NAME}: [{colored('+', 'green')}] completed file @ {data_path}")
+MERGE_COLUMNS = ['tcin', 'tcout', 'character', 'actor', 'line']
+TSV_MERGE_COLUMNS = {'tc_start': 'tcin', 'tc_end': 'tcout', 'casting': 'actor'}
+
+
+def process(paths, ideal_duration, max_duration, ext, out, out_format, prefix, dry_run, metrics_channel=None, profile_paths=None,
+            chunk_rows=None, spill_dir=None):
+    if metrics_channel is not None:
+        enable_metrics(PROGRAM_NAME, metrics_channel)
+
+    with worker_profile(profile_paths):
+        for data_path in paths:
+            with metrics_file(data_path):
+                sorted_cues = []
+
+                try:
+                    print(f"{PROGRAM_NAME}: [{colored('-', 'yellow')}] processing file @ {data_path}")
+                    if chunk_rows is not None:
+                        # out of core; nothing is read until write_cues or the dry run consumes the generator
+                        sorted_cues = merge_cues_chunked(iter_cues(data_path, TSV_MERGE_COLUMNS), ideal_duration, max_duration,
+                                                         chunk_rows=chunk_rows, spill_dir=spill_dir)
+                    else:
+                        cues = read_cues(data_path, MERGE_COLUMNS, TSV_MERGE_COLUMNS)
+                        sorted_cues = merge_cues(cues, ideal_duration, max_duration)
+
+                except Exception as e:
+                    print(f"{PROGRAM_NAME}: [{colored('!', 'red')}] exception was raised for file @ {data_path}")
+                    print(f"{PROGRAM_NAME}: [{colored('!', 'red')}] reason: {e}")
+                    continue
+
+                file_name = cue_table_name(out, file_names(data_path), 'merged', out_format)
+                try:
+                    if not dry_run:
+                        write_cues(file_name, sorted_cues, out_format)
+                    else:
+                        print('')
+                        for line in sorted_cues:
+                            print(format_tsv_cue(line))
+                except Exception as e:
+                    # only chunked merges fail here, while their cues are streamed out
+                    if not dry_run and os.path.exists(file_name):
+                        os.remove(file_name)
+                    print(f"{PROGRAM_NAME}: [{colored('!', 'red')}] exception was raised for file @ {data_path}")
+                    print(f"{PROGRAM_NAME}: [{colored('!', 'red')}] reason: {e}")
+                    continue
+
+                print(f"{PROGRAM_NAME}: [{colored('+', 'green')}] completed file @ {data_path}")
 
 
 def main():
@@ -82,16 +68,40 @@ def main():
                         help='source file paths containing tab seperated files')
     parser.add_argument('--ext', type=str, nargs='?', default='csv',
                         help='specific files to process')
+    parser.add_argument('--recursive', action='store_true',
+                        help='search directories recursively')
+    parser.add_argument('--include', type=str, nargs='+', default=None,
+                        help='only process files matching one of these glob patterns; patterns with a / match the path below the given directory')
+    parser.add_argument('--exclude', type=str, nargs='+', default=None,
+                        help='skip files and directories matching one of these glob patterns')
     parser.add_argument('--ideal-duration', type=int, nargs='?', default=IDEAL_SECONDS,
                         help='ideal duration of merged line')
     parser.add_argument('--max-duration', type=int, nargs='?', default=MAX_SECONDS,
                         help='maximum duration of merged line')
     parser.add_argument('--out', type=str, nargs='?', default='.',
                         help='path to output directory for destination file')
+    parser.add_argument('--format', type=str, nargs='?', default='tab', choices=list(CUE_TABLE_FORMATS.keys()),
+                        help='output table format; parquet and arrow require pyarrow')
+    parser.add_argument('--chunk-rows', type=int, nargs='?', const=SPILL_CHUNK_ROWS_DEFAULT, default=None,
+                        help=f'merge out of core, holding at most this many rows at once and spilling sorted runs to disk; default {SPILL_CHUNK_ROWS_DEFAULT}')
+    parser.add_argument('--spill-dir', type=str, nargs='?', default=None,
+                        help='with --chunk-rows, directory for temporary spill files instead of the system temporary directory')
     parser.add_argument('--process-count', type=int, nargs='?', default=4,
                         help='total processes to spawn in pool; cannot be higher than system total')
     parser.add_argument('--dry-run', action='store_true',
                         help='perform a dry run')
+    parser.add_argument('--daemon', type=str, nargs='?', const=DAEMON_SOCKET_DEFAULT, default=None,
+                        help='submit files to a running adr-daemon, optionally at the given socket path')
+    parser.add_argument('--metrics', type=str, nargs='?', const='', default=None,
+                        help='record per-file, per-stage timings and counters as JSONL, by default to <out>/<tool>.metrics.jsonl, and print a summary')
+    parser.add_argument('--trace-heap', action='store_true',
+                        help='with --metrics, also record the peak python heap of each file with tracemalloc; slows processing')
+    parser.add_argument('--profile', type=str, nargs='?', const='', default=None,
+                        help='profile every worker with cProfile and merge the results, by default into <out>/<tool>.prof')
+    parser.add_argument('--profile-collapsed', type=str, nargs='?', const='', default=None,
+                        help='also sample worker stacks and write them as collapsed stacks for flamegraphs, by default to <out>/<tool>.collapsed')
+    parser.add_argument('--profile-limit', type=int, nargs='?', default=PROFILE_LIMIT_DEFAULT,
+                        help='number of functions to show in the profile report')
     args = parser.parse_args()
 
     errors = []
@@ -99,6 +109,14 @@ def main():
     if not valid_out_path:
         errors.append(f'Please specify a valid output path\nspecified path: {out_path}')
 
+    if args.chunk_rows is not None:
+        if args.chunk_rows < 1:
+            errors.append(f'Please specify a positive chunk size\nspecified rows: {args.chunk_rows}')
+        if args.format != 'tab':
+            errors.append(f'Chunked merging only writes tab tables\nspecified format: {args.format}')
+        if args.spill_dir is not None and not os.path.isdir(args.spill_dir):
+            errors.append(f'Please specify a valid spill directory\nspecified path: {args.spill_dir}')
+
     if len(errors) > 0:
         for msg in errors:
             eprint(msg)
@@ -106,13 +124,39 @@ def main():
 
     max_proc = min(max(1, args.process_count), os.cpu_count())
 
-    all_paths = get_ext_files(args.paths, args.ext)
+    all_paths = get_ext_files(args.paths, args.ext, args.recursive, args.include, args.exclude)
+    if args.daemon is not None and args.chunk_rows is not None:
+        eprint(f'{PROGRAM_NAME}: chunked merges are not sent to the daemon, processing locally')
+    elif args.daemon is not None:
+        options = {'columns': MERGE_COLUMNS,
+                   'renames': TSV_MERGE_COLUMNS,
+                   'ideal_duration': args.ideal_duration,
+                   'max_duration': args.max_duration,
+                   'out': out_path,
+                   'format': args.format,
+                   'dry_run': args.dry_run}
+        if submit_to_daemon(os.path.abspath(args.daemon), PROGRAM_NAME, 'mergecues', all_paths, options):
+            return
+        eprint(f'{PROGRAM_NAME}: no daemon is listening on {args.daemon}, processing locally')
+
     group_size = math.ceil(len(all_paths) / max_proc)
     grouped_paths = group_items(all_paths, group_size)
 
     print(f'total cpus: {os.cpu_count()}, user selected: {max_proc}')
     print(f'group size: {group_size}')
 
+    collector = None
+    if args.metrics is not None:
+        collector = MetricsCollector(os.path.abspath(args.metrics) if args.metrics != '' else os.path.join(out_path, f'{PROGRAM_NAME}.metrics.jsonl'), args.trace_heap)
+
+    profiler = None
+    if args.profile is not None or args.profile_collapsed is not None:
+        profile_path = os.path.abspath(args.profile) if args.profile else os.path.join(out_path, f'{PROGRAM_NAME}.prof')
+        collapsed_path = None
+        if args.profile_collapsed is not None:
+            collapsed_path = os.path.abspath(args.profile_collapsed) if args.profile_collapsed != '' else os.path.join(out_path, f'{PROGRAM_NAME}.collapsed')
+        profiler = ProfileCollector(profile_path, collapsed_path)
+
     pool = []
     for i, p in enumerate(grouped_paths):
         proc = mp.Process(target=process, args=(p,
@@ -120,14 +164,26 @@ def main():
                                                 args.max_duration,
                                                 args.ext,
                                                 out_path,
+                                                args.format,
                                                 f'cpu{i}',
-                                                args.dry_run))
+                                                args.dry_run,
+                                                None if collector is None else collector.channel,
+                                                None if profiler is None else profiler.worker_paths(),
+                                                args.chunk_rows,
+                                                None if args.spill_dir is None else os.path.abspath(args.spill_dir)))
         proc.start()
         pool.append(proc)
 
+    if collector is not None:
+        collector.wait(pool)
+        collector.summary()
+
     for p in pool:
         p.join()
 
+    if profiler is not None:
+        profiler.finish(args.profile_limit)
+
 
 if __name__ == '__main__':
     main()
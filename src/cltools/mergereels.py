@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+import argparse
+from termcolor import colored
+from chrono import FPS_DEFAULT, IDEAL_SECONDS, MAX_SECONDS
+from cues import CUE_TABLE_FORMATS, cue_table_name, format_tsv_cue, iter_cues, merge_cues, merge_reels, signed_timecode_to_ticks, write_cues
+from debug.console import eprint
+from utils import file_names, get_ext_files, validate_directory
+
+PROGRAM_NAME = "mergereels"
+TSV_REEL_COLUMNS = {'tc_start': 'tcin', 'tc_end': 'tcout', 'casting': 'actor'}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Merge per-reel cue tables into one programme timeline')
+    parser.add_argument('paths', type=str, nargs='+',
+                        help='cue tables of the reels, in reel order; folders are expanded in name order')
+    parser.add_argument('--ext', type=str, nargs='?', default='tab',
+                        help='specific files to process')
+    parser.add_argument('--offsets', type=str, nargs='+', default=None,
+                        help='signed timecode added to each reel, one per reel, e.g. -01:00:00:00 -01:59:59:24')
+    parser.add_argument('--reel-lengths', type=str, nargs='+', default=None,
+                        help='timecode length of each reel; reels are moved from their own hour to follow each other from --start')
+    parser.add_argument('--start', type=str, nargs='?', default='00:00:00:00',
+                        help='programme timecode of the first reel when --reel-lengths is given')
+    parser.add_argument('--frame-rate', type=float, nargs='?', default=FPS_DEFAULT,
+                        help='frame rate of the cue tables')
+    parser.add_argument('--merge', action='store_true',
+                        help='also merge cue lines of the programme as mergecues does; holds the whole programme in memory')
+    parser.add_argument('--ideal-duration', type=int, nargs='?', default=IDEAL_SECONDS,
+                        help='ideal duration of merged line')
+    parser.add_argument('--max-duration', type=int, nargs='?', default=MAX_SECONDS,
+                        help='maximum duration of merged line')
+    parser.add_argument('--name', type=str, nargs='?', default=None,
+                        help='<title>_<episode> name of the programme table; defaults to <title>_FEATURE after the first reel')
+    parser.add_argument('--out', type=str, nargs='?', default='.',
+                        help='path to output directory for destination file')
+    parser.add_argument('--format', type=str, nargs='?', default='tab', choices=list(CUE_TABLE_FORMATS.keys()),
+                        help='output table format; parquet and arrow require pyarrow')
+    parser.add_argument('--dry-run', action='store_true',
+                        help='print the programme instead of writing it')
+    args = parser.parse_args()
+
+    errors = []
+    valid_out_path, out_path = validate_directory(args.out)
+    if not valid_out_path:
+        errors.append(f'Please specify a valid output path\nspecified path: {out_path}')
+
+    all_paths = get_ext_files(args.paths, args.ext)
+    if len(all_paths) == 0:
+        errors.append(f'error: no cue tables with extension {args.ext} found')
+
+    for option in ['offsets', 'reel_lengths']:
+        values = getattr(args, option)
+        if values is not None and len(values) != len(all_paths):
+            errors.append(f"error: --{option.replace('_', '-')} needs one timecode for each of the {len(all_paths)} reels")
+
+    if args.offsets is not None and args.reel_lengths is not None:
+        errors.append('error: --offsets and --reel-lengths cannot be combined')
+
+    if len(errors) > 0:
+        for msg in errors:
+            eprint(msg)
+        sys.exit(1)
+
+    offsets = None if args.offsets is None else [signed_timecode_to_ticks(x, args.frame_rate) for x in args.offsets]
+    lengths = None if args.reel_lengths is None else [signed_timecode_to_ticks(x, args.frame_rate) for x in args.reel_lengths]
+
+    for p in all_paths:
+        print(f"{PROGRAM_NAME}: [{colored('-', 'yellow')}] reel @ {p}")
+
+    reels = [iter_cues(p, TSV_REEL_COLUMNS, args.frame_rate) for p in all_paths]
+    programme = merge_reels(reels, offsets, lengths, signed_timecode_to_ticks(args.start, args.frame_rate), args.frame_rate, all_paths)
+
+    tokens = (file_names(all_paths[0])[0], 'FEATURE') if args.name is None else (args.name.split('_', 1) + ['FEATURE'])[:2]
+    file_name = cue_table_name(out_path, tokens, 'programme', args.format)
+
+    try:
+        if args.merge:
+            programme = merge_cues(list(programme), args.ideal_duration, args.max_duration, fps=args.frame_rate)
+        elif args.format != 'tab':
+            # columnar tables are built whole; only TSV output is written as the reels stream in
+            programme = list(programme)
+
+        if not args.dry_run:
+            write_cues(file_name, programme, args.format, args.frame_rate)
+        else:
+            for cue in programme:
+                print(format_tsv_cue(cue, args.frame_rate))
+    except Exception as e:
+        # a streamed TSV is left half written when a reel turns out to be unreadable or out of order
+        if not args.dry_run and os.path.isfile(file_name):
+            os.remove(file_name)
+        eprint(f"{PROGRAM_NAME}: [{colored('!', 'red')}] could not merge reels")
+        eprint(f"{PROGRAM_NAME}: [{colored('!', 'red')}] reason: {e}")
+        sys.exit(1)
+
+    if not args.dry_run:
+        print(f"{PROGRAM_NAME}: [{colored('+', 'green')}] programme written to {file_name}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,43 +1,57 @@
-from pft import map_characters_to_castings, aggregate_castings, find_speaker_aliases
+from pft import CastingIndex, find_speaker_aliases, index_character_castings
 from debug import eprint
+from debug.metrics import enable_metrics, metrics_file, print_metrics_summary, write_metrics
+from utils import file_signatures
 import argparse
 import os
 import sys
 import json
 
+PROGRAM_NAME = "genspeakers"
+
 
 def main():
     parser = argparse.ArgumentParser(description='Calculate average age range for characters')
     parser.add_argument('--characters', type=str, required=True,
                         help='path to text file with target names of characters')
-    parser.add_argument('--castings', type=str, required=True,
-                        help='path to text file with age ranges for characters')
+    parser.add_argument('--castings', type=str, nargs='+', required=True,
+                        help='paths to text files with age ranges for characters, e.g. one per episode')
+    parser.add_argument('--casting-index', type=str, nargs='?', default=None,
+                        help='keep the parsed castings in this index file and only read casting files that are new or changed since; only the files given to --castings are aggregated')
     parser.add_argument('--aliases', type=str, required=True,
                         help='path to text file with all aliases for all characters')
     parser.add_argument('--ratio', type=int, required=True,
                         help='lowest ratio for fuzzy-matching to pass an alias for a target name')
+    parser.add_argument('--metrics', type=str, nargs='?', const=f'{PROGRAM_NAME}.metrics.jsonl', default=None,
+                        help='record stage timings and counters as JSONL and print a summary to stderr')
+    parser.add_argument('--trace-heap', action='store_true',
+                        help='with --metrics, also record the peak python heap with tracemalloc')
     args = parser.parse_args()
 
     characters_path = os.path.abspath(args.characters)
-    castings_path = os.path.abspath(args.castings)
+    castings_paths = [os.path.abspath(x) for x in args.castings]
     aliases_path = os.path.abspath(args.aliases)
 
     if os.path.isfile(characters_path) is False:
         eprint(f'error: invalid path to file: {characters_path}')
         sys.exit(1)
-    if os.path.isfile(castings_path) is False:
-        eprint(f'error: invalid path to file: {castings_path}')
-        sys.exit(1)
+    for castings_path in castings_paths:
+        if os.path.isfile(castings_path) is False:
+            eprint(f'error: invalid path to file: {castings_path}')
+            sys.exit(1)
     if os.path.isfile(aliases_path) is False:
         eprint(f'error: invalid path to file: {aliases_path}')
         sys.exit(1)
 
     characters = None
-    castings = None
+    index = CastingIndex(None if args.casting_index is None else os.path.abspath(args.casting_index))
     aliases = None
     try:
         characters = set(open(characters_path, 'r').readlines())
-        castings = open(castings_path, 'r').readlines()
+        indexed, pruned = index.update(file_signatures(castings_paths))
+        eprint(f'{PROGRAM_NAME}: indexed {indexed} of {len(castings_paths)} casting files')
+        for p in pruned:
+            eprint(f'{PROGRAM_NAME}: dropped missing casting file from the index: {p}')
         aliases = open(aliases_path, 'r').readlines()
     except Exception as e:
         eprint(e)
@@ -45,16 +59,20 @@ def main():
     if len(characters) == 0:
         eprint(f'error: no characters available in file: {characters_path}')
         sys.exit(1)
-    if len(castings) == 0:
-        eprint(f'error: no ages available in file: {castings_path}')
+    if len(index.names()) == 0:
+        eprint(f'error: no ages available in files: {", ".join(castings_paths)}')
         sys.exit(1)
     if len(aliases) == 0:
         eprint(f'error: no names available in file: {aliases_path}')
         sys.exit(1)
 
-    data = map_characters_to_castings(characters, castings)
-    aggregated = aggregate_castings(data)
-    sorted_aliases = find_speaker_aliases([x[0] for x in aggregated], [x.strip() for x in aliases], args.ratio)
+    records = []
+    if args.metrics is not None:
+        enable_metrics(PROGRAM_NAME, records.append, args.trace_heap)
+
+    with metrics_file(characters_path):
+        aggregated = index_character_castings(characters, index)
+        sorted_aliases = find_speaker_aliases([x[0] for x in aggregated], [x.strip() for x in aliases], args.ratio)
     results = [
             {
                 'name': v[0],
@@ -69,9 +87,15 @@ def main():
                                        [[{'ratio': y[0], 'alias': y[1]} for y in x[1]] for x in sorted_aliases])]
     ]
 
+    index.save()
+
     results_json = json.dumps({'speakers': sorted(results, key=lambda c: c['name'])}, indent=4)
     print(results_json)
 
+    if args.metrics is not None:
+        write_metrics(os.path.abspath(args.metrics), records)
+        print_metrics_summary(records, sys.stderr)
+
 
 if __name__ == "__main__":
     main()
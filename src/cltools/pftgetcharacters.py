@@ -1,4 +1,7 @@
 from pft import script_to_list
+from debug.metrics import MetricsCollector, enable_metrics, metrics_file
+from debug.profiling import PROFILE_LIMIT_DEFAULT, ProfileCollector, worker_profile
+from scheduling import ResultCollector
 from utils import validate_directory, get_ext_files, group_items
 import argparse
 import math
@@ -7,6 +10,8 @@ import os
 import sys
 import itertools
 
+PROGRAM_NAME = "getcharacters"
+
 
 def split_characters(names):
     collect = []
@@ -23,22 +28,30 @@ def split_characters(names):
     return collect
 
 
-def process(paths, schema, ext, out, prefix, split_names, dry_run):
-    for p in paths:
-        name = os.path.basename(p).split('.')[0]
-        out_path = os.path.join(out, f'{name}_{prefix}.names')
-        tbl_list = script_to_list(p, schema_path=schema)
-        raw_names = itertools.chain.from_iterable([[y[1] for y in x if y[0] == 'speaker'] for x in tbl_list])
-        if split_names is True:
-            raw_names = set(split_characters(raw_names))
-        if not dry_run:
-            with open(out_path, 'w') as file:
-                for n in raw_names:
-                    file.write(f'{n}\n')
-                file.close()
-        else:
-            for n in raw_names:
-                print(n)
+def process(paths, schema, ext, out, prefix, split_names, dry_run, metrics_channel=None, profile_paths=None, result_channel=None):
+    # with a result_channel the names of every file are sent back to the parent instead of written
+    if metrics_channel is not None:
+        enable_metrics(PROGRAM_NAME, metrics_channel)
+
+    with worker_profile(profile_paths):
+        for p in paths:
+            with metrics_file(p):
+                name = os.path.basename(p).split('.')[0]
+                out_path = os.path.join(out, f'{name}_{prefix}.names')
+                tbl_list = script_to_list(p, schema_path=schema)
+                raw_names = itertools.chain.from_iterable([[y[1] for y in x if y[0] == 'speaker'] for x in tbl_list])
+                if split_names is True:
+                    raw_names = set(split_characters(raw_names))
+                if result_channel is not None:
+                    result_channel.send(p, {'name': list(raw_names)})
+                elif not dry_run:
+                    with open(out_path, 'w') as file:
+                        for n in raw_names:
+                            file.write(f'{n}\n')
+                        file.close()
+                else:
+                    for n in raw_names:
+                        print(n)
 
 
 def get_script_characters(path):
@@ -51,6 +64,17 @@ def get_script_characters(path):
     return names
 
 
+def combined_names(results, paths):
+    # names of all files in the order of paths and then of first appearance, without duplicates
+    order = {p: i for i, p in enumerate(paths)}
+    names = {}
+    for r in sorted(results, key=lambda x: order.get(x['file'], len(order))):
+        for n in r['columns']['name']:
+            names.setdefault(n, None)
+
+    return list(names)
+
+
 def main():
     parser = argparse.ArgumentParser(description='PFT Script Name Collector')
     parser.add_argument('paths', type=str, nargs='+', default='',
@@ -59,6 +83,12 @@ def main():
                         help='path to output directory to save files containing collected names')
     parser.add_argument('--ext', type=str, nargs='?', default='docx',
                         help='specific files to process')
+    parser.add_argument('--recursive', action='store_true',
+                        help='search directories recursively')
+    parser.add_argument('--include', type=str, nargs='+', default=None,
+                        help='only process files matching one of these glob patterns; patterns with a / match the path below the given directory')
+    parser.add_argument('--exclude', type=str, nargs='+', default=None,
+                        help='skip files and directories matching one of these glob patterns')
     parser.add_argument('--schema', type=str, required=True,
                         help='path to schema file for selecting headers and validating tables')
     parser.add_argument('--write-type', type=str, nargs='?', default='a',
@@ -69,6 +99,18 @@ def main():
                         help='perform a dry run')
     parser.add_argument('--split-names', action='store_true',
                         help='split names of characters according to stop words')
+    parser.add_argument('--combined', type=str, nargs='?', const='', default=None,
+                        help='collect the names of all files in the parent and write them once without duplicates, by default to <out>/characters.names')
+    parser.add_argument('--metrics', type=str, nargs='?', const='', default=None,
+                        help='record per-file, per-stage timings and counters as JSONL, by default to <out>/<tool>.metrics.jsonl, and print a summary')
+    parser.add_argument('--trace-heap', action='store_true',
+                        help='with --metrics, also record the peak python heap of each file with tracemalloc; slows processing')
+    parser.add_argument('--profile', type=str, nargs='?', const='', default=None,
+                        help='profile every worker with cProfile and merge the results, by default into <out>/<tool>.prof')
+    parser.add_argument('--profile-collapsed', type=str, nargs='?', const='', default=None,
+                        help='also sample worker stacks and write them as collapsed stacks for flamegraphs, by default to <out>/<tool>.collapsed')
+    parser.add_argument('--profile-limit', type=int, nargs='?', default=PROFILE_LIMIT_DEFAULT,
+                        help='number of functions to show in the profile report')
     args = parser.parse_args()
 
     write_type = args.write_type.lower()
@@ -84,12 +126,28 @@ def main():
     max_proc = min(max(1, args.process_count), os.cpu_count())
     print(f'total cpus: {os.cpu_count()}, user selected: {max_proc}')
 
-    all_paths = get_ext_files(args.paths, args.ext)
+    all_paths = get_ext_files(args.paths, args.ext, args.recursive, args.include, args.exclude)
     group_size = math.ceil(len(all_paths) / max_proc)
     grouped_paths = group_items(all_paths, group_size)
 
     print(f'group size: {group_size}')
 
+    collector = None
+    if args.metrics is not None:
+        collector = MetricsCollector(os.path.abspath(args.metrics) if args.metrics != '' else os.path.join(out_path, f'{PROGRAM_NAME}.metrics.jsonl'), args.trace_heap)
+
+    profiler = None
+    if args.profile is not None or args.profile_collapsed is not None:
+        profile_path = os.path.abspath(args.profile) if args.profile else os.path.join(out_path, f'{PROGRAM_NAME}.prof')
+        collapsed_path = None
+        if args.profile_collapsed is not None:
+            collapsed_path = os.path.abspath(args.profile_collapsed) if args.profile_collapsed != '' else os.path.join(out_path, f'{PROGRAM_NAME}.collapsed')
+        profiler = ProfileCollector(profile_path, collapsed_path)
+
+    results = None
+    if args.combined is not None:
+        results = ResultCollector()
+
     pool = []
     for i, p in enumerate(grouped_paths):
         proc = mp.Process(target=process, args=(p,
@@ -98,12 +156,44 @@ def main():
                                                 out_path,
                                                 f'cpu{i}',
                                                 args.split_names,
-                                                args.dry_run))
+                                                args.dry_run,
+                                                None if collector is None else collector.channel,
+                                                None if profiler is None else profiler.worker_paths(),
+                                                None if results is None else results.channel))
         pool.append(proc)
 
     for p in pool:
         p.start()
 
+    if results is not None:
+        names = combined_names(results.wait(pool, collector), all_paths)
+        if collector is not None:
+            collector.wait(pool)
+            collector.summary()
+        if profiler is not None:
+            profiler.finish(args.profile_limit)
+
+        if args.dry_run:
+            for n in names:
+                print(n)
+        else:
+            combined_path = os.path.abspath(args.combined) if args.combined != '' else os.path.join(out_path, 'characters.names')
+            with open(combined_path, 'w') as file:
+                for n in names:
+                    file.write(f'{n}\n')
+            print(f'{PROGRAM_NAME}: {len(names)} names from {len(all_paths)} files written to {combined_path}')
+        return
+
+    if collector is not None or profiler is not None:
+        if collector is not None:
+            collector.wait(pool)
+            collector.summary()
+        for p in pool:
+            p.join()
+        if profiler is not None:
+            profiler.finish(args.profile_limit)
+        return
+
     keep_alive = True
     print('Processing Files...')
     while keep_alive:
@@ -1,74 +1,87 @@
 #!/usr/bin/env python3
 
 import os
-import re
+import sys
 import argparse
-from utils import validate_directory, get_ext_files, group_items
-from pft import script_to_list
+from termcolor import colored
+from utils import discover_files
+from library import LIBRARY_INDEX_DEFAULT, character_lines, library_characters, library_stats, open_library, update_library
 from debug.console import eprint
 
+PROGRAM_NAME = "lineexamples"
+
 
 def main():
     parser = argparse.ArgumentParser(description="Finds locations of lines for specified characters in PFT script document")
-    parser.add_argument("path", nargs="+", default=".",
-                        help="path to folder containing .docx PFT scripts")
-    parser.add_argument("-l", "--limit", nargs=1, default=5, type=int, dest="limit",
-                        help="comma seperated list of characters to find line examples for")
-    parser.add_argument('--schema', type=str, required=True,
-                        help='path to schema file for selecting headers and validating tables')
+    parser.add_argument("path", nargs="*", default=[],
+                        help="paths to .docx PFT scripts or folders containing them; indexed before querying")
+    parser.add_argument("-l", "--limit", nargs="?", default=5, type=int, dest="limit",
+                        help="maximum number of line examples per character")
+    parser.add_argument("--per-file", nargs="?", default=None, type=int,
+                        help="maximum number of line examples per character taken from one script")
+    parser.add_argument('--schema', type=str, default=None,
+                        help='path to schema file for selecting headers and validating tables; required to index paths')
     parser.add_argument('--ext', type=str, nargs='?', default='docx',
                         help='specific files to process')
-    parser.add_argument("-c", "--characters", nargs="+", required=True, default=[], dest="characters",
+    parser.add_argument('--recursive', action='store_true',
+                        help='index scripts in sub-directories of the given paths')
+    parser.add_argument('--include', type=str, nargs='+', default=None,
+                        help='only process files matching one of these glob patterns; patterns with a / match the path below the given directory')
+    parser.add_argument('--exclude', type=str, nargs='+', default=None,
+                        help='skip files and directories matching one of these glob patterns')
+    parser.add_argument('--index', type=str, nargs='?', default=LIBRARY_INDEX_DEFAULT,
+                        help='path to the persistent script library index')
+    parser.add_argument('--process-count', type=int, nargs='?', default=4,
+                        help='total processes used to read changed scripts')
+    parser.add_argument('--list-characters', action='store_true',
+                        help='list every indexed character with its line count')
+    parser.add_argument("-c", "--characters", nargs="+", default=[], dest="characters",
                         help="comma seperated list of characters to find line examples for")
 
     args = parser.parse_args()
 
-    files_path = os.path.abspath(args.path[0])
-    if os.path.isdir(files_path) is not True:
-        eprint("error: the path that was provided to positional argument <path> is not valid")
-        eprint(f"path: {files_path}")
-        exit(1)
-
-    if len(args.characters) == 0:
-        eprint("error: please specify at least one name for a character in positional argument <characters>")
-        exit(1)
-
-    all_paths = get_ext_files(args.path, args.ext)
-
-    characters = dict.fromkeys(args.characters, [])
-
-    for path in all_paths:
-        incomplete_searches = [{x[0]: x[1]} for x in dict.items(characters) if len(x[1]) < args.limit]
-        if len(incomplete_searches) > 0:
-            script_list = script_to_list(path, args.schema)
-            for s in incomplete_searches:
-                s_list = tuple(dict.keys(s))
-                k = s_list[0]
-
-                for entry in script_list:
-                    if len(characters[k]) >= args.limit:
-                        break
-
-                    tcin = entry[1][1]
-                    tcout = entry[2][1]
-                    speaker = entry[3][1].lower().strip()
-                    line = entry[4][1].lower().strip()
-
-                    if re.match(f"^{k.lower()} to", speaker):
-                        characters[k].append({
-                                                 "file": path,
-                                                 "tcin": tcin,
-                                                 "tcout": tcout,
-                                                 "line": line,
-                                             })
-        else:
-            break
-
-    for k, v in dict.items(characters):
-        for entry in characters[k]:
-            clean_line = re.sub("\n", " ", entry["line"])
+    characters = [x.strip() for c in args.characters for x in c.split(',') if x.strip() != '']
+    if len(characters) == 0 and not args.list_characters:
+        eprint("error: please specify at least one name for a character in argument <characters>")
+        sys.exit(1)
+
+    for p in args.path:
+        if not os.path.exists(p):
+            eprint("error: the path that was provided to positional argument <path> is not valid")
+            eprint(f"path: {os.path.abspath(p)}")
+            sys.exit(1)
+
+    if len(args.path) > 0 and (args.schema is None or not os.path.isfile(args.schema)):
+        eprint("error: a valid --schema is required to index scripts")
+        sys.exit(1)
+
+    db = open_library(os.path.abspath(args.index))
+
+    if len(args.path) > 0:
+        all_files = discover_files(args.path, args.ext, args.recursive, args.include, args.exclude)
+        all_paths = [x['path'] for x in all_files]
+
+        def on_file(path, error):
+            if error is not None:
+                eprint(f"{PROGRAM_NAME}: [{colored('!', 'red')}] could not index {path}: {error}")
+            else:
+                eprint(f"{PROGRAM_NAME}: [{colored('+', 'green')}] indexed {path}")
+
+        updated, removed, _ = update_library(db, all_paths, os.path.abspath(args.schema), max(1, args.process_count), on_file=on_file, files={x['path']: x for x in all_files})
+        stats = library_stats(db)
+        eprint(f"{PROGRAM_NAME}: updated {updated}, removed {len(removed)}; {stats['files']} scripts, {stats['lines']} lines, {stats['characters']} characters indexed")
+
+    if args.list_characters:
+        for name, count in library_characters(db):
+            print(f"{name}\t{count}")
+
+    for k in characters:
+        for entry in character_lines(db, k, args.limit, args.per_file):
+            clean_line = entry["line"].replace("\n", " ")
             print(f"{entry['file']}\t{k}:\ttcin: {entry['tcin']}\ttcout: {entry['tcout']}\t{clean_line}")
 
+    db.close()
+
 
 if __name__ == "__main__":
     main()
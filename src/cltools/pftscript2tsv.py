@@ -1,71 +1,108 @@
 from debug.console import eprint
-from pft import normalised_script
-from utils import file_names, get_ext_files, group_items, validate_directory
+from debug.metrics import MetricsCollector, enable_metrics, metrics_file
+from debug.profiling import PROFILE_LIMIT_DEFAULT, ProfileCollector, worker_profile
+from debug.memory import MB
+from scheduling import MEMORY_HISTORY_DEFAULT, MemoryHistory, run_budgeted
+from cues import CUE_TABLE_FORMATS, change_counts, changes_name, cue_table_name, format_tsv_cue, revise_script_cues, revision_cache_name, script_cues, write_changes, write_cues
+from daemon.client import DAEMON_SOCKET_DEFAULT, submit_to_daemon
+from watch import MANIFEST_NAME, WATCH_INTERVAL_DEFAULT, BuildManifest, build_stale, watch
+from utils import discover_files, file_names, get_ext_files, group_items, validate_directory
 import os
 import sys
 import argparse
 import math
 import multiprocessing as mp
 from termcolor import colored
-from chrono import timeregion_make_subsequences, TimeRegion
 
 PROGRAM_NAME = "script2tsv"
 
 
-def process(paths, schema, cfg_path, ratio, ext, out, prefix, dry_run):
-    for data_path in paths:
-        all_lines = None
-        sorted_cues = []
+def process_file(data_path, schema, cfg_path, ratio, out, out_format, dry_run, revision_cache=None):
+    sorted_cues = []
+    changes = None
+    out_tokens = file_names(data_path)
 
-        try:
-            print(f"{PROGRAM_NAME}: [{colored('-', 'yellow')}] processing file @ {data_path}")
-            all_lines = normalised_script(data_path, schema, cfg_path, ratio)
-            all_lines.pop(0)
-
-            characters = {c['character']: [] for c in all_lines}
-
-            for (k, v) in characters.items():
-                cues = timeregion_make_subsequences(sorted([{
-                                                        'age': x['age'],
-                                                        'character': k,
-                                                        'line': x['line'].replace(f"[{k}]", ""),
-                                                        'region': TimeRegion.from_timecode_strings(x['start'], x['end'])
-                                                    } for x in all_lines if k == x['character']], key=lambda x: x["region"]._start), ["UNKNOWN"])
-                characters[k] = cues
-
-            flattened_cues = []
-            for k, v in characters.items():
-                for e in v:
-                    flattened_cues.append({
-                                              'start': str(e['region']._start),
-                                              'end': str(e['region']._end),
-                                              'actor': e['age'],
-                                              'character': k,
-                                              'line': e['line'],
-                                          })
-
-            sorted_cues = sorted(flattened_cues, key=lambda x: x['start'])
+    try:
+        print(f"{PROGRAM_NAME}: [{colored('-', 'yellow')}] processing file @ {data_path}")
+        if revision_cache is None:
+            sorted_cues = script_cues(data_path, schema, cfg_path, ratio)
+        else:
+            sorted_cues, changes = revise_script_cues(data_path, schema, cfg_path, revision_cache_name(revision_cache, out_tokens), ratio)
+
+    except Exception as e:
+        print(f"{PROGRAM_NAME}: [{colored('!', 'red')}] exception was raised for file @ {data_path}")
+        print(f"{PROGRAM_NAME}: [{colored('!', 'red')}] reason: {e}")
+        return False
+
+    file_name = cue_table_name(out, out_tokens, 'gen', out_format)
+    if changes is not None:
+        print(f"{PROGRAM_NAME}: [{colored('~', 'cyan')}] revision of {data_path}: {', '.join(f'{v} {k}' for k, v in change_counts(changes).items())}")
 
+    if not dry_run:
+        try:
+            write_cues(file_name, sorted_cues, out_format)
+            if changes is not None:
+                write_changes(changes_name(out, out_tokens), changes)
         except Exception as e:
-            print(f"{PROGRAM_NAME}: [{colored('!', 'red')}] exception was raised for file @ {data_path}")
+            print(f"{PROGRAM_NAME}: [{colored('!', 'red')}] could not write output of file @ {data_path}")
             print(f"{PROGRAM_NAME}: [{colored('!', 'red')}] reason: {e}")
-            continue
-
-        out_tokens = file_names(data_path)
-        file_name = os.path.join(out, f'{out_tokens[0].upper()}_{out_tokens[1].upper()}.gen.TAB')
-        if not dry_run:
-            with open(file_name, 'w') as file:
-                file.write("#\ttcin\ttcout\tcharacter\tactor\tline\n")
-                for i, line in enumerate(sorted_cues):
-                    file.write(f"{i}\t{line['start']}\t{line['end']}\t{line['character']}\t{line['actor']}\t[{line['character']}] {line['line']}\n")
-                file.close()
-            all_lines.clear()
-        else:
-            print('')
-            for line in sorted_cues:
-                print(f"{line['start']}\t{line['end']}\t{line['character']}\t{line['actor']}\t[{line['character']}] {line['line']}")
+            return False
+    else:
+        print('')
+        for line in sorted_cues:
+            print(format_tsv_cue(line))
+
+    print(f"{PROGRAM_NAME}: [{colored('+', 'green')}] completed file @ {data_path}")
+    return True
+
+
+def process(paths, schema, cfg_path, ratio, ext, out, out_format, prefix, dry_run, revision_cache=None, metrics_channel=None, profile_paths=None):
+    if metrics_channel is not None:
+        enable_metrics(PROGRAM_NAME, metrics_channel)
+
+    with worker_profile(profile_paths):
+        for data_path in paths:
+            with metrics_file(data_path):
+                process_file(data_path, schema, cfg_path, ratio, out, out_format, dry_run, revision_cache)
+
+
+def incremental(args, table_schema, cfg_path, out_path, max_proc, revision_cache):
+    # outputs depend on their script, the schema and the speaker config; only stale ones are rebuilt,
+    # and files are discovered again on every pass so a watch picks up new scripts
+    manifest = BuildManifest(os.path.join(out_path, MANIFEST_NAME))
+    params = {'ratio': args.ratio, 'format': args.format, 'revision_cache': revision_cache}
+    target_args = (table_schema, cfg_path, args.ratio, out_path, args.format, args.dry_run, revision_cache)
+
+    last_missing = []
+
+    with mp.Pool(max_proc) as pool:
+        def build_pass():
+            nonlocal last_missing
+            jobs = [{
+                        'input': p,
+                        'outputs': [cue_table_name(out_path, file_names(p), 'gen', args.format)],
+                        'deps': [p, table_schema, cfg_path],
+                        'params': params,
+                    } for p in get_ext_files(args.paths, args.ext, args.recursive, args.include, args.exclude)]
 
-        print(f"{PROGRAM_NAME}: [{colored('+', 'green')}] completed file @ {data_path}")
+            built, missing = build_stale(pool, manifest, jobs, process_file, target_args, not args.dry_run)
+            missing_paths = [x['input'] for x in missing]
+            if missing_paths != last_missing:
+                for p in missing_paths:
+                    eprint(f"{PROGRAM_NAME}: [{colored('!', 'red')}] skipped file @ {p}: a dependency of it is missing")
+                last_missing = missing_paths
+            if built > 0 or not args.watch:
+                print(f'{PROGRAM_NAME}: rebuilt {built} of {len(jobs)} files')
+
+        if not args.watch:
+            build_pass()
+            return
+
+        print(f'{PROGRAM_NAME}: watching for changes every {args.watch_interval}s')
+        try:
+            watch(build_pass, args.watch_interval)
+        except KeyboardInterrupt:
+            pass
 
 
 def main():
@@ -74,6 +111,12 @@ def main():
                         help='files to un-fuck')
     parser.add_argument('--ext', type=str, nargs='?', default='docx',
                         help='specific files to process')
+    parser.add_argument('--recursive', action='store_true',
+                        help='search directories recursively')
+    parser.add_argument('--include', type=str, nargs='+', default=None,
+                        help='only process files matching one of these glob patterns; patterns with a / match the path below the given directory')
+    parser.add_argument('--exclude', type=str, nargs='+', default=None,
+                        help='skip files and directories matching one of these glob patterns')
     parser.add_argument('--schema', type=str, nargs=1, required=True,
                         help='path to schema file to validate table data')
     parser.add_argument('--speaker-cfg', type=str, nargs=1, required=True,
@@ -84,10 +127,36 @@ def main():
                         help='path to output directory to save files containing collected names')
     parser.add_argument('--write-type', type=str, nargs='?', default='a',
                         help='write to file can be a or w')
+    parser.add_argument('--format', type=str, nargs='?', default='tab', choices=list(CUE_TABLE_FORMATS.keys()),
+                        help='output table format; parquet and arrow require pyarrow')
     parser.add_argument('--process-count', type=int, nargs='?', default=4,
                         help='total processes to spawn in pool; cannot be higher than system total')
     parser.add_argument('--dry-run', action='store_true',
                         help='perform a dry run')
+    parser.add_argument('--revision-cache', type=str, nargs='?', default=None,
+                        help='directory caching rows of previous script revisions; only changed rows are re-normalised and a change report is written')
+    parser.add_argument('--incremental', action='store_true',
+                        help='only reprocess files whose script, schema or speaker config changed since the last run; the speaker config is tracked as a whole, so any edit to it reprocesses every file')
+    parser.add_argument('--watch', action='store_true',
+                        help='keep running and incrementally reprocess files as they change')
+    parser.add_argument('--watch-interval', type=float, nargs='?', default=WATCH_INTERVAL_DEFAULT,
+                        help='seconds between polls for changes in watch mode')
+    parser.add_argument('--daemon', type=str, nargs='?', const=DAEMON_SOCKET_DEFAULT, default=None,
+                        help='submit files to a running adr-daemon, optionally at the given socket path')
+    parser.add_argument('--metrics', type=str, nargs='?', const='', default=None,
+                        help='record per-file, per-stage timings and counters as JSONL, by default to <out>/<tool>.metrics.jsonl, and print a summary')
+    parser.add_argument('--trace-heap', action='store_true',
+                        help='with --metrics, also record the peak python heap of each file with tracemalloc; slows processing')
+    parser.add_argument('--memory-budget', type=int, nargs='?', default=None,
+                        help='megabytes of worker memory to stay within; files are admitted while their estimated peaks, learned from past runs, fit')
+    parser.add_argument('--memory-history', type=str, nargs='?', default=MEMORY_HISTORY_DEFAULT,
+                        help='path to the per-file peak memory history used for estimates')
+    parser.add_argument('--profile', type=str, nargs='?', const='', default=None,
+                        help='profile every worker with cProfile and merge the results, by default into <out>/<tool>.prof')
+    parser.add_argument('--profile-collapsed', type=str, nargs='?', const='', default=None,
+                        help='also sample worker stacks and write them as collapsed stacks for flamegraphs, by default to <out>/<tool>.collapsed')
+    parser.add_argument('--profile-limit', type=int, nargs='?', default=PROFILE_LIMIT_DEFAULT,
+                        help='number of functions to show in the profile report')
     args = parser.parse_args()
 
     errors = []
@@ -103,6 +172,12 @@ def main():
     if not valid_out_path:
         errors.append(f'Please specify a valid output path\nspecified path: {out_path}')
 
+    revision_cache = None
+    if args.revision_cache is not None:
+        valid_revision_cache, revision_cache = validate_directory(args.revision_cache)
+        if not valid_revision_cache:
+            errors.append(f'Please specify a valid revision cache directory\nspecified path: {revision_cache}')
+
     if len(errors) > 0:
         for msg in errors:
             eprint(msg)
@@ -115,13 +190,62 @@ def main():
 
     max_proc = min(max(1, args.process_count), os.cpu_count())
 
-    all_paths = get_ext_files(args.paths, args.ext)
+    if args.watch or args.incremental:
+        incremental(args, table_schema, cfg_path, out_path, max_proc, revision_cache)
+        return
+
+    all_files = discover_files(args.paths, args.ext, args.recursive, args.include, args.exclude)
+    all_paths = [x['path'] for x in all_files]
+
+    if args.daemon is not None:
+        options = {'schema': table_schema,
+                   'speaker_cfg': cfg_path,
+                   'ratio': args.ratio,
+                   'out': out_path,
+                   'format': args.format,
+                   'dry_run': args.dry_run,
+                   'revision_cache': revision_cache}
+        if submit_to_daemon(os.path.abspath(args.daemon), PROGRAM_NAME, 'pftscript2tsv', all_paths, options):
+            return
+        eprint(f'{PROGRAM_NAME}: no daemon is listening on {args.daemon}, processing locally')
+
     group_size = math.ceil(len(all_paths) / max_proc)
     grouped_paths = group_items(all_paths, group_size)
 
     print(f'total cpus: {os.cpu_count()}, user selected: {max_proc}')
     print(f'group size: {group_size}')
 
+    collector = None
+    if args.metrics is not None:
+        collector = MetricsCollector(os.path.abspath(args.metrics) if args.metrics != '' else os.path.join(out_path, f'{PROGRAM_NAME}.metrics.jsonl'), args.trace_heap)
+
+    if args.memory_budget is not None:
+        history = MemoryHistory(os.path.abspath(args.memory_history))
+        jobs = [(p, (p, table_schema, cfg_path, args.ratio, out_path, args.format, args.dry_run, revision_cache)) for p in all_paths]
+        results = run_budgeted(PROGRAM_NAME, process_file, jobs, max_proc, args.memory_budget * MB, history, collector,
+                     files={x['path']: x for x in all_files})
+        history.save()
+        if collector is not None:
+            collector.summary()
+
+        # None is a file whose worker died, False one that failed to parse or write
+        failed = [p for p, r in results.items() if r is not True]
+        if len(failed) > 0:
+            for p in failed:
+                reason = 'worker died while processing' if results[p] is None else 'failed to process'
+                eprint(f"{PROGRAM_NAME}: [{colored('!', 'red')}] {reason} file @ {p}")
+            eprint(f'{PROGRAM_NAME}: {len(failed)} of {len(jobs)} files failed')
+            sys.exit(1)
+        return
+
+    profiler = None
+    if args.profile is not None or args.profile_collapsed is not None:
+        profile_path = os.path.abspath(args.profile) if args.profile else os.path.join(out_path, f'{PROGRAM_NAME}.prof')
+        collapsed_path = None
+        if args.profile_collapsed is not None:
+            collapsed_path = os.path.abspath(args.profile_collapsed) if args.profile_collapsed != '' else os.path.join(out_path, f'{PROGRAM_NAME}.collapsed')
+        profiler = ProfileCollector(profile_path, collapsed_path)
+
     pool = []
     for i, p in enumerate(grouped_paths):
         proc = mp.Process(target=process, args=(p,
@@ -130,13 +254,27 @@ def main():
                                                 args.ratio,
                                                 args.ext,
                                                 out_path,
+                                                args.format,
                                                 f'cpu{i}',
-                                                args.dry_run))
+                                                args.dry_run,
+                                                revision_cache,
+                                                None if collector is None else collector.channel,
+                                                None if profiler is None else profiler.worker_paths()))
         pool.append(proc)
 
     for p in pool:
         p.start()
 
+    if collector is not None or profiler is not None:
+        if collector is not None:
+            collector.wait(pool)
+            collector.summary()
+        for p in pool:
+            p.join()
+        if profiler is not None:
+            profiler.finish(args.profile_limit)
+        return
+
     keep_alive = True
     while keep_alive:
         prev = False
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+import time
+import argparse
+from termcolor import colored
+from utils import discover_files
+from library import LIBRARY_INDEX_DEFAULT, open_search_index, search_lines, update_search_index
+from debug.console import eprint
+
+PROGRAM_NAME = "search"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Searches dialogue across an indexed library of PFT scripts")
+    parser.add_argument("query", type=str, nargs="*", default=[],
+                        help='words that must all appear in a line; use "quoted phrases" and prefix* matches')
+    parser.add_argument("--scripts", type=str, nargs="+", default=[],
+                        help="paths to .docx PFT scripts or folders containing them; indexed before searching")
+    parser.add_argument('--schema', type=str, default=None,
+                        help='path to schema file for selecting headers and validating tables; required to index scripts')
+    parser.add_argument('--speaker-cfg', type=str, default=None,
+                        help='path to speaker configuration file to cross-reference names; required to index scripts')
+    parser.add_argument('--ratio', type=int, nargs='?', default=75,
+                        help='lowest ratio for fuzzy-matching to pass an alias for a target name')
+    parser.add_argument('--ext', type=str, nargs='?', default='docx',
+                        help='specific files to process')
+    parser.add_argument('--recursive', action='store_true',
+                        help='index scripts in sub-directories of the given paths')
+    parser.add_argument('--include', type=str, nargs='+', default=None,
+                        help='only process files matching one of these glob patterns; patterns with a / match the path below the given directory')
+    parser.add_argument('--exclude', type=str, nargs='+', default=None,
+                        help='skip files and directories matching one of these glob patterns')
+    parser.add_argument('--index', type=str, nargs='?', default=LIBRARY_INDEX_DEFAULT,
+                        help='path to the persistent script library index')
+    parser.add_argument('--process-count', type=int, nargs='?', default=4,
+                        help='total processes used to normalise changed scripts')
+    parser.add_argument('-c', '--character', type=str, nargs='?', default=None,
+                        help='only show lines spoken by this character')
+    parser.add_argument('-l', '--limit', type=int, nargs='?', default=None,
+                        help='maximum number of lines to show')
+
+    args = parser.parse_args()
+
+    if len(args.scripts) > 0:
+        errors = []
+        for p in args.scripts:
+            if not os.path.exists(p):
+                errors.append(f'error: script path is invalid at {os.path.abspath(p)}')
+        for name, path in [('table schema', args.schema), ('speaker configuration', args.speaker_cfg)]:
+            if path is None or not os.path.isfile(path):
+                errors.append(f'error: a valid path to the {name} is required to index scripts')
+
+        if len(errors) > 0:
+            for msg in errors:
+                eprint(msg)
+            sys.exit(1)
+
+    if len(args.scripts) == 0 and len(args.query) == 0:
+        eprint("error: please specify a query, or scripts to index with --scripts")
+        sys.exit(1)
+
+    db = open_search_index(os.path.abspath(args.index))
+
+    if len(args.scripts) > 0:
+        all_files = discover_files(args.scripts, args.ext, args.recursive, args.include, args.exclude)
+        all_paths = [x['path'] for x in all_files]
+
+        def on_file(path, error):
+            if error is not None:
+                eprint(f"{PROGRAM_NAME}: [{colored('!', 'red')}] could not index {path}: {error}")
+            else:
+                eprint(f"{PROGRAM_NAME}: [{colored('+', 'green')}] indexed {path}")
+
+        updated, removed, _ = update_search_index(db, all_paths, os.path.abspath(args.schema), os.path.abspath(args.speaker_cfg),
+                                                  args.ratio, max(1, args.process_count), on_file=on_file, files={x['path']: x for x in all_files})
+        eprint(f"{PROGRAM_NAME}: updated {updated}, removed {len(removed)}")
+
+    if len(args.query) > 0:
+        start = time.perf_counter()
+        results = search_lines(db, ' '.join(args.query), args.character, args.limit)
+        for r in results:
+            print(f"{r['file']}\ttcin: {r['tcin']}\ttcout: {r['tcout']}\t[{r['character']}] {r['line']}")
+        eprint(f"{PROGRAM_NAME}: {len(results)} lines in {(time.perf_counter() - start) * 1000:.1f}ms")
+
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
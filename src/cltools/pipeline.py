@@ -0,0 +1,300 @@
+from debug.console import eprint
+from debug.metrics import MetricsCollector, enable_metrics, metrics_file
+from debug.profiling import PROFILE_LIMIT_DEFAULT, ProfileCollector, worker_profile
+from debug.memory import MB
+from scheduling import MEMORY_HISTORY_DEFAULT, MemoryHistory, run_budgeted
+from cues import CONFLICT_MAX_SPEAKERS_DEFAULT, CUE_TABLE_FORMATS, DENSITY_KINDS, MERGE_IGNORE_DEFAULT, conflict_counts, cue_table_name, density_timeline, find_conflicts, merge_cues, program_frames, run_time_to_ticks, script_cues, write_conflicts, write_cues, write_density
+from watch import MANIFEST_NAME, WATCH_INTERVAL_DEFAULT, BuildManifest, build_stale, watch
+from utils import discover_files, file_names, get_ext_files, group_items, validate_directory
+import os
+import sys
+import argparse
+import math
+import multiprocessing as mp
+from termcolor import colored
+from chrono import IDEAL_SECONDS, MAX_SECONDS
+
+PROGRAM_NAME = "pipeline"
+PIPELINE_OUTPUTS = ['gen', 'merged', *DENSITY_KINDS, 'conflicts']
+PIPELINE_OUTPUTS_DEFAULT = ['merged', *DENSITY_KINDS]
+
+
+def run_pipeline(data_path, schema, cfg_path, ratio, ideal_duration, max_duration, run_time_seconds, frame_rate, outputs, max_speakers=CONFLICT_MAX_SPEAKERS_DEFAULT):
+    # returns {output: data} for each requested output; stages are skipped when nothing needs them
+    results = {}
+
+    gen_cues = script_cues(data_path, schema, cfg_path, ratio)
+    if 'gen' in outputs:
+        results['gen'] = gen_cues
+
+    if 'conflicts' in outputs:
+        # checked against the gen cues, as cueconflicts on a gen table would; these are already merged
+        # at the default durations, but not yet at ideal_duration and max_duration
+        results['conflicts'] = find_conflicts(gen_cues, max_speakers, run_time_to_ticks(run_time_seconds, frame_rate), MERGE_IGNORE_DEFAULT, fps=frame_rate)
+
+    if any(x not in ['gen', 'conflicts'] for x in outputs):
+        merged_cues = merge_cues(gen_cues, ideal_duration, max_duration)
+        if 'merged' in outputs:
+            results['merged'] = merged_cues
+
+        total_frames = program_frames(merged_cues, run_time_seconds, frame_rate)
+        for kind in [x for x in DENSITY_KINDS if x in outputs]:
+            results[kind] = density_timeline(merged_cues, total_frames, kind)
+
+    return results
+
+
+def pipeline_output_name(out, out_tokens, kind, out_format):
+    if kind in DENSITY_KINDS:
+        return os.path.join(out, f'{out_tokens[0].upper()}_{out_tokens[1].upper()}.{kind}.csv')
+    if kind == 'conflicts':
+        return os.path.join(out, f'{out_tokens[0].upper()}_{out_tokens[1].upper()}.{kind}.TAB')
+    return cue_table_name(out, out_tokens, kind, out_format)
+
+
+def process_file(data_path, schema, cfg_path, ratio, ideal_duration, max_duration, run_time_seconds, frame_rate, outputs, out, out_format, dry_run, max_speakers=CONFLICT_MAX_SPEAKERS_DEFAULT):
+    try:
+        print(f"{PROGRAM_NAME}: [{colored('-', 'yellow')}] processing file @ {data_path}")
+        results = run_pipeline(data_path, schema, cfg_path, ratio, ideal_duration, max_duration, run_time_seconds, frame_rate, outputs, max_speakers)
+
+        out_tokens = file_names(data_path)
+        for kind, data in results.items():
+            file_name = pipeline_output_name(out, out_tokens, kind, out_format)
+            if kind == 'conflicts':
+                counts = conflict_counts(data)
+                print(f"{PROGRAM_NAME}: [{colored('!', 'red') if len(data) > 0 else colored('+', 'green')}] conflicts @ {data_path}: "
+                      f"{', '.join(f'{v} {k}' for k, v in counts.items())}")
+            if dry_run:
+                continue
+            if kind == 'conflicts':
+                write_conflicts(file_name, data, frame_rate)
+            elif kind in DENSITY_KINDS:
+                write_density(file_name, data)
+            else:
+                write_cues(file_name, data, out_format)
+
+    except Exception as e:
+        print(f"{PROGRAM_NAME}: [{colored('!', 'red')}] exception was raised for file @ {data_path}")
+        print(f"{PROGRAM_NAME}: [{colored('!', 'red')}] reason: {e}")
+        return False
+
+    print(f"{PROGRAM_NAME}: [{colored('+', 'green')}] completed file @ {data_path}")
+    return True
+
+
+def process(paths, schema, cfg_path, ratio, ideal_duration, max_duration, run_time_seconds, frame_rate, outputs, out, out_format, prefix, dry_run, max_speakers, metrics_channel=None, profile_paths=None):
+    if metrics_channel is not None:
+        enable_metrics(PROGRAM_NAME, metrics_channel)
+
+    with worker_profile(profile_paths):
+        for data_path in paths:
+            with metrics_file(data_path):
+                process_file(data_path, schema, cfg_path, ratio, ideal_duration, max_duration, run_time_seconds, frame_rate, outputs, out, out_format, dry_run, max_speakers)
+
+
+def incremental(args, table_schema, cfg_path, out_path, max_proc):
+    manifest = BuildManifest(os.path.join(out_path, MANIFEST_NAME))
+    params = {
+                 'ratio': args.ratio,
+                 'ideal_duration': args.ideal_duration,
+                 'max_duration': args.max_duration,
+                 'run_time': args.run_time,
+                 'frame_rate': args.frame_rate,
+                 'format': args.format,
+                 'max_speakers': args.max_speakers,
+             }
+    target_args = (table_schema, cfg_path, args.ratio, args.ideal_duration, args.max_duration, args.run_time, args.frame_rate, args.outputs, out_path, args.format, args.dry_run, args.max_speakers)
+
+    last_missing = []
+
+    with mp.Pool(max_proc) as pool:
+        def build_pass():
+            nonlocal last_missing
+            jobs = [{
+                        'input': p,
+                        'outputs': [pipeline_output_name(out_path, file_names(p), x, args.format) for x in args.outputs],
+                        'deps': [p, table_schema, cfg_path],
+                        'params': params,
+                    } for p in get_ext_files(args.paths, args.ext, args.recursive, args.include, args.exclude)]
+
+            built, missing = build_stale(pool, manifest, jobs, process_file, target_args, not args.dry_run)
+            missing_paths = [x['input'] for x in missing]
+            if missing_paths != last_missing:
+                for p in missing_paths:
+                    eprint(f"{PROGRAM_NAME}: [{colored('!', 'red')}] skipped file @ {p}: a dependency of it is missing")
+                last_missing = missing_paths
+            if built > 0 or not args.watch:
+                print(f'{PROGRAM_NAME}: rebuilt {built} of {len(jobs)} files')
+
+        if not args.watch:
+            build_pass()
+            return
+
+        print(f'{PROGRAM_NAME}: watching for changes every {args.watch_interval}s')
+        try:
+            watch(build_pass, args.watch_interval)
+        except KeyboardInterrupt:
+            pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description='run PFT scripts through normalisation, merging and density in one pass')
+    parser.add_argument('paths', type=str, nargs='+', default='',
+                        help='PFT script files or directories to process')
+    parser.add_argument('--ext', type=str, nargs='?', default='docx',
+                        help='specific files to process')
+    parser.add_argument('--recursive', action='store_true',
+                        help='search directories recursively')
+    parser.add_argument('--include', type=str, nargs='+', default=None,
+                        help='only process files matching one of these glob patterns; patterns with a / match the path below the given directory')
+    parser.add_argument('--exclude', type=str, nargs='+', default=None,
+                        help='skip files and directories matching one of these glob patterns')
+    parser.add_argument('--schema', type=str, nargs=1, required=True,
+                        help='path to schema file to validate table data')
+    parser.add_argument('--speaker-cfg', type=str, nargs=1, required=True,
+                        help='path to speaker configuration file to cross-reference names')
+    parser.add_argument('--ratio', type=int, nargs=1, default=75,
+                        help='lowest ratio for fuzzy-matching to pass an alias for a target name')
+    parser.add_argument('--ideal-duration', type=int, nargs='?', default=IDEAL_SECONDS,
+                        help='ideal duration of merged line')
+    parser.add_argument('--max-duration', type=int, nargs='?', default=MAX_SECONDS,
+                        help='maximum duration of merged line')
+    parser.add_argument('--frame-rate', type=int, nargs='?', default=25,
+                        help='frame rate of density data')
+    parser.add_argument('--run-time', type=int, nargs='?', default=0,
+                        help='total run time in seconds of source file program')
+    parser.add_argument('--outputs', type=str, nargs='+', default=PIPELINE_OUTPUTS_DEFAULT, choices=PIPELINE_OUTPUTS,
+                        help='outputs to write for each script')
+    parser.add_argument('--max-speakers', type=int, nargs='?', default=CONFLICT_MAX_SPEAKERS_DEFAULT,
+                        help='with the conflicts output, flag stretches where more characters than this speak at once')
+    parser.add_argument('--format', type=str, nargs='?', default='tab', choices=list(CUE_TABLE_FORMATS.keys()),
+                        help='cue table format; parquet and arrow require pyarrow')
+    parser.add_argument('--out', type=str, nargs='?', default='.',
+                        help='path to output directory for destination files')
+    parser.add_argument('--process-count', type=int, nargs='?', default=4,
+                        help='total processes to spawn in pool; cannot be higher than system total')
+    parser.add_argument('--dry-run', action='store_true',
+                        help='perform a dry run')
+    parser.add_argument('--incremental', action='store_true',
+                        help='only reprocess files whose script, schema or speaker config changed since the last run; the speaker config is tracked as a whole, so any edit to it reprocesses every file')
+    parser.add_argument('--watch', action='store_true',
+                        help='keep running and incrementally reprocess files as they change')
+    parser.add_argument('--watch-interval', type=float, nargs='?', default=WATCH_INTERVAL_DEFAULT,
+                        help='seconds between polls for changes in watch mode')
+    parser.add_argument('--metrics', type=str, nargs='?', const='', default=None,
+                        help='record per-file, per-stage timings and counters as JSONL, by default to <out>/<tool>.metrics.jsonl, and print a summary')
+    parser.add_argument('--trace-heap', action='store_true',
+                        help='with --metrics, also record the peak python heap of each file with tracemalloc; slows processing')
+    parser.add_argument('--memory-budget', type=int, nargs='?', default=None,
+                        help='megabytes of worker memory to stay within; files are admitted while their estimated peaks, learned from past runs, fit')
+    parser.add_argument('--memory-history', type=str, nargs='?', default=MEMORY_HISTORY_DEFAULT,
+                        help='path to the per-file peak memory history used for estimates')
+    parser.add_argument('--profile', type=str, nargs='?', const='', default=None,
+                        help='profile every worker with cProfile and merge the results, by default into <out>/<tool>.prof')
+    parser.add_argument('--profile-collapsed', type=str, nargs='?', const='', default=None,
+                        help='also sample worker stacks and write them as collapsed stacks for flamegraphs, by default to <out>/<tool>.collapsed')
+    parser.add_argument('--profile-limit', type=int, nargs='?', default=PROFILE_LIMIT_DEFAULT,
+                        help='number of functions to show in the profile report')
+    args = parser.parse_args()
+
+    errors = []
+    cfg_path = os.path.abspath(args.speaker_cfg[0])
+    if os.path.isfile(cfg_path) is False:
+        errors.append(f'error: path to speaker configuration is invalid at {cfg_path}')
+
+    table_schema = os.path.abspath(args.schema[0])
+    if os.path.isfile(table_schema) is False:
+        errors.append(f'error: path to table schema file is invalid at {table_schema}')
+
+    valid_out_path, out_path = validate_directory(args.out)
+    if not valid_out_path:
+        errors.append(f'Please specify a valid output path\nspecified path: {out_path}')
+
+    if len(errors) > 0:
+        for msg in errors:
+            eprint(msg)
+        sys.exit(1)
+
+    max_proc = min(max(1, args.process_count), os.cpu_count())
+
+    if args.watch or args.incremental:
+        incremental(args, table_schema, cfg_path, out_path, max_proc)
+        return
+
+    all_files = discover_files(args.paths, args.ext, args.recursive, args.include, args.exclude)
+    all_paths = [x['path'] for x in all_files]
+    if len(all_paths) == 0:
+        eprint(f'error: no .{args.ext} files found')
+        sys.exit(1)
+
+    group_size = math.ceil(len(all_paths) / max_proc)
+    grouped_paths = group_items(all_paths, group_size)
+
+    print(f'total cpus: {os.cpu_count()}, user selected: {max_proc}')
+    print(f'group size: {group_size}')
+
+    collector = None
+    if args.metrics is not None:
+        collector = MetricsCollector(os.path.abspath(args.metrics) if args.metrics != '' else os.path.join(out_path, f'{PROGRAM_NAME}.metrics.jsonl'), args.trace_heap)
+
+    if args.memory_budget is not None:
+        history = MemoryHistory(os.path.abspath(args.memory_history))
+        jobs = [(p, (p, table_schema, cfg_path, args.ratio, args.ideal_duration, args.max_duration, args.run_time, args.frame_rate, args.outputs, out_path, args.format, args.dry_run, args.max_speakers)) for p in all_paths]
+        results = run_budgeted(PROGRAM_NAME, process_file, jobs, max_proc, args.memory_budget * MB, history, collector,
+                     files={x['path']: x for x in all_files})
+        history.save()
+        if collector is not None:
+            collector.summary()
+
+        # None is a file whose worker died, False one that failed to parse or write
+        failed = [p for p, r in results.items() if r is not True]
+        if len(failed) > 0:
+            for p in failed:
+                reason = 'worker died while processing' if results[p] is None else 'failed to process'
+                eprint(f"{PROGRAM_NAME}: [{colored('!', 'red')}] {reason} file @ {p}")
+            eprint(f'{PROGRAM_NAME}: {len(failed)} of {len(jobs)} files failed')
+            sys.exit(1)
+        return
+
+    profiler = None
+    if args.profile is not None or args.profile_collapsed is not None:
+        profile_path = os.path.abspath(args.profile) if args.profile else os.path.join(out_path, f'{PROGRAM_NAME}.prof')
+        collapsed_path = None
+        if args.profile_collapsed is not None:
+            collapsed_path = os.path.abspath(args.profile_collapsed) if args.profile_collapsed != '' else os.path.join(out_path, f'{PROGRAM_NAME}.collapsed')
+        profiler = ProfileCollector(profile_path, collapsed_path)
+
+    pool = []
+    for i, p in enumerate(grouped_paths):
+        proc = mp.Process(target=process, args=(p,
+                                                table_schema,
+                                                cfg_path,
+                                                args.ratio,
+                                                args.ideal_duration,
+                                                args.max_duration,
+                                                args.run_time,
+                                                args.frame_rate,
+                                                args.outputs,
+                                                out_path,
+                                                args.format,
+                                                f'cpu{i}',
+                                                args.dry_run,
+                                                args.max_speakers,
+                                                None if collector is None else collector.channel,
+                                                None if profiler is None else profiler.worker_paths()))
+        proc.start()
+        pool.append(proc)
+
+    if collector is not None:
+        collector.wait(pool)
+        collector.summary()
+
+    for p in pool:
+        p.join()
+
+    if profiler is not None:
+        profiler.finish(args.profile_limit)
+
+
+if __name__ == '__main__':
+    main()
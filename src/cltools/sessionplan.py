@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+import argparse
+from termcolor import colored
+from chrono import FPS_DEFAULT
+from cues import (CUE_OVERHEAD_SECONDS_DEFAULT, RECORD_RATIO_DEFAULT, REEL_CHANGE_SECONDS_DEFAULT, SESSION_MAX_CUES_DEFAULT,
+                  SESSION_MAX_REELS_DEFAULT, actor_file_name, plan_sessions, read_cast, read_cues, write_sessions)
+from debug.console import eprint
+from utils import file_names, get_ext_files, validate_directory
+
+PROGRAM_NAME = "sessionplan"
+SESSION_COLUMNS = ['tcin', 'tcout', 'character', 'line']
+TSV_SESSION_COLUMNS = {'tc_start': 'tcin', 'tc_end': 'tcout'}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Pack each actor\'s merged cues into recording sessions')
+    parser.add_argument('paths', type=str, nargs='+',
+                        help='merged cue tables of every reel or episode, in programme order; folders are expanded in name order')
+    parser.add_argument('--ext', type=str, nargs='?', default='tab',
+                        help='specific files to process')
+    parser.add_argument('--recursive', action='store_true',
+                        help='search directories recursively')
+    parser.add_argument('--cast', type=str, nargs='?', default=None,
+                        help='tab separated file of character and actor pairs; characters missing from it are not planned. '
+                             'without it every character is planned as its own actor, since the actor column of cue tables holds casting ranges')
+    parser.add_argument('--session-hours', type=float, nargs='?', default=4.0,
+                        help='maximum length of a session in hours')
+    parser.add_argument('--max-cues', type=int, nargs='?', default=SESSION_MAX_CUES_DEFAULT,
+                        help='maximum cues recorded in one session')
+    parser.add_argument('--max-reels', type=int, nargs='?', default=SESSION_MAX_REELS_DEFAULT,
+                        help='maximum reels visited in one session')
+    parser.add_argument('--reel-change', type=int, nargs='?', default=REEL_CHANGE_SECONDS_DEFAULT,
+                        help='seconds lost every time a session moves to another reel')
+    parser.add_argument('--ratio', type=float, nargs='?', default=RECORD_RATIO_DEFAULT,
+                        help='studio seconds needed per second of cue')
+    parser.add_argument('--overhead', type=int, nargs='?', default=CUE_OVERHEAD_SECONDS_DEFAULT,
+                        help='studio seconds added to every cue for setup and playback')
+    parser.add_argument('--no-balance', action='store_true',
+                        help='fill sessions in order up to the limits instead of evening out their lengths')
+    parser.add_argument('--frame-rate', type=float, nargs='?', default=FPS_DEFAULT,
+                        help='frame rate of the cue tables')
+    parser.add_argument('--out', type=str, nargs='?', default=None,
+                        help='directory to write one <actor>.sessions.TAB schedule per actor to')
+    args = parser.parse_args()
+
+    out_path = None
+    if args.out is not None:
+        valid_out_path, out_path = validate_directory(args.out)
+        if not valid_out_path:
+            eprint(f'Please specify a valid output path\nspecified path: {out_path}')
+            sys.exit(1)
+
+    cast = None
+    if args.cast is not None:
+        try:
+            cast = read_cast(os.path.abspath(args.cast))
+        except Exception as e:
+            eprint(f'{PROGRAM_NAME}: could not read the cast file: {e}')
+            sys.exit(1)
+
+    reels = []
+    for data_path in get_ext_files(args.paths, args.ext, args.recursive):
+        try:
+            tokens = file_names(data_path)
+            reels.append((f'{tokens[0].upper()}_{tokens[1].split(".")[0].upper()}', read_cues(data_path, SESSION_COLUMNS, TSV_SESSION_COLUMNS, args.frame_rate)))
+        except Exception as e:
+            eprint(f"{PROGRAM_NAME}: [{colored('!', 'red')}] exception was raised for file @ {data_path}")
+            eprint(f"{PROGRAM_NAME}: [{colored('!', 'red')}] reason: {e}")
+
+    if len(reels) == 0:
+        eprint(f'{PROGRAM_NAME}: no cue tables were read')
+        sys.exit(1)
+
+    plans, uncast = plan_sessions(reels, args.frame_rate, int(args.session_hours * 3600), args.max_cues, args.max_reels,
+                                  args.reel_change, args.ratio, args.overhead, not args.no_balance, cast)
+
+    width = max([len('actor'), *[len(x) for x in plans]])
+    print(f"{'actor'.ljust(width)}{'sessions':>10}{'cues':>8}{'hours':>8}{'longest':>9}")
+    for actor, sessions in sorted(plans.items()):
+        hours = [s['seconds'] / 3600 for s in sessions]
+        print(f"{actor.ljust(width)}{len(sessions):>10}{sum(len(s['cues']) for s in sessions):>8}{sum(hours):>8.1f}{max(hours):>9.1f}")
+
+        if out_path is not None:
+            write_sessions(os.path.join(out_path, f'{actor_file_name(actor)}.sessions.TAB'), sessions, args.frame_rate)
+
+    print(f"{PROGRAM_NAME}: {sum(len(x) for x in plans.values())} sessions for {len(plans)} actors over {len(reels)} reels")
+    if len(uncast) > 0:
+        characters = sorted(set(x['character'] for x in uncast))
+        eprint(f"{PROGRAM_NAME}: [{colored('!', 'yellow')}] {len(uncast)} cues have no actor and were not planned: {', '.join(characters)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,10 @@
+from .table import *
+from .stages import *
+from .density import *
+from .revisions import *
+from .reels import *
+from .conflicts import *
+from .gaps import *
+from .sessions import *
+from .spill import *
+from .subtitles import *
@@ -0,0 +1,165 @@
+from chrono import FPS_DEFAULT, TICKS_RESOLUTION, ticks_to_timecode
+from cues.reels import programme_start
+from debug.metrics import metrics_stage
+
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+#  @SECTION: Globals
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+
+
+CONFLICT_KINDS = ['overlap', 'crowd', 'overrun']
+CONFLICT_MAX_SPEAKERS_DEFAULT = 2
+CONFLICTS_HEADER = "kind\ttcin\ttcout\tcharacters\tcues\n"
+
+
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+#  @SECTION: Sweeps
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+
+# a conflict is {'kind', 'start': ticks, 'end': ticks, 'characters': [names], 'cues': [indices]}:
+#   overlap  two cues of the same character run at the same time
+#   crowd    more than max_speakers characters speak at once, over the whole stretch where they do
+#   overrun  a cue ends after the programme run-time
+# cues that only touch, one ending on the tick the other starts, do not conflict
+
+
+def cue_character(cue):
+    return cue['character'].strip()
+
+
+def character_overlaps(cues, indices):
+    # sweeps the cues of one character in start order, retiring cues from a parallel end-ordered
+    # array, so every cue is compared only with the cues still running when it starts
+    by_start = sorted(indices, key=lambda i: (cues[i]['start'], cues[i]['end']))
+    by_end = sorted(indices, key=lambda i: cues[i]['end'])
+    active = {}
+    retired = 0
+    overlaps = []
+
+    for i in by_start:
+        start = cues[i]['start']
+        while retired < len(by_end) and cues[by_end[retired]]['end'] <= start:
+            active.pop(by_end[retired], None)
+            retired += 1
+
+        # a zero length cue runs at no tick, so overlaps nothing
+        if cues[i]['end'] <= start:
+            continue
+
+        for j in active:
+            overlaps.append({
+                                'kind': 'overlap',
+                                'start': start,
+                                'end': min(cues[i]['end'], cues[j]['end']),
+                                'characters': [cue_character(cues[i])],
+                                'cues': [j, i],
+                            })
+
+        active[i] = True
+
+    return overlaps
+
+
+def crowded_regions(cues, max_speakers=CONFLICT_MAX_SPEAKERS_DEFAULT):
+    # sweeps start and end events of all cues together, counting distinct characters speaking;
+    # all events of a tick are applied before the count is checked
+    events = sorted([(x['start'], 1, i) for i, x in enumerate(cues) if x['end'] > x['start']] +
+                    [(x['end'], -1, i) for i, x in enumerate(cues) if x['end'] > x['start']])
+    speaking = {}
+    active = {}
+    regions = []
+    region = None
+    n = 0
+
+    while n < len(events):
+        tick = events[n][0]
+        started = []
+        while n < len(events) and events[n][0] == tick:
+            _, step, i = events[n]
+            name = cue_character(cues[i])
+            speaking[name] = speaking.get(name, 0) + step
+            if speaking[name] == 0:
+                del speaking[name]
+            if step > 0:
+                active[i] = True
+                started.append(i)
+            else:
+                active.pop(i)
+            n += 1
+
+        # cues starting on the tick a crowd ends are not part of it
+        if len(speaking) > max_speakers:
+            if region is None:
+                region = {'kind': 'crowd', 'start': tick, 'end': tick, 'characters': set(), 'cues': list(active)}
+            else:
+                region['cues'].extend(started)
+            region['characters'].update(speaking.keys())
+        elif region is not None:
+            region['end'] = tick
+            region['characters'] = sorted(region['characters'])
+            regions.append(region)
+            region = None
+
+    return regions
+
+
+def overruns(cues, end):
+    # end is the absolute tick the programme ends at
+    return [{
+                'kind': 'overrun',
+                'start': x['start'],
+                'end': x['end'],
+                'characters': [cue_character(x)],
+                'cues': [i],
+            } for i, x in enumerate(cues) if x['end'] > end]
+
+
+@metrics_stage('conflicts', rows_in=lambda cues, *args, **kwargs: len(cues), rows_out=len)
+def find_conflicts(cues, max_speakers=CONFLICT_MAX_SPEAKERS_DEFAULT, run_time_ticks=None, ignore=[], start=None, fps=FPS_DEFAULT):
+    # cues as passed between stages, e.g. from script_cues or merge_cues; characters in ignore are
+    # left out of every check; run_time_ticks of None skips the overrun check, otherwise cues ending
+    # after start + run_time_ticks overrun, start defaulting to the programme_start of cues
+    # returns conflicts ordered by start, 'cues' indexing into the given cues
+    kept = [i for i, x in enumerate(cues) if cue_character(x) not in ignore]
+    subset = [cues[i] for i in kept]
+
+    characters = {}
+    for n, cue in enumerate(subset):
+        characters.setdefault(cue_character(cue), []).append(n)
+
+    conflicts = []
+    for indices in characters.values():
+        conflicts.extend(character_overlaps(subset, indices))
+    conflicts.extend(crowded_regions(subset, max_speakers))
+    if run_time_ticks is not None:
+        conflicts.extend(overruns(subset, (programme_start(cues, fps) if start is None else start) + run_time_ticks))
+
+    for c in conflicts:
+        c['cues'] = [kept[n] for n in c['cues']]
+
+    return sorted(conflicts, key=lambda x: (x['start'], CONFLICT_KINDS.index(x['kind'])))
+
+
+def run_time_to_ticks(run_time_seconds, fps=FPS_DEFAULT):
+    # the pipeline's --run-time of 0 means the run-time is unknown
+    return None if run_time_seconds <= 0 else int(run_time_seconds * fps * TICKS_RESOLUTION)
+
+
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+#  @SECTION: Reports
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+
+
+def conflict_counts(conflicts):
+    counts = {k: 0 for k in CONFLICT_KINDS}
+    for c in conflicts:
+        counts[c['kind']] += 1
+    return counts
+
+
+def write_conflicts(path, conflicts, fps=FPS_DEFAULT):
+    with open(path, 'w') as file:
+        file.write(CONFLICTS_HEADER)
+        for c in conflicts:
+            file.write(f"{c['kind']}\t{ticks_to_timecode(c['start'], fps)}\t{ticks_to_timecode(c['end'], fps)}\t"
+                       f"{', '.join(c['characters'])}\t{','.join(str(x) for x in c['cues'])}\n")
@@ -0,0 +1,77 @@
+import re
+from chrono import TICKS_RESOLUTION
+from debug.metrics import metrics_stage
+
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+#  @SECTION: Globals
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+
+
+TIMELINE_WINDOW_SIZE = 100
+DENSITY_KINDS = ['cuedensity', 'worddensity', 'characterdensity']
+
+
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+#  @SECTION: Density
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+
+
+def cue_weight(window_start, window_end, cue_start, cue_end):
+    cue_length = cue_end - cue_start
+
+    if cue_length > 0 and cue_start + cue_length >= window_start and cue_end - cue_length <= window_end:
+        mn = max(cue_start, window_start)
+        mx = min(cue_end, window_end)
+        return 1 - ((cue_length - (mx - mn)) / cue_length)
+
+    return 0.0
+
+
+def cue_word_count(line):
+    return len(re.sub("^\\[.+\\] ", "", line.strip()).split(" "))
+
+
+def program_frames(cues, run_time_seconds=0, fps=25):
+    if run_time_seconds > 0:
+        return int(run_time_seconds * fps)
+    return max([int(x['end']) // TICKS_RESOLUTION for x in cues], default=0)
+
+
+@metrics_stage('density', rows_in=lambda cues, *args, **kwargs: len(cues), rows_out=len)
+def density_timeline(cues, total_frames, kind='cuedensity', timeline_window_size=TIMELINE_WINDOW_SIZE):
+    program_window_size = max(1, total_frames // timeline_window_size)
+    timeline = [[x, x * program_window_size, 0.0] for x in range(timeline_window_size)]
+    found_characters = set()
+
+    for cue in cues:
+        frames_start = int(cue['start']) // TICKS_RESOLUTION
+        frames_end = int(cue['end']) // TICKS_RESOLUTION
+        window_start = (frames_start // program_window_size)
+        window_end = (frames_end // program_window_size) + 1
+        total_words = cue_word_count(cue['line']) if kind == 'worddensity' else 1
+
+        for sample_frame in timeline[window_start:window_end]:
+            current_cue_weight = cue_weight(sample_frame[0] * program_window_size,
+                                            (sample_frame[0] * program_window_size) + program_window_size,
+                                            frames_start,
+                                            frames_end)
+
+            if kind == 'characterdensity':
+                # a character only counts once per window
+                key = (cue['character'].strip(), sample_frame[0])
+                if key in found_characters:
+                    continue
+                found_characters.add(key)
+
+            sample_frame[2] += (total_words * current_cue_weight)
+
+    return timeline
+
+
+def write_density(path, timeline):
+    with open(path, 'w') as file:
+        for i, title in enumerate(["frame", "frame_start", "value"]):
+            file.write(f"{title}")
+            for sample_frame in timeline:
+                file.write(f"\t{sample_frame[i]}")
+            file.write("\n")
@@ -0,0 +1,147 @@
+from chrono import FPS_DEFAULT, TICKS_MAX_GAP, TICKS_RESOLUTION, ticks_to_timecode
+from debug.metrics import metrics_stage
+
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+#  @SECTION: Globals
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+
+
+GAP_HISTOGRAM_SECONDS = [1, 2, 5, 10, 30, 60]
+GAPS_HEADER = "kind\tcharacter\ttcin\ttcout\tframes\tshared\n"
+
+
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+#  @SECTION: Gaps
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+
+# a gap is {'kind': 'gap' | 'silence', 'character', 'start': ticks, 'end': ticks, 'length': ticks, 'shared'}
+#   gap      free time between consecutive cues of one character, measured from the latest end so
+#            far so overlapping cues never produce negative gaps; room to extend a cue into
+#   silence  time where no character speaks at all; room for wild lines, character is ''
+# shared marks gaps of at most TICKS_MAX_GAP, which timeregion_make_subsequences treats as a shared
+# boundary and merges across
+#
+# numpy is imported on use, like pandas, so that tools not analysing gaps start without it
+
+
+def cue_arrays(cues):
+    # (starts, ends, character codes, character names) with codes indexing names
+    import numpy as np
+
+    starts = np.rint(np.fromiter((x['start'] for x in cues), dtype=np.float64, count=len(cues))).astype(np.int64)
+    ends = np.rint(np.fromiter((x['end'] for x in cues), dtype=np.float64, count=len(cues))).astype(np.int64)
+    names, codes = np.unique(np.array([x['character'].strip() for x in cues], dtype=object), return_inverse=True)
+    return starts, ends, codes.astype(np.int64), [str(x) for x in names]
+
+
+def free_gaps(starts, ends, groups):
+    # gaps between cues sorted by (group, start); the running maximum of the ends restarts for each
+    # group by lifting every group above the span of the one before it
+    import numpy as np
+
+    if len(starts) < 2:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+
+    base = int(min(starts.min(), ends.min()))
+    span = int(max(starts.max(), ends.max())) - base + 1
+    lifted = (ends - base) + groups * span
+    latest = np.maximum.accumulate(lifted) - groups * span + base
+
+    gap_starts = latest[:-1]
+    gap_ends = starts[1:]
+    keep = (groups[1:] == groups[:-1]) & (gap_ends > gap_starts)
+    return gap_starts[keep], gap_ends[keep], groups[1:][keep]
+
+
+def gap_records(kind, starts, ends, groups, names, max_gap=TICKS_MAX_GAP):
+    return [{
+                'kind': kind,
+                'character': names[g],
+                'start': int(s),
+                'end': int(e),
+                'length': int(e - s),
+                'shared': bool(e - s <= max_gap),
+            } for s, e, g in zip(starts, ends, groups)]
+
+
+def gap_histogram_edges(fps=FPS_DEFAULT, seconds=GAP_HISTOGRAM_SECONDS, max_gap=TICKS_MAX_GAP):
+    # bins include their lower edge only; the first holds shared boundaries, the last everything
+    # from the last edge on
+    return [0, max_gap + 1, *[int(x * fps * TICKS_RESOLUTION) for x in seconds], float('inf')]
+
+
+def gap_histogram(lengths, edges):
+    import numpy as np
+
+    counts, _ = np.histogram(np.asarray(lengths, dtype=np.float64), bins=edges)
+    return [int(x) for x in counts]
+
+
+@metrics_stage('gaps', rows_in=lambda cues, *args, **kwargs: len(cues))
+def analyse_gaps(cues, fps=FPS_DEFAULT, start=None, end=None, max_gap=TICKS_MAX_GAP, edges=None):
+    # per-character gaps and programme-wide silences of cue records, with gap-length histograms;
+    # start and end, absolute ticks such as programme_start and programme_start plus the run time, add
+    # leading and trailing silence up to the programme bounds
+    # returns {'gaps', 'silences', 'edges', 'histograms': {character: counts}, 'silence_histogram'}
+    import numpy as np
+
+    edges = gap_histogram_edges(fps, max_gap=max_gap) if edges is None else edges
+    if len(cues) == 0:
+        return {'gaps': [], 'silences': [], 'edges': edges, 'histograms': {}, 'silence_histogram': gap_histogram([], edges)}
+
+    starts, ends, codes, names = cue_arrays(cues)
+
+    order = np.lexsort((starts, codes))
+    gap_starts, gap_ends, gap_codes = free_gaps(starts[order], ends[order], codes[order])
+    gaps = gap_records('gap', gap_starts, gap_ends, gap_codes, names, max_gap)
+
+    order = np.argsort(starts, kind='stable')
+    zeros = np.zeros(len(cues), dtype=np.int64)
+    silence_starts, silence_ends, _ = free_gaps(starts[order], ends[order], zeros)
+    if start is not None and start < starts.min():
+        silence_starts = np.concatenate(([start], silence_starts))
+        silence_ends = np.concatenate(([starts.min()], silence_ends))
+    if end is not None and end > ends.max():
+        silence_starts = np.concatenate((silence_starts, [ends.max()]))
+        silence_ends = np.concatenate((silence_ends, [end]))
+    silences = gap_records('silence', silence_starts, silence_ends, np.zeros(len(silence_starts), dtype=np.int64), [''], max_gap)
+
+    # every character's histogram in one bincount over (character, bin) pairs
+    bins = len(edges) - 1
+    binned = np.searchsorted(np.asarray(edges, dtype=np.float64), (gap_ends - gap_starts).astype(np.float64), side='right') - 1
+    inside = (binned >= 0) & (binned < bins)
+    counts = np.bincount(gap_codes[inside] * bins + binned[inside], minlength=len(names) * bins).reshape(len(names), bins)
+    histograms = {name: [int(x) for x in counts[code]] for code, name in enumerate(names)}
+
+    return {
+               'gaps': gaps,
+               'silences': silences,
+               'edges': edges,
+               'histograms': histograms,
+               'silence_histogram': gap_histogram(silence_ends - silence_starts, edges),
+           }
+
+
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+#  @SECTION: Reports
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+
+
+def histogram_labels(edges, fps=FPS_DEFAULT):
+    labels = []
+    for lo, hi in zip(edges[:-1], edges[1:]):
+        if lo == 0:
+            labels.append(f'<={(hi - 1) // TICKS_RESOLUTION}f')
+        elif hi == float('inf'):
+            labels.append(f'>={lo / (fps * TICKS_RESOLUTION):g}s')
+        else:
+            labels.append(f'<{hi / (fps * TICKS_RESOLUTION):g}s')
+    return labels
+
+
+def write_gaps(path, analysis, fps=FPS_DEFAULT):
+    with open(path, 'w') as file:
+        file.write(GAPS_HEADER)
+        for g in sorted(analysis['gaps'], key=lambda x: (x['character'], x['start'])) + analysis['silences']:
+            file.write(f"{g['kind']}\t{g['character']}\t{ticks_to_timecode(g['start'], fps)}\t{ticks_to_timecode(g['end'], fps)}\t"
+                       f"{g['length'] // TICKS_RESOLUTION}\t{int(g['shared'])}\n")
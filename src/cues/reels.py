@@ -0,0 +1,74 @@
+import heapq
+import itertools
+from chrono import FPS_DEFAULT, TICKS_RESOLUTION, timecode_to_ticks
+
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+#  @SECTION: Offsets
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+
+
+def signed_timecode_to_ticks(timecode, fps=FPS_DEFAULT):
+    # '-01:00:00:00' or '+00:59:58:10'; unsigned timecodes are positive
+    sign = -1 if timecode.startswith('-') else 1
+    return sign * int(round(timecode_to_ticks(timecode.lstrip('+-'), fps)))
+
+
+def reel_hour(ticks, fps=FPS_DEFAULT):
+    # start of the hour a reel's timecode falls in, e.g. 02:00:00:00 for a cue at 02:13:05:11
+    hour = int(round(3600 * fps * TICKS_RESOLUTION))
+    return (int(ticks) // hour) * hour
+
+
+def programme_start(cues, fps=FPS_DEFAULT):
+    # programmes start on the hour of their first cue, e.g. 10:00:00:00, not at 00:00:00:00
+    return reel_hour(min(x['start'] for x in cues), fps) if len(cues) > 0 else 0
+
+
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+#  @SECTION: Merging
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+
+# reels are merged lazily: only the head cue of every reel is held at a time, so a feature is
+# combined in memory proportional to its reel count rather than its length
+
+
+def ordered_cues(cues, name):
+    # heapq.merge silently mis-orders its output when an input is not sorted, so refuse such input
+    previous = None
+    for i, cue in enumerate(cues):
+        if previous is not None and cue['start'] < previous:
+            raise Exception(f'{name}: cue {i} starts before the cue preceding it; reels must be in time order')
+        previous = cue['start']
+        yield cue
+
+
+def offset_cues(cues, offset):
+    for cue in cues:
+        yield {**cue, 'start': cue['start'] + offset, 'end': cue['end'] + offset}
+
+
+def merge_reels(reels, offsets=None, lengths=None, start=0, fps=FPS_DEFAULT, names=None):
+    # reels are iterables of cues in time order, e.g. from iter_cues; yields a single timeline in time
+    # order with 'id' renumbered from 0; offsets are ticks added to each reel as is, whereas lengths
+    # (ticks) move every reel from the hour its first cue falls in to start plus the lengths of the
+    # reels before it; cues starting together keep the order of their reels
+    names = [f'reel {i + 1}' for i in range(len(reels))] if names is None else names
+    streams = []
+    position = start
+
+    for i, reel in enumerate(reels):
+        cues = ordered_cues(reel, names[i])
+        offset = 0 if offsets is None else offsets[i]
+
+        if lengths is not None:
+            first = next(cues, None)
+            if first is not None:
+                offset = position - reel_hour(first['start'], fps)
+                cues = itertools.chain([first], cues)
+            position += lengths[i]
+
+        streams.append(offset_cues(cues, offset))
+
+    for i, cue in enumerate(heapq.merge(*streams, key=lambda x: x['start'])):
+        cue['id'] = i
+        yield cue
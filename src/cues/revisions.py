@@ -0,0 +1,186 @@
+import hashlib
+import json
+import os
+from chrono import FPS_DEFAULT
+from debug.metrics import metrics_count
+from cues.stages import merge_cues, script_lines_to_cues
+from watch import file_sha1
+
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+#  @SECTION: Globals
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+
+
+REVISION_CACHE_VERSION = 1
+ROW_TIMECODE_FIELDS = ['tcin', 'tcout']
+ROW_IGNORED_FIELDS = ['id', *ROW_TIMECODE_FIELDS]
+CHANGES_HEADER = "change\ttcin\ttcout\tprev_tcin\tprev_tcout\tspeaker\tline\n"
+
+
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+#  @SECTION: Row Alignment
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+
+
+def row_signature(line):
+    # rows are keyed by their timecodes plus a hash of everything else, so renumbered rows still align
+    fields = {k: v for k, v in line}
+    digest = hashlib.sha1()
+    for k, v in line:
+        if k not in ROW_IGNORED_FIELDS:
+            digest.update(f'{k}\x1f{v}\x1e'.encode('utf-8'))
+
+    return {
+               'tc': [fields.get(x, '').strip() for x in ROW_TIMECODE_FIELDS],
+               'hash': digest.hexdigest(),
+               'speaker': fields.get('speaker', ''),
+               'text': fields.get('line', ''),
+           }
+
+
+def align_rows(previous, current):
+    # returns ([(change, previous index or None)] for each current row, [unmatched previous indexes])
+    matched = [None] * len(current)
+    used = set()
+
+    exact = {}
+    for i, p in enumerate(previous):
+        exact.setdefault((tuple(p['tc']), p['hash']), []).append(i)
+
+    for j, c in enumerate(current):
+        candidates = exact.get((tuple(c['tc']), c['hash']), [])
+        if len(candidates) > 0:
+            i = candidates.pop(0)
+            matched[j] = ('unchanged', i)
+            used.add(i)
+
+    by_tc = {}
+    by_hash = {}
+    for i, p in enumerate(previous):
+        if i not in used:
+            by_tc.setdefault(tuple(p['tc']), []).append(i)
+            by_hash.setdefault(p['hash'], []).append(i)
+
+    for change, index, key in [('modified', by_tc, lambda x: tuple(x['tc'])), ('moved', by_hash, lambda x: x['hash'])]:
+        for j, c in enumerate(current):
+            if matched[j] is not None:
+                continue
+            candidates = [x for x in index.get(key(c), []) if x not in used]
+            if len(candidates) > 0:
+                matched[j] = (change, candidates[0])
+                used.add(candidates[0])
+
+    matched = [('added', None) if x is None else x for x in matched]
+    removed = [i for i in range(len(previous)) if i not in used]
+
+    return matched, removed
+
+
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+#  @SECTION: Revisions
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+
+
+def revision_cache_name(directory, out_tokens):
+    return os.path.join(directory, f'{out_tokens[0].upper()}_{out_tokens[1].upper()}.revision.json')
+
+
+def changes_name(out, out_tokens):
+    return os.path.join(out, f'{out_tokens[0].upper()}_{out_tokens[1].upper()}.changes.TAB')
+
+
+def change_counts(changes):
+    return {x: len([y for y in changes if y['change'] == x]) for x in ['added', 'removed', 'modified', 'moved']}
+
+
+def load_revision_cache(path):
+    if not os.path.isfile(path):
+        return None
+
+    try:
+        with open(path, 'r') as file:
+            cache = json.load(file)
+    except Exception:
+        return None
+
+    return cache if cache.get('version') == REVISION_CACHE_VERSION else None
+
+
+def save_revision_cache(path, cache):
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w') as file:
+        json.dump(cache, file)
+    os.replace(tmp_path, path)
+
+
+def revise_script_cues(path, schema_path, speaker_config_path, cache_path, ratio, fps=FPS_DEFAULT):
+    # re-normalises only rows that changed since the cached revision and re-merges only the
+    # characters they touch; returns (cues, changes) where changes describe the row differences
+    from pft import normalise_script_row, script_to_list
+
+    data = script_to_list(path, schema_path)
+    config = json.load(open(speaker_config_path, 'r'))
+    dependencies = {'schema': file_sha1(schema_path), 'config': file_sha1(speaker_config_path), 'ratio': ratio}
+
+    cache = load_revision_cache(cache_path)
+    previous = [] if cache is None else cache['rows']
+    reusable = cache is not None and cache['dependencies'] == dependencies
+
+    current = [row_signature(x) for x in data[1:]]
+    matched, removed = align_rows(previous, current)
+
+    castings = {}
+    affected = set()
+    for j, (change, i) in enumerate(matched):
+        if change == 'unchanged' and reusable:
+            current[j]['lines'] = previous[i]['lines']
+            metrics_count('revision_rows_reused')
+            continue
+
+        current[j]['lines'] = normalise_script_row(data[j + 1], config, ratio, castings)
+        affected.update(x['character'] for x in current[j]['lines'])
+        if i is not None:
+            affected.update(x['character'] for x in previous[i]['lines'])
+
+    for i in removed:
+        affected.update(x['character'] for x in previous[i]['lines'])
+
+    characters = {}
+    for c in script_lines_to_cues([x for row in current for x in row['lines']], fps):
+        characters.setdefault(c['character'], []).append(c)
+
+    merged = {}
+    for k, v in characters.items():
+        if reusable and k not in affected and k in cache['cues']:
+            merged[k] = cache['cues'][k]
+        else:
+            merged[k] = merge_cues(v, fps=fps)
+
+    save_revision_cache(cache_path, {
+                                        'version': REVISION_CACHE_VERSION,
+                                        'dependencies': dependencies,
+                                        'rows': current,
+                                        'cues': merged,
+                                    })
+
+    changes = []
+    for j, (change, i) in enumerate(matched):
+        if change != 'unchanged':
+            changes.append({'change': change, 'row': current[j], 'previous': None if i is None else previous[i]})
+    for i in removed:
+        changes.append({'change': 'removed', 'row': None, 'previous': previous[i]})
+
+    cues = sorted([x for v in merged.values() for x in v], key=lambda x: x['start'])
+    return cues, changes
+
+
+def write_changes(path, changes):
+    with open(path, 'w') as file:
+        file.write(CHANGES_HEADER)
+        for c in changes:
+            row = c['row'] if c['row'] is not None else c['previous']
+            tc = ['', ''] if c['row'] is None else c['row']['tc']
+            prev_tc = ['', ''] if c['previous'] is None else c['previous']['tc']
+            speaker = row['speaker'].replace('\n', ' ').replace('\t', ' ')
+            text = row['text'].replace('\n', ' ').replace('\t', ' ')
+            file.write(f"{c['change']}\t{tc[0]}\t{tc[1]}\t{prev_tc[0]}\t{prev_tc[1]}\t{speaker}\t{text}\n")
@@ -0,0 +1,184 @@
+import re
+from chrono import FPS_DEFAULT, TICKS_RESOLUTION, ticks_to_timecode
+from debug.metrics import metrics_stage
+
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+#  @SECTION: Globals
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+
+
+SESSION_SECONDS_DEFAULT = 4 * 3600
+SESSION_MAX_CUES_DEFAULT = 150
+SESSION_MAX_REELS_DEFAULT = 3
+REEL_CHANGE_SECONDS_DEFAULT = 300
+RECORD_RATIO_DEFAULT = 4.0
+CUE_OVERHEAD_SECONDS_DEFAULT = 30
+SESSION_BALANCE_PRECISION = 60
+UNCAST_CHARACTERS = ['', 'UNKNOWN', 'NAN']
+SESSIONS_HEADER = "session\treel\ttcin\ttcout\tcharacter\tseconds\tline\n"
+
+
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+#  @SECTION: Packing
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+
+# an actor's cues are recorded in reel and timeline order, so sessions are contiguous runs of that
+# order: a next-fit pass finds the fewest sessions the limits allow, then the session length cap is
+# bisected down to the smallest that still needs no more sessions, which evens out their lengths
+# instead of leaving a short final session
+#
+# a cue costs its duration times the record ratio plus a fixed overhead, and moving to another reel
+# within a session costs the reel change time; a cue too long for any session gets one to itself
+#
+# the actor column of merged tables holds a casting range such as 'F40-50', not a performer, so cues
+# are grouped by performer through a cast mapping {CHARACTER: actor}; without one every character is
+# planned on its own
+
+
+def pack_run(costs, reels, max_seconds, max_cues, max_reels, reel_change):
+    # next-fit over one actor's ordered cues; returns [(first, last + 1)] bounds of every session
+    bounds = []
+    first = 0
+    used = 0.0
+    reel_count = 1
+
+    for i in range(len(costs)):
+        new_reel = i > first and reels[i] != reels[i - 1]
+        change = reel_change if new_reel else 0
+        if i > first and (used + change + costs[i] > max_seconds or i - first >= max_cues or (new_reel and reel_count >= max_reels)):
+            bounds.append((first, i))
+            first = i
+            used = 0.0
+            reel_count = 1
+            new_reel = False
+            change = 0
+
+        used += change + costs[i]
+        reel_count += int(new_reel)
+
+    if len(costs) > 0:
+        bounds.append((first, len(costs)))
+
+    return bounds
+
+
+def pack_balanced(costs, reels, max_seconds, max_cues, max_reels, reel_change):
+    bounds = pack_run(costs, reels, max_seconds, max_cues, max_reels, reel_change)
+    if len(bounds) < 2:
+        return bounds
+
+    lo = max(max(costs), sum(costs) / len(bounds))
+    hi = max_seconds
+    while hi - lo > SESSION_BALANCE_PRECISION:
+        cap = (lo + hi) / 2
+        attempt = pack_run(costs, reels, cap, max_cues, max_reels, reel_change)
+        if len(attempt) <= len(bounds):
+            hi = cap
+            bounds = attempt
+        else:
+            lo = cap
+
+    return bounds
+
+
+def cue_character(cue):
+    return str(cue['character']).strip().upper()
+
+
+def cue_actor(cue, cast=None):
+    # the performer recording cue, or None when it cannot be planned
+    character = cue_character(cue)
+    if character in UNCAST_CHARACTERS:
+        return None
+    if cast is None:
+        return character
+    return cast.get(character)
+
+
+@metrics_stage('sessions', rows_in=lambda reels, *args, **kwargs: sum(len(x[1]) for x in reels))
+def plan_sessions(reels, fps=FPS_DEFAULT, max_seconds=SESSION_SECONDS_DEFAULT, max_cues=SESSION_MAX_CUES_DEFAULT,
+                  max_reels=SESSION_MAX_REELS_DEFAULT, reel_change=REEL_CHANGE_SECONDS_DEFAULT, ratio=RECORD_RATIO_DEFAULT,
+                  overhead=CUE_OVERHEAD_SECONDS_DEFAULT, balance=True, cast=None):
+    # reels are [(name, cues)] in reel order, cues as from merge_cues; times are in seconds; cast maps
+    # upper case characters to actors, as from read_cast
+    # returns ({actor: [{'actor', 'session', 'seconds', 'reels': [names], 'cues': [cue + 'reel', 'seconds']}]},
+    #          [uncast cues]) where unknown characters, and with a cast characters missing from it, are
+    #          left out of every session
+    import numpy as np
+
+    flat = [(r, c, cue_actor(c, cast)) for r, (_, cues) in enumerate(reels) for c in cues]
+    uncast = [{**c, 'reel': reels[r][0]} for r, c, a in flat if a is None]
+    planned = [(r, c) for r, c, a in flat if a is not None]
+    planned_actors = [a for _, _, a in flat if a is not None]
+    if len(planned) == 0:
+        return {}, uncast
+
+    reel_ids = np.fromiter((x[0] for x in planned), dtype=np.int64, count=len(planned))
+    starts = np.fromiter((x[1]['start'] for x in planned), dtype=np.float64, count=len(planned))
+    ends = np.fromiter((x[1]['end'] for x in planned), dtype=np.float64, count=len(planned))
+    actors, actor_ids = np.unique(np.array(planned_actors, dtype=object), return_inverse=True)
+
+    costs = np.maximum(ends - starts, 0) / (fps * TICKS_RESOLUTION) * ratio + overhead
+    order = np.lexsort((starts, reel_ids, actor_ids))
+    actor_bounds = np.flatnonzero(np.diff(actor_ids[order])) + 1
+
+    pack = pack_balanced if balance else pack_run
+    plans = {}
+    for run in np.split(order, actor_bounds):
+        actor = str(actors[actor_ids[run[0]]])
+        run_costs = costs[run].tolist()
+        run_reels = reel_ids[run].tolist()
+
+        sessions = []
+        for n, (first, last) in enumerate(pack(run_costs, run_reels, max_seconds, max_cues, max_reels, reel_change)):
+            session_reels = list(dict.fromkeys(run_reels[first:last]))
+            changes = sum(1 for i in range(first + 1, last) if run_reels[i] != run_reels[i - 1])
+            sessions.append({
+                                'actor': actor,
+                                'session': n + 1,
+                                'seconds': sum(run_costs[first:last]) + changes * reel_change,
+                                'reels': [reels[r][0] for r in session_reels],
+                                'cues': [{**planned[i][1], 'reel': reels[run_reels[k]][0], 'seconds': run_costs[k]}
+                                         for k, i in zip(range(first, last), run[first:last])],
+                            })
+        plans[actor] = sessions
+
+    return plans, uncast
+
+
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+#  @SECTION: Cast
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+
+
+def read_cast(path):
+    # one 'character<TAB>actor' pair per line; blank lines and lines starting with '#' are skipped
+    cast = {}
+    with open(path, 'r') as file:
+        for n, line in enumerate(file):
+            if line.strip() == '' or line.lstrip().startswith('#'):
+                continue
+            parts = line.rstrip('\n').split('\t')
+            if len(parts) < 2 or parts[0].strip() == '' or parts[1].strip() == '':
+                raise Exception(f'line {n + 1} of {path} is not a character and actor separated by a tab')
+            cast[parts[0].strip().upper()] = parts[1].strip()
+    return cast
+
+
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+#  @SECTION: Export
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+
+
+def actor_file_name(actor):
+    return re.sub('[^A-Za-z0-9_.-]+', '_', actor).strip('_') or 'UNNAMED'
+
+
+def write_sessions(path, sessions, fps=FPS_DEFAULT):
+    with open(path, 'w') as file:
+        file.write(SESSIONS_HEADER)
+        for s in sessions:
+            for cue in s['cues']:
+                line = str(cue['line']).replace('\t', ' ').replace('\n', ' ').strip()
+                file.write(f"{s['session']}\t{cue['reel']}\t{ticks_to_timecode(cue['start'], fps)}\t{ticks_to_timecode(cue['end'], fps)}\t"
+                           f"{cue['character']}\t{cue['seconds']:.0f}\t{line}\n")
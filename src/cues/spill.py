@@ -0,0 +1,130 @@
+import heapq
+import os
+import pickle
+import shutil
+import tempfile
+from chrono import FPS_DEFAULT, IDEAL_SECONDS, MAX_SECONDS, iter_subsequences
+from cues.stages import MERGE_IGNORE_DEFAULT, cue_to_entry, entry_to_cue
+from debug.metrics import metrics_count
+
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+#  @SECTION: Globals
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+
+
+SPILL_CHUNK_ROWS_DEFAULT = 100000
+SPILL_MERGE_FAN_IN = 256
+
+
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+#  @SECTION: Spill Files
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+
+# spilled cues are pickled (start, end, character, actor, line) tuples written one after another; a
+# segment (path, offset, count) is a run of them in start order, and is read back one cue at a time
+
+
+def cue_record(cue):
+    return (cue['start'], cue['end'], cue['character'], cue['actor'], cue['line'])
+
+
+def record_cue(record):
+    return {'start': record[0], 'end': record[1], 'character': record[2], 'actor': record[3], 'line': record[4]}
+
+
+def read_segment(path, offset, count):
+    with open(path, 'rb') as file:
+        file.seek(offset)
+        for _ in range(count):
+            yield pickle.load(file)
+
+
+def write_segment(directory, records):
+    fd, path = tempfile.mkstemp(suffix='.spill', dir=directory)
+    count = 0
+    with os.fdopen(fd, 'wb') as file:
+        for r in records:
+            pickle.dump(r, file, pickle.HIGHEST_PROTOCOL)
+            count += 1
+    return (path, 0, count)
+
+
+def merge_segments(directory, segments):
+    # k-way merge by start; segments earlier in the list win ties, which keeps the merge stable; more
+    # segments than SPILL_MERGE_FAN_IN are first merged in consecutive groups into new spill files
+    while len(segments) > SPILL_MERGE_FAN_IN:
+        segments = [write_segment(directory, heapq.merge(*[read_segment(*x) for x in segments[i:i + SPILL_MERGE_FAN_IN]], key=lambda x: x[0]))
+                    for i in range(0, len(segments), SPILL_MERGE_FAN_IN)]
+
+    return heapq.merge(*[read_segment(*x) for x in segments], key=lambda x: x[0])
+
+
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+#  @SECTION: Chunked Merge
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+
+# merge_cues holds a whole table; merge_cues_chunked gives the same cues in the same order while only
+# ever holding one chunk:
+#   1. every chunk of chunk_rows cues is sorted by character, then start, and spilled as one run
+#      with a segment per character
+#   2. each character's segments are k-way merged into iter_subsequences and the merged cues are
+#      spilled again, one segment per character
+#   3. those segments are k-way merged by start into the output stream
+# characters are handled in the order they first appear, as merge_cues does, so ties break the same
+
+
+def spill_chunk(directory, chunk, order, segments):
+    chunk.sort(key=lambda x: (order[x[2]], x[0]))
+    fd, path = tempfile.mkstemp(suffix='.spill', dir=directory)
+    with os.fdopen(fd, 'wb') as file:
+        i = 0
+        while i < len(chunk):
+            character = chunk[i][2]
+            offset = file.tell()
+            count = 0
+            while i < len(chunk) and chunk[i][2] == character:
+                pickle.dump(chunk[i], file, pickle.HIGHEST_PROTOCOL)
+                count += 1
+                i += 1
+            segments.setdefault(character, []).append((path, offset, count))
+
+
+def merge_cues_chunked(cues, ideal_duration=IDEAL_SECONDS, max_duration=MAX_SECONDS, ignore=MERGE_IGNORE_DEFAULT, fps=FPS_DEFAULT,
+                       chunk_rows=SPILL_CHUNK_ROWS_DEFAULT, spill_dir=None):
+    # cues is any iterable, e.g. iter_cues; yields merged cues in start order and removes its spill
+    # files, created under spill_dir or the system temporary directory, once exhausted or closed
+    directory = tempfile.mkdtemp(prefix='adrtools-spill-', dir=spill_dir)
+    try:
+        order = {}
+        segments = {}
+        chunk = []
+        runs = 0
+        for cue in cues:
+            order.setdefault(cue['character'], len(order))
+            chunk.append(cue_record(cue))
+            if len(chunk) >= chunk_rows:
+                spill_chunk(directory, chunk, order, segments)
+                chunk = []
+                runs += 1
+        if len(chunk) > 0:
+            spill_chunk(directory, chunk, order, segments)
+            runs += 1
+        chunk = []
+        metrics_count('spill_runs', runs)
+
+        fd, merged_path = tempfile.mkstemp(suffix='.spill', dir=directory)
+        merged_segments = []
+        with os.fdopen(fd, 'wb') as file:
+            for character in sorted(order, key=order.get):
+                entries = (cue_to_entry(record_cue(x), fps) for x in merge_segments(directory, segments[character]))
+                offset = file.tell()
+                count = 0
+                for e in iter_subsequences(entries, ignore, ideal_duration, max_duration):
+                    pickle.dump(cue_record(entry_to_cue(e, character)), file, pickle.HIGHEST_PROTOCOL)
+                    count += 1
+                merged_segments.append((merged_path, offset, count))
+
+        for record in merge_segments(directory, merged_segments):
+            yield record_cue(record)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
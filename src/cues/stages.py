@@ -0,0 +1,72 @@
+from chrono import timecode_to_ticks, timeregion_make_subsequences, TimeRegion, FPS_DEFAULT, IDEAL_SECONDS, MAX_SECONDS
+from debug.metrics import metrics_stage
+
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+#  @SECTION: Globals
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+
+
+MERGE_IGNORE_DEFAULT = ['UNKNOWN']
+
+
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+#  @SECTION: Stages
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+
+# every stage passes cue records: {'start': ticks, 'end': ticks, 'character', 'actor', 'line'}
+# where 'line' excludes the leading '[CHARACTER]' tag that is added when writing tables
+
+
+def script_lines_to_cues(lines, fps=FPS_DEFAULT):
+    return [{
+                'start': timecode_to_ticks(x['start'], fps),
+                'end': timecode_to_ticks(x['end'], fps),
+                'character': x['character'],
+                'actor': x['age'],
+                'line': x['line'].replace(f"[{x['character']}]", ""),
+            } for x in lines]
+
+
+def script_cues(path, schema_path, speaker_config_path, ratio, fps=FPS_DEFAULT):
+    from pft import normalised_script
+
+    return normalised_lines_to_cues(normalised_script(path, schema_path, speaker_config_path, ratio), fps)
+
+
+def normalised_lines_to_cues(lines, fps=FPS_DEFAULT):
+    # lines as returned by normalised_script, including its header row
+    return merge_cues(script_lines_to_cues(lines[1:], fps), fps=fps)
+
+
+def cue_to_entry(cue, fps=FPS_DEFAULT):
+    # the entry shape timeregion_make_subsequences works on
+    return {
+               'age': cue['actor'],
+               'character': cue['character'],
+               'line': cue['line'],
+               'region': TimeRegion.from_ticks(cue['start'], cue['end'], fps)
+           }
+
+
+def entry_to_cue(entry, character):
+    return {
+               'start': entry['region']._start._ticks,
+               'end': entry['region']._end._ticks,
+               'actor': entry['age'],
+               'character': character,
+               'line': entry['line'],
+           }
+
+
+@metrics_stage('merge', rows_in=lambda cues, *args, **kwargs: len(cues), rows_out=len)
+def merge_cues(cues, ideal_duration=IDEAL_SECONDS, max_duration=MAX_SECONDS, ignore=MERGE_IGNORE_DEFAULT, fps=FPS_DEFAULT):
+    characters = {}
+    for c in cues:
+        characters.setdefault(c['character'], []).append(cue_to_entry(c, fps))
+
+    flattened_cues = []
+    for k, v in characters.items():
+        for e in timeregion_make_subsequences(sorted(v, key=lambda x: x["region"]._start), ignore, ideal_duration, max_duration):
+            flattened_cues.append(entry_to_cue(e, k))
+
+    return sorted(flattened_cues, key=lambda x: x['start'])
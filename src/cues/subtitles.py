@@ -0,0 +1,153 @@
+import html
+import re
+from chrono import FPS_DEFAULT, TICKS_RESOLUTION, timecode_to_ticks
+from pft import SPEAKER_CASTING_DEFAULT, SPEAKER_NAME_DEFAULT
+
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+#  @SECTION: Globals
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+
+
+SUBTITLE_EXTENSIONS = {'.srt': 'srt', '.vtt': 'vtt', '.edl': 'edl'}
+SUBTITLE_TIMING_PATTERN = re.compile(r'^\s*(?:(\d+):)?(\d{1,2}):(\d{2})[,.](\d{1,3})\s*-->\s*(?:(\d+):)?(\d{1,2}):(\d{2})[,.](\d{1,3})')
+EDL_TIMECODE = r'(\d{2}:\d{2}:\d{2}[:;.]\d{2})'
+EDL_EVENT_PATTERN = re.compile(rf'^\s*(\d+)\s+\S+\s+\S+\s+\S+(?:\s+\d+)?\s+{EDL_TIMECODE}\s+{EDL_TIMECODE}\s+{EDL_TIMECODE}\s+{EDL_TIMECODE}')
+EDL_NOTE_PATTERN = re.compile(r'^\s*\*\s*(FROM CLIP NAME|COMMENT)\s*:?\s*(.*)$', re.IGNORECASE)
+SPEAKER_TAG_PATTERN = re.compile(r'^\s*(?:\[([^\]]+)\]|([A-Z][A-Z0-9 .\'-]*[A-Z0-9]):(?=\s))\s*')
+VTT_VOICE_PATTERN = re.compile(r'<v(?:\.[^\s>]*)?\s+([^>]+)>')
+MARKUP_PATTERN = re.compile(r'<[^>]*>|\{\\[^}]*\}')
+
+
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+#  @SECTION: Text
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+
+# subtitle text names its speaker with a '[NAME]' or 'NAME:' prefix, or a WebVTT '<v Name>' voice, and
+# dual dialogue puts each speaker on a line of its own starting with '-'; every speaker becomes a cue
+# over the same region, and untagged speakers are SPEAKER_NAME_DEFAULT as in normalised_script
+
+
+def parse_speaker(text):
+    voice = VTT_VOICE_PATTERN.search(text)
+    text = MARKUP_PATTERN.sub('', text) if '<' in text or '{' in text else text
+    text = ' '.join((html.unescape(text) if '&' in text else text).split())
+    if voice is not None:
+        return voice.group(1).strip().upper(), text
+
+    tag = SPEAKER_TAG_PATTERN.match(text)
+    if tag is None:
+        return SPEAKER_NAME_DEFAULT, text
+
+    return (tag.group(1) or tag.group(2)).strip().upper(), text[tag.end():]
+
+
+def text_cues(start, end, lines):
+    parts = []
+    for l in lines:
+        stripped = l.strip()
+        if stripped == '':
+            continue
+        if stripped.startswith('-') or len(parts) == 0:
+            parts.append(stripped.lstrip('-'))
+        else:
+            parts[-1] += f' {stripped}'
+
+    # a region without any text is still a cue for the timing and density tools
+    for p in parts if len(parts) > 0 else ['']:
+        character, line = parse_speaker(p)
+        yield {
+                  'start': start,
+                  'end': end,
+                  'character': character,
+                  'actor': SPEAKER_CASTING_DEFAULT,
+                  'line': line,
+              }
+
+
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+#  @SECTION: Parsers
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+
+# the parsers take any iterable of lines, e.g. an open file, and yield cue records in a single pass
+# holding no more than the event being parsed; times are snapped to whole frames
+
+
+def clock_to_ticks(hours, minutes, seconds, millis, fps=FPS_DEFAULT):
+    total = int(hours or 0) * 3600 + int(minutes) * 60 + int(seconds) + int(millis.ljust(3, '0')) / 1000
+    return round(total * fps) * TICKS_RESOLUTION
+
+
+def iter_timed_text_cues(lines, fps=FPS_DEFAULT):
+    # SRT and WebVTT: a timing line opens a cue and a blank line closes it; anything outside a cue, i.e.
+    # SRT counters, the WEBVTT header, cue identifiers and NOTE or STYLE blocks, is skipped
+    region = None
+    text = []
+    for l in lines:
+        timing = SUBTITLE_TIMING_PATTERN.match(l)
+        if timing is not None:
+            if region is not None:
+                yield from text_cues(*region, text)
+            region = (clock_to_ticks(*timing.group(1, 2, 3, 4), fps), clock_to_ticks(*timing.group(5, 6, 7, 8), fps))
+            text = []
+        elif l.strip() == '':
+            if region is not None:
+                yield from text_cues(*region, text)
+            region = None
+            text = []
+        elif region is not None:
+            text.append(l)
+
+    if region is not None:
+        yield from text_cues(*region, text)
+
+
+def edl_timecode_to_ticks(timecode, fps=FPS_DEFAULT):
+    # drop frame ';' separators are read as non-drop
+    return round(timecode_to_ticks(re.sub('[;.]', ':', timecode), fps))
+
+
+def edl_event_cues(event):
+    if event['end'] <= event['start']:
+        return
+
+    text = ' '.join(event['comments']) if len(event['comments']) > 0 else event['clip']
+    yield from text_cues(event['start'], event['end'], [text])
+
+
+def iter_edl_cues(lines, fps=FPS_DEFAULT):
+    # CMX3600: every event's record in and out become a cue, its text taken from the event's COMMENT
+    # notes or else its FROM CLIP NAME; TITLE, FCM and other notes are skipped
+    event = None
+    for l in lines:
+        match = EDL_EVENT_PATTERN.match(l)
+        if match is not None:
+            start = edl_timecode_to_ticks(match.group(4), fps)
+            end = edl_timecode_to_ticks(match.group(5), fps)
+            if event is not None and event['number'] == match.group(1):
+                # dissolves and wipes list the incoming clip on a second line of the same event
+                event['start'] = min(event['start'], start)
+                event['end'] = max(event['end'], end)
+                continue
+
+            if event is not None:
+                yield from edl_event_cues(event)
+            event = {'number': match.group(1), 'start': start, 'end': end, 'comments': [], 'clip': ''}
+            continue
+
+        note = EDL_NOTE_PATTERN.match(l)
+        if note is not None and event is not None:
+            if note.group(1).upper() == 'COMMENT':
+                event['comments'].append(note.group(2).strip())
+            else:
+                event['clip'] = note.group(2).strip()
+
+    if event is not None:
+        yield from edl_event_cues(event)
+
+
+SUBTITLE_PARSERS = {'srt': iter_timed_text_cues, 'vtt': iter_timed_text_cues, 'edl': iter_edl_cues}
+
+
+def iter_subtitle_cues(path, fmt, fps=FPS_DEFAULT):
+    with open(path, 'r', encoding='utf-8-sig', errors='replace') as file:
+        yield from SUBTITLE_PARSERS[fmt](file, fps)
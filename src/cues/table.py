@@ -0,0 +1,216 @@
+import csv
+import os
+from chrono import FPS_DEFAULT, TICKS_RESOLUTION, ticks_to_timecode, timecode_to_ticks
+from cues.subtitles import SUBTITLE_EXTENSIONS, iter_subtitle_cues
+from debug.metrics import metrics_stage
+
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+#  @SECTION: Globals
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+
+
+CUE_COLUMNS = ['id', 'tcin', 'tcout', 'character', 'actor', 'line']
+CUE_TABLE_FORMATS = {'tab': 'TAB', 'parquet': 'parquet', 'arrow': 'arrow'}
+COLUMNAR_EXTENSIONS = {'.parquet': 'parquet', '.pq': 'parquet', '.arrow': 'arrow', '.feather': 'arrow'}
+TSV_HEADER = "#\ttcin\ttcout\tcharacter\tactor\tline\n"
+
+
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+#  @SECTION: Formats
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+
+
+def cue_table_format(path):
+    ext = os.path.splitext(path)[1].lower()
+    return COLUMNAR_EXTENSIONS.get(ext, SUBTITLE_EXTENSIONS.get(ext, 'tab'))
+
+
+def cue_table_name(out, tokens, stage, fmt):
+    return os.path.join(out, f'{tokens[0].upper()}_{tokens[1].upper()}.{stage}.{CUE_TABLE_FORMATS[fmt]}')
+
+
+def import_pyarrow():
+    try:
+        import pyarrow
+        return pyarrow
+    except ImportError:
+        raise Exception("columnar cue tables require pyarrow: pip install 'adrtools[columnar]'")
+
+
+def cue_ticks(value, fps=FPS_DEFAULT):
+    # TSV tables hold timecode strings, columnar tables hold integer ticks
+    if isinstance(value, str):
+        return timecode_to_ticks(value, fps)
+    return int(value)
+
+
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+#  @SECTION: Writing
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+
+
+def format_tsv_cue(cue, fps=FPS_DEFAULT):
+    return f"{ticks_to_timecode(cue['start'], fps)}\t{ticks_to_timecode(cue['end'], fps)}\t{cue['character']}\t{cue['actor']}\t[{cue['character']}] {cue['line']}"
+
+
+def write_tsv_cues(path, cues, fps=FPS_DEFAULT):
+    with open(path, 'w') as file:
+        file.write(TSV_HEADER)
+        for i, cue in enumerate(cues):
+            file.write(f"{i}\t{format_tsv_cue(cue, fps)}\n")
+
+
+def columnar_cue_table(cues, fps=FPS_DEFAULT):
+    pa = import_pyarrow()
+
+    schema = pa.schema([
+                           ('id', pa.int32()),
+                           ('tcin', pa.int64()),
+                           ('tcout', pa.int64()),
+                           ('character', pa.dictionary(pa.int32(), pa.string())),
+                           ('actor', pa.dictionary(pa.int32(), pa.string())),
+                           ('line', pa.string()),
+                       ],
+                       metadata={'fps': str(fps), 'ticks_resolution': str(TICKS_RESOLUTION)})
+
+    columns = [
+                  list(range(len(cues))),
+                  [int(round(x['start'])) for x in cues],
+                  [int(round(x['end'])) for x in cues],
+                  pa.array([x['character'] for x in cues], pa.string()).dictionary_encode(),
+                  pa.array([x['actor'] for x in cues], pa.string()).dictionary_encode(),
+                  [f"[{x['character']}] {x['line']}" for x in cues],
+              ]
+
+    return pa.Table.from_arrays([pa.array(c, type=f.type) if isinstance(c, list) else c for c, f in zip(columns, schema)], schema=schema)
+
+
+def write_columnar_cues(path, cues, fmt, fps=FPS_DEFAULT):
+    pa = import_pyarrow()
+    table = columnar_cue_table(cues, fps)
+
+    if fmt == 'parquet':
+        import pyarrow.parquet as pq
+        pq.write_table(table, path)
+    else:
+        import pyarrow.ipc
+        with pa.OSFile(path, 'wb') as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+
+
+@metrics_stage('write', rows_in=lambda path, cues, *args, **kwargs: len(cues))
+def write_cues(path, cues, fmt='tab', fps=FPS_DEFAULT):
+    if fmt == 'tab':
+        write_tsv_cues(path, cues, fps)
+    else:
+        write_columnar_cues(path, cues, fmt, fps)
+
+
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+#  @SECTION: Reading
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+
+
+def read_cue_table(path, columns=None, delimiter='\t'):
+    fmt = cue_table_format(path)
+
+    if fmt == 'parquet':
+        import_pyarrow()
+        import pyarrow.parquet as pq
+        return pq.read_table(path, columns=columns).to_pandas()
+
+    if fmt == 'arrow':
+        pa = import_pyarrow()
+        import pyarrow.ipc
+        with pa.memory_map(path, 'r') as source:
+            table = pa.ipc.open_file(source).read_all()
+            return (table if columns is None else table.select(columns)).to_pandas()
+
+    import pandas as pd
+    return pd.read_csv(path, delimiter=delimiter, usecols=columns)
+
+
+def row_to_cue(row, fps=FPS_DEFAULT):
+    character = str(row.get('character', ''))
+    return {
+               'start': cue_ticks(row['tcin'], fps),
+               'end': cue_ticks(row['tcout'], fps),
+               'character': character,
+               'actor': row.get('actor', ''),
+               'line': str(row.get('line', '')).replace(f"[{character}]", ""),
+           }
+
+
+def table_to_cues(data_frame, fps=FPS_DEFAULT):
+    return [row_to_cue(row, fps) for row in data_frame.to_dict('records')]
+
+
+@metrics_stage('read', rows_out=len)
+def read_cues(path, columns=None, renames={}, fps=FPS_DEFAULT):
+    # renames maps alternative column names of a TSV source onto CUE_COLUMNS; subtitle and EDL sources
+    # are parsed into whole cue records, so neither columns nor renames apply to them
+    fmt = cue_table_format(path)
+    if fmt in SUBTITLE_EXTENSIONS.values():
+        return list(iter_subtitle_cues(path, fmt, fps))
+
+    if fmt == 'tab':
+        with open(path, 'r') as file:
+            header = file.readline().rstrip('\n').split('\t')
+        inverse = {v: k for k, v in renames.items() if k in header}
+        source_columns = None if columns is None else [inverse.get(x, x) for x in columns]
+        data_frame = read_cue_table(path, source_columns).rename(columns=renames)
+    else:
+        data_frame = read_cue_table(path, columns)
+
+    return table_to_cues(data_frame, fps)
+
+
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+#  @SECTION: Streaming
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+
+# the iter_* readers yield one cue at a time for inputs that should not be held in memory at once;
+# they skip pandas entirely and read columnar tables one record batch at a time
+
+
+def iter_tsv_rows(path, renames={}):
+    with open(path, 'r', newline='') as file:
+        reader = csv.reader(file, delimiter='\t')
+        header = next(reader, None)
+        if header is None:
+            return
+
+        inverse = {v: k for k, v in renames.items() if k in header}
+        index = {c: header.index(inverse.get(c, c)) for c in CUE_COLUMNS if inverse.get(c, c) in header}
+        for row in reader:
+            if len(row) > 0:
+                yield {k: row[i] if i < len(row) else '' for k, i in index.items()}
+
+
+def iter_columnar_rows(path, fmt):
+    pa = import_pyarrow()
+
+    if fmt == 'parquet':
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(path).iter_batches():
+            yield from batch.to_pylist()
+        return
+
+    import pyarrow.ipc
+    with pa.memory_map(path, 'r') as source:
+        reader = pa.ipc.open_file(source)
+        for i in range(reader.num_record_batches):
+            yield from reader.get_batch(i).to_pylist()
+
+
+def iter_cues(path, renames={}, fps=FPS_DEFAULT):
+    # renames as for read_cues; only applies to TSV sources
+    fmt = cue_table_format(path)
+    if fmt in SUBTITLE_EXTENSIONS.values():
+        yield from iter_subtitle_cues(path, fmt, fps)
+        return
+
+    rows = iter_tsv_rows(path, renames) if fmt == 'tab' else iter_columnar_rows(path, fmt)
+    for row in rows:
+        yield row_to_cue(row, fps)
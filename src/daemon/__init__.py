@@ -0,0 +1 @@
+# Nothing to import; clients only need daemon.client, which keeps them light
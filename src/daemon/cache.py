@@ -0,0 +1,87 @@
+import sys
+from collections import OrderedDict
+
+
+def estimate_size(obj, seen=None):
+    # rough deep size of the containers the caches hold: dicts, lists, tuples and strings
+    seen = set() if seen is None else seen
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(estimate_size(k, seen) + estimate_size(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set)):
+        size += sum(estimate_size(x, seen) for x in obj)
+
+    return size
+
+
+class LRUCache:
+    _entries = None
+    _max_bytes = 0
+    _max_entries = 0
+    _bytes = 0
+    hits = 0
+    misses = 0
+
+    def __init__(self, max_bytes, max_entries=0):
+        self._entries = OrderedDict()
+        self._max_bytes = max_bytes
+        self._max_entries = max_entries
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        if key not in self._entries:
+            self.misses += 1
+            return default
+
+        self.hits += 1
+        self._entries.move_to_end(key)
+        return self._entries[key][0]
+
+    def put(self, key, value):
+        if key in self._entries:
+            self._bytes -= self._entries.pop(key)[1]
+
+        size = estimate_size(value)
+        if self._max_bytes > 0 and size > self._max_bytes:
+            return value
+
+        self._entries[key] = (value, size)
+        self._bytes += size
+        self.evict()
+        return value
+
+    def resize(self, key):
+        # re-estimates an entry whose value was mutated in place, dropping it once it no longer fits
+        if key not in self._entries:
+            return
+
+        value, size = self._entries[key]
+        self._bytes -= size
+        size = estimate_size(value)
+        if self._max_bytes > 0 and size > self._max_bytes:
+            del self._entries[key]
+            return
+
+        self._entries[key] = (value, size)
+        self._bytes += size
+        self.evict()
+
+    def evict(self):
+        while len(self._entries) > 0 and ((self._max_bytes > 0 and self._bytes > self._max_bytes) or (self._max_entries > 0 and len(self._entries) > self._max_entries)):
+            _, (_, size) = self._entries.popitem(last=False)
+            self._bytes -= size
+
+    def stats(self):
+        return {'entries': len(self._entries), 'bytes': self._bytes, 'hits': self.hits, 'misses': self.misses}
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def __len__(self):
+        return len(self._entries)
@@ -0,0 +1,51 @@
+import getpass
+import json
+import os
+import socket
+import tempfile
+from termcolor import colored
+
+DAEMON_SOCKET_DEFAULT = os.path.join(tempfile.gettempdir(), f'adrtools-{getpass.getuser()}.sock')
+
+
+def connect_daemon(socket_path):
+    conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        conn.connect(socket_path)
+    except Exception:
+        conn.close()
+        raise
+    return conn
+
+
+def request_daemon(conn, request):
+    with conn:
+        stream = conn.makefile('rwb')
+        stream.write((json.dumps(request) + '\n').encode('utf-8'))
+        stream.flush()
+        for line in stream:
+            message = json.loads(line.decode('utf-8'))
+            if message['type'] == 'done':
+                return
+            yield message
+
+
+def submit_to_daemon(socket_path, program_name, tool, paths, options):
+    # returns False when no daemon is listening so callers can fall back to processing locally
+    try:
+        conn = connect_daemon(socket_path)
+    except (FileNotFoundError, ConnectionRefusedError):
+        return False
+
+    for message in request_daemon(conn, {'command': 'run', 'tool': tool, 'paths': paths, 'options': options}):
+        if 'changes' in message:
+            print(f"{program_name}: [{colored('~', 'cyan')}] revision of {message['path']}: {', '.join(f'{v} {k}' for k, v in message['changes'].items())}")
+        if message['status'] == 'completed':
+            for line in message.get('lines', []):
+                print(line)
+            print(f"{program_name}: [{colored('+', 'green')}] completed file @ {message['path']}")
+        else:
+            print(f"{program_name}: [{colored('!', 'red')}] exception was raised for file @ {message['path']}")
+            print(f"{program_name}: [{colored('!', 'red')}] reason: {message['reason']}")
+
+    return True
@@ -0,0 +1,166 @@
+import json
+import os
+import socket
+import socketserver
+import threading
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from daemon.worker import init_worker, run_job
+
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+#  @SECTION: Protocol
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+
+# clients send one JSON request per connection and receive JSON lines until a 'done' message:
+#   {"command": "run", "tool": ..., "paths": [...], "options": {...}}
+#   {"command": "status"}
+#   {"command": "shutdown"}
+
+
+def send_message(stream, message):
+    stream.write((json.dumps(message) + '\n').encode('utf-8'))
+    stream.flush()
+
+
+class DaemonRequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        request = json.loads(self.rfile.readline().decode('utf-8'))
+        command = request.get('command', 'run')
+        daemon = self.server
+
+        if command == 'run':
+            jobs = [{'tool': request['tool'], 'path': p, 'options': request['options']} for p in request['paths']]
+            for result in daemon.run_jobs(jobs):
+                with daemon.lock:
+                    daemon.jobs_served += 1
+                    if 'cache' in result:
+                        daemon.worker_caches[result['pid']] = result['cache']
+                send_message(self.wfile, {'type': 'result', **result})
+        elif command == 'status':
+            with daemon.lock:
+                send_message(self.wfile, {'type': 'status', **daemon.status()})
+        elif command == 'shutdown':
+            threading.Thread(target=daemon.shutdown, daemon=True).start()
+
+        send_message(self.wfile, {'type': 'done'})
+
+
+class DaemonServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+    executor = None
+    lock = None
+    jobs_served = 0
+    worker_caches = {}
+    process_count = 0
+    memory_budget = 0
+    max_entries = 0
+
+    def __init__(self, socket_path, process_count, memory_budget, max_entries):
+        self.lock = threading.Lock()
+        self.jobs_served = 0
+        self.worker_caches = {}
+        self.process_count = process_count
+        self.memory_budget = memory_budget
+        self.max_entries = max_entries
+        # the workers are forked before the socket is bound so they do not hold the listening socket,
+        # and are shut down again if binding fails
+        self.executor = self.new_executor()
+        self.executor.submit(os.getpid).result()
+        try:
+            super().__init__(socket_path, DaemonRequestHandler)
+        except BaseException:
+            self.close_executor()
+            raise
+
+    def new_executor(self):
+        return ProcessPoolExecutor(self.process_count, initializer=init_worker, initargs=(self.memory_budget // self.process_count, self.max_entries))
+
+    def replace_executor(self, broken):
+        # requests share the executor, so only the first to see it broken replaces it
+        with self.lock:
+            if self.executor is broken:
+                broken.shutdown(wait=False, cancel_futures=True)
+                self.executor = self.new_executor()
+
+    def run_jobs(self, jobs):
+        # yields one result per job; a killed worker, e.g. by the OOM killer, breaks the whole executor
+        # without saying which job it ran, so the jobs lost with it are retried one at a time on a fresh
+        # executor, and only a job lost while running alone is failed
+        pending = list(jobs)
+        alone = []
+        while len(pending) > 0 or len(alone) > 0:
+            batch = pending if len(pending) > 0 else [alone.pop(0)]
+            retried = len(pending) == 0
+            pending = []
+            with self.lock:
+                executor = self.executor
+
+            futures = {}
+            lost = []
+            unsent = []
+            for job in batch:
+                try:
+                    futures[executor.submit(run_job, job)] = job
+                except BrokenProcessPool:
+                    # broken by another request; the job never ran, so it is not to blame
+                    unsent.append(job)
+
+            for future in as_completed(futures):
+                try:
+                    yield future.result()
+                except BrokenProcessPool:
+                    lost.append(futures[future])
+
+            if len(lost) > 0 or len(unsent) > 0:
+                self.replace_executor(executor)
+
+            alone[0:0] = unsent
+            if not retried:
+                alone.extend(lost)
+                continue
+
+            for job in lost:
+                yield {'path': job['path'], 'pid': None, 'status': 'failed', 'reason': 'worker died while processing the file'}
+
+    def status(self):
+        return {
+                   'pid': os.getpid(),
+                   'process_count': self.process_count,
+                   'memory_budget': self.memory_budget,
+                   'jobs_served': self.jobs_served,
+                   'worker_caches': self.worker_caches,
+               }
+
+    def close_executor(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=True, cancel_futures=True)
+            self.executor = None
+
+    def server_close(self):
+        super().server_close()
+        self.close_executor()
+
+
+def remove_stale_socket(socket_path):
+    if not os.path.exists(socket_path):
+        return
+
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(socket_path)
+        raise Exception(f'a daemon is already listening on {socket_path}')
+    except (ConnectionRefusedError, FileNotFoundError):
+        os.remove(socket_path)
+    finally:
+        probe.close()
+
+
+def serve(socket_path, process_count, memory_budget, max_entries=0):
+    remove_stale_socket(socket_path)
+    server = DaemonServer(socket_path, process_count, memory_budget, max_entries)
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
@@ -0,0 +1,107 @@
+import json
+import os
+from daemon.cache import LRUCache
+from utils import file_names
+
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+#  @SECTION: Worker State
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+
+# each pool worker keeps its own caches for the lifetime of the daemon
+
+WORKER_CACHE = None
+
+
+def init_worker(memory_budget, max_entries):
+    global WORKER_CACHE
+    WORKER_CACHE = LRUCache(memory_budget, max_entries)
+
+
+def file_key(path):
+    stat = os.stat(path)
+    return (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+
+
+def cached(kind, key, load):
+    value = WORKER_CACHE.get((kind, key))
+    if value is None:
+        value = WORKER_CACHE.put((kind, key), load())
+    return value
+
+
+def cached_config(path):
+    # returns the config and its casting cache, keyed alike so edits to the config invalidate both;
+    # the casting cache grows as jobs resolve speakers, so it is an entry of its own that is resized
+    # after every job rather than counted once with the config
+    key = file_key(path)
+    config = cached('config', key, lambda: json.load(open(path, 'r')))
+    castings = cached('castings', key, dict)
+    return config, castings, ('castings', key)
+
+
+def cached_script_list(path, schema_path):
+    from pft import script_to_list
+    return cached('script', (file_key(path), file_key(schema_path)), lambda: script_to_list(path, schema_path))
+
+
+def cached_cues(path, columns, renames):
+    from cues import read_cues
+    return cached('cues', (file_key(path), tuple(columns)), lambda: read_cues(path, columns, renames))
+
+
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+#  @SECTION: Jobs
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+
+
+def job_cues(tool, path, options):
+    # returns (stage, cues, changes), changes only for pftscript2tsv jobs with a revision cache
+    from cues import merge_cues, normalised_lines_to_cues, revise_script_cues, revision_cache_name
+    from pft import normalise_script_list
+
+    if tool == 'pftscript2tsv':
+        if options.get('revision_cache') is not None:
+            # the revision cache already skips unchanged rows, so the worker caches are not used
+            cache_path = revision_cache_name(options['revision_cache'], file_names(path))
+            return ('gen', *revise_script_cues(path, options['schema'], options['speaker_cfg'], cache_path, options['ratio']))
+
+        config, castings, castings_key = cached_config(options['speaker_cfg'])
+        data = cached_script_list(path, options['schema'])
+        lines = normalise_script_list(data, config, options['ratio'], castings)
+        WORKER_CACHE.resize(castings_key)
+        return 'gen', normalised_lines_to_cues(lines), None
+
+    if tool == 'mergecues':
+        cues = cached_cues(path, options['columns'], options['renames'])
+        return 'merged', merge_cues(cues, options['ideal_duration'], options['max_duration']), None
+
+    raise Exception(f'unknown tool: {tool}')
+
+
+def run_job(job):
+    from cues import change_counts, changes_name, cue_table_name, format_tsv_cue, write_changes, write_cues
+
+    tool = job['tool']
+    path = job['path']
+    options = job['options']
+    result = {'path': path, 'pid': os.getpid()}
+
+    try:
+        stage, sorted_cues, changes = job_cues(tool, path, options)
+        file_name = cue_table_name(options['out'], file_names(path), stage, options['format'])
+        if changes is not None:
+            result['changes'] = change_counts(changes)
+        if not options['dry_run']:
+            write_cues(file_name, sorted_cues, options['format'])
+            if changes is not None:
+                write_changes(changes_name(options['out'], file_names(path)), changes)
+            result['output'] = file_name
+        else:
+            result['lines'] = [format_tsv_cue(x) for x in sorted_cues]
+        result['status'] = 'completed'
+    except Exception as e:
+        result['status'] = 'failed'
+        result['reason'] = str(e)
+
+    result['cache'] = WORKER_CACHE.stats()
+    return result
@@ -1 +1,3 @@
 from .console import *
+from .metrics import *
+from .profiling import *
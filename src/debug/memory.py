@@ -0,0 +1,81 @@
+import os
+import sys
+import threading
+import tracemalloc
+
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+#  @SECTION: Globals
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+
+
+RSS_SAMPLE_INTERVAL = 0.01
+PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+MB = 1024 * 1024
+
+
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+#  @SECTION: Resident Set Size
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+
+
+def current_rss():
+    # bytes resident for this process; falls back to the lifetime peak where /proc is unavailable
+    try:
+        with open('/proc/self/statm', 'rb') as file:
+            return int(file.read().split()[1]) * PAGE_SIZE
+    except (OSError, IndexError, ValueError):
+        pass
+
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == 'darwin' else peak * 1024
+    except Exception:
+        return 0
+
+
+class RssSampler:
+    # samples the resident set size on a background thread and keeps the peak
+    _interval = RSS_SAMPLE_INTERVAL
+    _thread = None
+    _stop = None
+    start_rss = 0
+    peak_rss = 0
+
+    def __init__(self, interval=RSS_SAMPLE_INTERVAL):
+        self._interval = interval
+        self._stop = threading.Event()
+
+    def _run(self):
+        while not self._stop.wait(self._interval):
+            self.peak_rss = max(self.peak_rss, current_rss())
+
+    def start(self):
+        self.start_rss = current_rss()
+        self.peak_rss = self.start_rss
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.peak_rss = max(self.peak_rss, current_rss())
+        return self.peak_rss
+
+
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+#  @SECTION: Python Heap
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+
+# tracemalloc slows allocation-heavy code noticeably, so it is only started on request
+
+
+def start_heap_tracing():
+    if not tracemalloc.is_tracing():
+        tracemalloc.start()
+    tracemalloc.reset_peak()
+
+
+def heap_peak():
+    return tracemalloc.get_traced_memory()[1] if tracemalloc.is_tracing() else None
@@ -0,0 +1,258 @@
+import functools
+import json
+import os
+import queue
+import sys
+import time
+import multiprocessing as mp
+from contextlib import contextmanager
+from debug.memory import MB, RssSampler, heap_peak, start_heap_tracing
+
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+#  @SECTION: Globals
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+
+# each process has at most one recorder; when it is None every hook below is a cheap no-op
+
+METRICS = None
+METRICS_POLL_SECONDS = 0.1
+
+
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+#  @SECTION: Recording
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+
+# a record is sent for every processed file:
+#   {'event': 'file', 'tool', 'file', 'pid', 'wall', 'cpu', 'rss_start', 'rss_peak', 'heap_peak',
+#    'stages': {stage: {'calls', 'wall', 'cpu', 'rows_in', 'rows_out'}}, 'counters': {...}}
+# workers reporting to a collector also announce {'event': 'begin', 'file', 'pid'} so a worker that
+# is killed mid-file can be blamed on that file; heap_peak is None unless heap tracing is on
+
+
+class MetricsRecorder:
+    _tool = ''
+    _sink = None
+    _announce = False
+    _trace_heap = False
+    _rss = None
+    _file = None
+    _start = (0.0, 0.0)
+    _stages = {}
+    _counters = {}
+
+    def __init__(self, tool, sink, announce=False, trace_heap=False):
+        self._tool = tool
+        self._sink = sink
+        self._announce = announce
+        self._trace_heap = trace_heap
+        self._file = None
+        self._stages = {}
+        self._counters = {}
+
+    def begin_file(self, path):
+        self._file = path
+        self._stages = {}
+        self._counters = {}
+        if self._announce:
+            self._sink({'event': 'begin', 'file': path, 'pid': os.getpid()})
+        if self._trace_heap:
+            start_heap_tracing()
+        self._rss = RssSampler().start()
+        self._start = (time.perf_counter(), time.process_time())
+
+    def end_file(self):
+        wall = time.perf_counter() - self._start[0]
+        cpu = time.process_time() - self._start[1]
+        self._rss.stop()
+        record = {
+                     'event': 'file',
+                     'tool': self._tool,
+                     'file': self._file,
+                     'pid': os.getpid(),
+                     'wall': wall,
+                     'cpu': cpu,
+                     'rss_start': self._rss.start_rss,
+                     'rss_peak': self._rss.peak_rss,
+                     'heap_peak': heap_peak() if self._trace_heap else None,
+                     'stages': self._stages,
+                     'counters': self._counters,
+                 }
+        self._file = None
+        self._sink(record)
+
+    def add_stage(self, name, wall, cpu, rows_in, rows_out):
+        stage = self._stages.setdefault(name, {'calls': 0, 'wall': 0.0, 'cpu': 0.0, 'rows_in': 0, 'rows_out': 0})
+        stage['calls'] += 1
+        stage['wall'] += wall
+        stage['cpu'] += cpu
+        stage['rows_in'] += rows_in
+        stage['rows_out'] += rows_out
+
+    def count(self, name, n):
+        self._counters[name] = self._counters.get(name, 0) + n
+
+
+class MetricsChannel:
+    # handed to workers by a MetricsCollector; carries the queue and what to record
+    queue = None
+    trace_heap = False
+
+    def __init__(self, queue, trace_heap=False):
+        self.queue = queue
+        self.trace_heap = trace_heap
+
+
+def enable_metrics(tool, sink, trace_heap=False):
+    # sink is a MetricsChannel or any callable taking a record
+    global METRICS
+    if isinstance(sink, MetricsChannel):
+        METRICS = MetricsRecorder(tool, sink.queue.put, True, sink.trace_heap)
+    else:
+        METRICS = MetricsRecorder(tool, sink, False, trace_heap)
+    return METRICS
+
+
+def disable_metrics():
+    global METRICS
+    METRICS = None
+
+
+@contextmanager
+def metrics_file(path):
+    if METRICS is None:
+        yield
+        return
+
+    METRICS.begin_file(path)
+    try:
+        yield
+    finally:
+        METRICS.end_file()
+
+
+def metrics_count(name, n=1):
+    if METRICS is not None:
+        METRICS.count(name, n)
+
+
+def metrics_stage(name, rows_in=None, rows_out=None):
+    # decorator timing every call of a stage; rows_in is given the call arguments, rows_out the result
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if METRICS is None:
+                return fn(*args, **kwargs)
+
+            wall = time.perf_counter()
+            cpu = time.process_time()
+            result = fn(*args, **kwargs)
+            METRICS.add_stage(name,
+                              time.perf_counter() - wall,
+                              time.process_time() - cpu,
+                              0 if rows_in is None else rows_in(*args, **kwargs),
+                              0 if rows_out is None else rows_out(result))
+            return result
+
+        return wrapper
+
+    return decorator
+
+
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+#  @SECTION: Collecting
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+
+
+class MetricsCollector:
+    _path = None
+    _queue = None
+    _trace_heap = False
+    _records = []
+    _current = {}
+
+    def __init__(self, path, trace_heap=False):
+        self._path = path
+        self._queue = mp.Queue()
+        self._trace_heap = trace_heap
+        self._records = []
+        self._current = {}
+        open(path, 'w').close()
+
+    @property
+    def channel(self):
+        return MetricsChannel(self._queue, self._trace_heap)
+
+    def poll(self, timeout=0, drain=False):
+        # moves records that have arrived into the JSONL file; drain keeps reading until the queue is
+        # empty, which only guarantees completeness once every worker has exited
+        with open(self._path, 'a') as file:
+            while True:
+                try:
+                    record = self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    if drain and not self._queue.empty():
+                        continue
+                    return
+
+                if record['event'] == 'begin':
+                    self._current[record['pid']] = record['file']
+                    continue
+                self._current.pop(record['pid'], None)
+                self._records.append(record)
+                file.write(json.dumps(record) + '\n')
+
+    def wait(self, pool):
+        # drains records while the workers run so none of them blocks on a full queue
+        while any(p.is_alive() for p in pool):
+            self.poll(METRICS_POLL_SECONDS)
+
+        for p in pool:
+            p.join()
+        self.poll(drain=True)
+
+        for p in pool:
+            if p.exitcode != 0 and p.pid in self._current:
+                print(f'worker {p.pid} exited with code {p.exitcode} while processing {self._current[p.pid]}', file=sys.stderr)
+
+        return self._records
+
+    def summary(self, stream=sys.stdout):
+        print_metrics_summary(self._records, stream)
+
+
+def write_metrics(path, records):
+    with open(path, 'w') as file:
+        for r in records:
+            file.write(json.dumps(r) + '\n')
+
+
+def print_metrics_summary(records, stream=sys.stdout):
+    stages = {}
+    counters = {}
+    for r in records:
+        for name, s in r['stages'].items():
+            total = stages.setdefault(name, {'files': 0, 'calls': 0, 'wall': 0.0, 'cpu': 0.0, 'rows_in': 0, 'rows_out': 0})
+            total['files'] += 1
+            for k in ['calls', 'wall', 'cpu', 'rows_in', 'rows_out']:
+                total[k] += s[k]
+        for name, n in r['counters'].items():
+            counters[name] = counters.get(name, 0) + n
+
+    print(f"{'stage'.ljust(16)}{'files':>8}{'calls':>8}{'wall s':>12}{'cpu s':>12}{'rows in':>12}{'rows out':>12}", file=stream)
+    for name, s in sorted(stages.items(), key=lambda x: x[1]['wall'], reverse=True):
+        print(f"{name.ljust(16)}{s['files']:>8}{s['calls']:>8}{s['wall']:>12.3f}{s['cpu']:>12.3f}{s['rows_in']:>12}{s['rows_out']:>12}", file=stream)
+
+    print(f"{'total'.ljust(16)}{len(records):>8}{'':>8}{sum(x['wall'] for x in records):>12.3f}{sum(x['cpu'] for x in records):>12.3f}", file=stream)
+    for name, n in sorted(counters.items()):
+        print(f'{name}: {n}', file=stream)
+
+    if len(records) > 0:
+        slowest = max(records, key=lambda x: x['wall'])
+        print(f"slowest file: {slowest['file']} ({slowest['wall']:.3f}s)", file=stream)
+        largest = max(records, key=lambda x: x.get('rss_peak', 0))
+        print(f"largest peak rss: {largest['file']} ({largest.get('rss_peak', 0) / MB:.1f} MB, "
+              f"+{(largest.get('rss_peak', 0) - largest.get('rss_start', 0)) / MB:.1f} MB during the file)", file=stream)
+        heaps = [x for x in records if x.get('heap_peak') is not None]
+        if len(heaps) > 0:
+            largest = max(heaps, key=lambda x: x['heap_peak'])
+            print(f"largest python heap peak: {largest['file']} ({largest['heap_peak'] / MB:.1f} MB)", file=stream)
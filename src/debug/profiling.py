@@ -0,0 +1,184 @@
+import cProfile
+import collections
+import os
+import pstats
+import shutil
+import sys
+import tempfile
+import threading
+from contextlib import contextmanager
+
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+#  @SECTION: Globals
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+
+
+SAMPLE_INTERVAL_DEFAULT = 0.005
+PROFILE_LIMIT_DEFAULT = 30
+PROFILE_SORT_DEFAULT = 'cumulative'
+
+
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+#  @SECTION: Sampling
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+
+# the sampler periodically records the full stack of one thread, which gives exact stacks for
+# flamegraphs where cProfile only keeps caller/callee pairs
+
+
+def frame_label(frame):
+    code = frame.f_code
+    name = getattr(code, 'co_qualname', code.co_name)
+    return f'{name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})'.replace(';', ',')
+
+
+class SamplingProfiler:
+    _interval = SAMPLE_INTERVAL_DEFAULT
+    _thread_id = None
+    _thread = None
+    _stop = None
+    stacks = None
+
+    def __init__(self, interval=SAMPLE_INTERVAL_DEFAULT, thread_id=None):
+        self._interval = interval
+        self._thread_id = threading.get_ident() if thread_id is None else thread_id
+        self._stop = threading.Event()
+        self.stacks = collections.Counter()
+
+    def _run(self):
+        while not self._stop.wait(self._interval):
+            frame = sys._current_frames().get(self._thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(frame_label(frame))
+                frame = frame.f_back
+            if len(stack) > 0:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+
+def write_collapsed(path, stacks):
+    with open(path, 'w') as file:
+        for stack, count in sorted(stacks.items()):
+            file.write(f'{stack} {count}\n')
+
+
+def read_collapsed(path):
+    stacks = collections.Counter()
+    with open(path, 'r') as file:
+        for line in file:
+            stack, _, count = line.rstrip('\n').rpartition(' ')
+            if stack != '':
+                stacks[stack] += int(count)
+    return stacks
+
+
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+#  @SECTION: Profiling
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+
+# e.g. attaching evidence of a slow script to a ticket:
+#   with profiled('slow.prof', 'slow.collapsed') as profiler:
+#       normalised_script(path, schema, cfg)
+#   print_profile(pstats.Stats(profiler))
+
+
+@contextmanager
+def profiled(path=None, collapsed_path=None, interval=SAMPLE_INTERVAL_DEFAULT):
+    sampler = None
+    if collapsed_path is not None:
+        sampler = SamplingProfiler(interval)
+        sampler.start()
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield profiler
+    finally:
+        profiler.disable()
+        if sampler is not None:
+            sampler.stop()
+            write_collapsed(collapsed_path, sampler.stacks)
+        if path is not None:
+            profiler.dump_stats(path)
+
+
+def profile_call(fn, *args, **kwargs):
+    # returns (result, pstats.Stats) of a single call
+    with profiled() as profiler:
+        result = fn(*args, **kwargs)
+    return result, pstats.Stats(profiler)
+
+
+@contextmanager
+def worker_profile(paths):
+    # paths is None, or the (profile, collapsed stacks) paths handed to a worker by a ProfileCollector
+    if paths is None:
+        yield
+        return
+
+    with profiled(*paths):
+        yield
+
+
+def print_profile(stats, limit=PROFILE_LIMIT_DEFAULT, sort=PROFILE_SORT_DEFAULT, stream=sys.stdout):
+    stats.stream = stream
+    stats.strip_dirs().sort_stats(sort).print_stats(limit)
+
+
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+#  @SECTION: Collecting
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+
+
+class ProfileCollector:
+    _path = None
+    _collapsed_path = None
+    _directory = None
+    _workers = 0
+
+    def __init__(self, path, collapsed_path=None):
+        self._path = path
+        self._collapsed_path = collapsed_path
+        self._directory = tempfile.mkdtemp(prefix='adrtools-profile-')
+        self._workers = 0
+
+    def worker_paths(self):
+        # paths for the next worker; its profiles are written there when it finishes
+        i = self._workers
+        self._workers += 1
+        collapsed = None if self._collapsed_path is None else os.path.join(self._directory, f'{i}.collapsed')
+        return (os.path.join(self._directory, f'{i}.prof'), collapsed)
+
+    def finish(self, limit=PROFILE_LIMIT_DEFAULT, stream=sys.stdout):
+        # merges the worker profiles once every worker has exited
+        try:
+            paths = [os.path.join(self._directory, f'{i}.prof') for i in range(self._workers)]
+            paths = [x for x in paths if os.path.isfile(x)]
+            if len(paths) == 0:
+                return None
+
+            stats = pstats.Stats(*paths)
+            stats.dump_stats(self._path)
+            print_profile(stats, limit, stream=stream)
+            print(f'profile of {len(paths)} workers written to {self._path}', file=stream)
+
+            if self._collapsed_path is not None:
+                stacks = collections.Counter()
+                for i in range(self._workers):
+                    p = os.path.join(self._directory, f'{i}.collapsed')
+                    if os.path.isfile(p):
+                        stacks.update(read_collapsed(p))
+                write_collapsed(self._collapsed_path, stacks)
+                print(f'collapsed stacks written to {self._collapsed_path}', file=stream)
+
+            return stats
+        finally:
+            shutil.rmtree(self._directory, ignore_errors=True)
@@ -0,0 +1,2 @@
+from .lines import *
+from .search import *
@@ -0,0 +1,165 @@
+import os
+import sqlite3
+import multiprocessing as mp
+from utils import file_signatures
+from watch import file_sha1
+
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+#  @SECTION: Globals
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+
+
+LIBRARY_INDEX_DEFAULT = os.path.join(os.path.expanduser('~'), '.cache', 'adrtools', 'library.sqlite')
+LIBRARY_INDEX_VERSION = 1
+LIBRARY_SCHEMA = [
+    'CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)',
+    'CREATE TABLE IF NOT EXISTS files (id INTEGER PRIMARY KEY, path TEXT UNIQUE, size INTEGER, mtime_ns INTEGER, schema TEXT)',
+    'CREATE TABLE IF NOT EXISTS lines (file_id INTEGER, row INTEGER, tcin TEXT, tcout TEXT, speaker TEXT, line TEXT, PRIMARY KEY (file_id, row)) WITHOUT ROWID',
+    'CREATE TABLE IF NOT EXISTS characters (name TEXT, file_id INTEGER, row INTEGER, PRIMARY KEY (name, file_id, row)) WITHOUT ROWID',
+]
+
+
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+#  @SECTION: Index Storage
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+
+# the index maps lower-cased character names (as spoken, and without variation words such as
+# "'s voice") to the script rows they speak in; files are keyed by path and re-read only when
+# their size, mtime or the schema they were parsed with changed
+
+
+def open_library(path):
+    directory = os.path.dirname(os.path.abspath(path))
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+
+    db = sqlite3.connect(path)
+    db.execute('PRAGMA journal_mode=WAL')
+    db.execute('PRAGMA synchronous=NORMAL')
+    for statement in LIBRARY_SCHEMA:
+        db.execute(statement)
+
+    version = db.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+    if version is not None and int(version[0]) != LIBRARY_INDEX_VERSION:
+        raise Exception(f'library index at {path} has version {version[0]}, expected {LIBRARY_INDEX_VERSION}; delete it to rebuild')
+    db.execute("INSERT OR REPLACE INTO meta VALUES ('version', ?)", (str(LIBRARY_INDEX_VERSION),))
+    db.commit()
+
+    return db
+
+
+def script_rows(path, schema_path):
+    # returns [(row, tcin, tcout, speaker, line, [character names])] for every row of the script
+    from pft import canonical_speaker_name, script_to_list, speaker_names
+
+    rows = []
+    for i, entry in enumerate(script_to_list(path, schema_path)[1:]):
+        fields = {k: v for k, v in entry}
+        speaker = fields.get('speaker', '')
+        names = set()
+        for name in speaker_names(speaker):
+            names.add(name)
+            try:
+                names.add(canonical_speaker_name(name))
+            except Exception:
+                pass
+
+        rows.append((i, fields.get('tcin', '').strip(), fields.get('tcout', '').strip(), speaker.strip(), fields.get('line', '').strip(), sorted(names)))
+
+    return rows
+
+
+def read_script_rows(job):
+    path, schema_path = job
+    try:
+        return path, script_rows(path, schema_path), None
+    except Exception as e:
+        return path, None, str(e)
+
+
+def replace_file_rows(db, path, signature, schema_sha1, rows):
+    db.execute('DELETE FROM lines WHERE file_id IN (SELECT id FROM files WHERE path = ?)', (path,))
+    db.execute('DELETE FROM characters WHERE file_id IN (SELECT id FROM files WHERE path = ?)', (path,))
+    db.execute('INSERT OR REPLACE INTO files (id, path, size, mtime_ns, schema) VALUES ((SELECT id FROM files WHERE path = ?), ?, ?, ?, ?)',
+               (path, path, *signature, schema_sha1))
+    file_id = db.execute('SELECT id FROM files WHERE path = ?', (path,)).fetchone()[0]
+
+    db.executemany('INSERT INTO lines VALUES (?, ?, ?, ?, ?, ?)', [(file_id, *r[:5]) for r in rows])
+    db.executemany('INSERT INTO characters VALUES (?, ?, ?)', [(n, file_id, r[0]) for r in rows for n in r[5]])
+    return file_id
+
+
+def remove_file(db, path):
+    db.execute('DELETE FROM lines WHERE file_id IN (SELECT id FROM files WHERE path = ?)', (path,))
+    db.execute('DELETE FROM characters WHERE file_id IN (SELECT id FROM files WHERE path = ?)', (path,))
+    db.execute('DELETE FROM files WHERE path = ?', (path,))
+
+
+def update_library(db, paths, schema_path, jobs=os.cpu_count(), prune=True, on_file=None, files=None):
+    # re-reads only scripts whose size, mtime or schema changed; files are the paths' discover_files
+    # entries, if at hand; returns (updated, removed, failed)
+    schema_sha1 = file_sha1(schema_path)
+    indexed = {x[0]: x[1:] for x in db.execute('SELECT path, size, mtime_ns, schema FROM files')}
+
+    signatures = file_signatures(paths, files)
+    stale = [p for p in paths if indexed.get(p) != (*signatures[p], schema_sha1)]
+
+    removed = []
+    if prune:
+        removed = [p for p in indexed if not os.path.isfile(p)]
+        for p in removed:
+            remove_file(db, p)
+
+    failed = []
+    updated = 0
+    if len(stale) > 0:
+        with mp.Pool(max(1, min(jobs, len(stale)))) as pool:
+            for path, rows, error in pool.imap_unordered(read_script_rows, [(p, schema_path) for p in stale]):
+                if error is not None:
+                    failed.append((path, error))
+                else:
+                    replace_file_rows(db, path, signatures[path], schema_sha1, rows)
+                    updated += 1
+                if on_file is not None:
+                    on_file(path, error)
+
+    db.commit()
+    return updated, removed, failed
+
+
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+#  @SECTION: Queries
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+
+
+def character_lines(db, character, limit=None, per_file=None):
+    # rows spoken by a character, in path/row order; per_file caps examples taken from one script
+    query = '''SELECT f.path, l.row, l.tcin, l.tcout, l.speaker, l.line FROM characters c
+               JOIN lines l ON l.file_id = c.file_id AND l.row = c.row
+               JOIN files f ON f.id = c.file_id
+               WHERE c.name = ? ORDER BY f.path, l.row'''
+
+    collect = []
+    taken = {}
+    for path, row, tcin, tcout, speaker, line in db.execute(query, (character.lower().strip(),)):
+        if limit is not None and len(collect) >= limit:
+            break
+        if per_file is not None and taken.get(path, 0) >= per_file:
+            continue
+
+        taken[path] = taken.get(path, 0) + 1
+        collect.append({'file': path, 'row': row, 'tcin': tcin, 'tcout': tcout, 'speaker': speaker, 'line': line})
+
+    return collect
+
+
+def library_characters(db):
+    return db.execute('SELECT name, COUNT(*) FROM characters GROUP BY name ORDER BY name').fetchall()
+
+
+def library_stats(db):
+    return {
+               'files': db.execute('SELECT COUNT(*) FROM files').fetchone()[0],
+               'lines': db.execute('SELECT COUNT(*) FROM lines').fetchone()[0],
+               'characters': db.execute('SELECT COUNT(DISTINCT name) FROM characters').fetchone()[0],
+           }
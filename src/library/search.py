@@ -0,0 +1,245 @@
+import os
+import re
+import multiprocessing as mp
+from library.lines import open_library
+from utils import file_signatures
+from watch import file_sha1
+
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+#  @SECTION: Globals
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+
+
+SEARCH_SCHEMA = [
+    'CREATE TABLE IF NOT EXISTS search_files (id INTEGER PRIMARY KEY, path TEXT UNIQUE, size INTEGER, mtime_ns INTEGER, deps TEXT)',
+    'CREATE TABLE IF NOT EXISTS search_lines (file_id INTEGER, row INTEGER, tcin TEXT, tcout TEXT, character TEXT, actor TEXT, line TEXT, PRIMARY KEY (file_id, row)) WITHOUT ROWID',
+    'CREATE TABLE IF NOT EXISTS postings (term TEXT, file_id INTEGER, rows BLOB, PRIMARY KEY (term, file_id)) WITHOUT ROWID',
+]
+SEARCH_TOKEN_PATTERN = re.compile(r"[^\W_]+")
+SEARCH_STRIPPED_QUOTES = str.maketrans('', '', '\'"\u2018\u2019')
+SEARCH_TOKENS_VERSION = 2
+SEARCH_QUERY_PATTERN = re.compile(r'"([^"]*)"|(\S+)')
+
+
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+#  @SECTION: Postings
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+
+# postings hold, per term and script, the ascending ids of the normalised lines containing the
+# term; ids are stored as the varint encoded gaps between consecutive ids
+#
+# normalised lines have their quotes stripped, so "don't" is indexed as 'dont'; tokenise strips them
+# from queries and lines alike so both meet on the same terms, and SEARCH_TOKENS_VERSION is part of
+# every file's dependencies so indexes built with other terms are rebuilt
+
+
+def tokenise(text):
+    return [x.lower() for x in SEARCH_TOKEN_PATTERN.findall(text.translate(SEARCH_STRIPPED_QUOTES))]
+
+
+def encode_postings(rows):
+    encoded = bytearray()
+    prev = 0
+    for r in rows:
+        gap = r - prev
+        prev = r
+        while gap >= 0x80:
+            encoded.append((gap & 0x7F) | 0x80)
+            gap >>= 7
+        encoded.append(gap)
+
+    return bytes(encoded)
+
+
+def decode_postings(data):
+    rows = []
+    value = 0
+    shift = 0
+    prev = 0
+    for b in data:
+        value |= (b & 0x7F) << shift
+        shift += 7
+        if b < 0x80:
+            prev += value
+            rows.append(prev)
+            value = 0
+            shift = 0
+
+    return rows
+
+
+def line_postings(lines):
+    # lines are (row, text) in ascending row order
+    postings = {}
+    for row, text in lines:
+        for term in set(tokenise(text)):
+            postings.setdefault(term, []).append(row)
+
+    return {k: encode_postings(v) for k, v in postings.items()}
+
+
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+#  @SECTION: Index Storage
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+
+
+def open_search_index(path):
+    db = open_library(path)
+    for statement in SEARCH_SCHEMA:
+        db.execute(statement)
+    db.commit()
+    return db
+
+
+def search_dependencies(schema_path, speaker_config_path, ratio):
+    return f'{SEARCH_TOKENS_VERSION}:{file_sha1(schema_path)}:{file_sha1(speaker_config_path)}:{ratio}'
+
+
+def read_search_lines(job):
+    from pft import normalised_script
+
+    path, schema_path, speaker_config_path, ratio = job
+    try:
+        lines = []
+        for x in normalised_script(path, schema_path, speaker_config_path, ratio)[1:]:
+            text = x['line'].replace(f"[{x['character']}]", "").strip()
+            lines.append((int(x['id']), x['start'], x['end'], x['character'], x['age'], text))
+        return path, lines, line_postings([(x[0], x[5]) for x in lines]), None
+    except Exception as e:
+        return path, None, None, str(e)
+
+
+def remove_search_file(db, path):
+    for table in ['search_lines', 'postings']:
+        db.execute(f'DELETE FROM {table} WHERE file_id IN (SELECT id FROM search_files WHERE path = ?)', (path,))
+    db.execute('DELETE FROM search_files WHERE path = ?', (path,))
+
+
+def update_search_index(db, paths, schema_path, speaker_config_path, ratio, jobs=os.cpu_count(), prune=True, on_file=None, files=None):
+    # re-normalises only scripts whose size, mtime, schema, speaker config or ratio changed; files are
+    # the paths' discover_files entries, if at hand; returns (updated, removed, failed)
+    deps = search_dependencies(schema_path, speaker_config_path, ratio)
+    indexed = {x[0]: x[1:] for x in db.execute('SELECT path, size, mtime_ns, deps FROM search_files')}
+
+    signatures = file_signatures(paths, files)
+    stale = [p for p in paths if indexed.get(p) != (*signatures[p], deps)]
+
+    removed = []
+    if prune:
+        removed = [p for p in indexed if not os.path.isfile(p)]
+        for p in removed:
+            remove_search_file(db, p)
+
+    failed = []
+    updated = 0
+    if len(stale) > 0:
+        with mp.Pool(max(1, min(jobs, len(stale)))) as pool:
+            tasks = [(p, schema_path, speaker_config_path, ratio) for p in stale]
+            for path, lines, postings, error in pool.imap_unordered(read_search_lines, tasks):
+                if error is not None:
+                    failed.append((path, error))
+                else:
+                    remove_search_file(db, path)
+                    file_id = db.execute('INSERT INTO search_files (path, size, mtime_ns, deps) VALUES (?, ?, ?, ?)',
+                                         (path, *signatures[path], deps)).lastrowid
+                    db.executemany('INSERT INTO search_lines VALUES (?, ?, ?, ?, ?, ?, ?)', [(file_id, *x) for x in lines])
+                    db.executemany('INSERT INTO postings VALUES (?, ?, ?)', [(k, file_id, v) for k, v in postings.items()])
+                    updated += 1
+                if on_file is not None:
+                    on_file(path, error)
+
+    db.commit()
+    return updated, removed, failed
+
+
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+#  @SECTION: Queries
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+
+# queries are whitespace separated clauses that must all match a line:
+#   word        lines containing the word
+#   wor*        lines containing a word starting with 'wor'
+#   "a phrase"  lines containing the words consecutively
+
+
+def parse_query(query):
+    clauses = []
+    for phrase, word in SEARCH_QUERY_PATTERN.findall(query):
+        if phrase != '':
+            terms = tokenise(phrase)
+            if len(terms) > 0:
+                clauses.append(('phrase', terms))
+        elif word.endswith('*'):
+            terms = tokenise(word[:-1])
+            if len(terms) > 0:
+                clauses.append(('prefix', terms[-1]))
+                clauses.extend([('term', x) for x in terms[:-1]])
+        else:
+            clauses.extend([('term', x) for x in tokenise(word)])
+
+    return clauses
+
+
+def term_rows(db, term, prefix=False):
+    # returns {file_id: set(rows)} for an exact term, or for every term starting with a prefix
+    if prefix:
+        cursor = db.execute('SELECT file_id, rows FROM postings WHERE term >= ? AND term < ?', (term, term + '\U0010ffff'))
+    else:
+        cursor = db.execute('SELECT file_id, rows FROM postings WHERE term = ?', (term,))
+
+    collect = {}
+    for file_id, rows in cursor:
+        collect.setdefault(file_id, set()).update(decode_postings(rows))
+
+    return collect
+
+
+def intersect_rows(a, b):
+    if a is None:
+        return b
+    return {k: a[k] & v for k, v in b.items() if k in a and len(a[k] & v) > 0}
+
+
+def contains_phrase(tokens, phrase):
+    n = len(phrase)
+    return any(tokens[i:i + n] == phrase for i in range(len(tokens) - n + 1))
+
+
+def search_lines(db, query, character=None, limit=None):
+    clauses = parse_query(query)
+    if len(clauses) == 0:
+        return []
+
+    candidates = None
+    phrases = []
+    for kind, value in clauses:
+        if kind == 'phrase':
+            phrases.append(value)
+            for term in value:
+                candidates = intersect_rows(candidates, term_rows(db, term))
+        else:
+            candidates = intersect_rows(candidates, term_rows(db, value, kind == 'prefix'))
+
+        if len(candidates) == 0:
+            return []
+
+    files = dict(db.execute('SELECT id, path FROM search_files'))
+    collect = []
+    for file_id in sorted(candidates, key=lambda x: files.get(x, '')):
+        rows = sorted(candidates[file_id])
+        for i in range(0, len(rows), 500):
+            chunk = rows[i:i + 500]
+            query = f"SELECT row, tcin, tcout, character, actor, line FROM search_lines WHERE file_id = ? AND row IN ({','.join('?' * len(chunk))}) ORDER BY row"
+            for row, tcin, tcout, speaker, actor, line in db.execute(query, (file_id, *chunk)):
+                if character is not None and speaker.lower() != character.lower().strip():
+                    continue
+                if len(phrases) > 0:
+                    tokens = tokenise(line)
+                    if not all(contains_phrase(tokens, x) for x in phrases):
+                        continue
+
+                collect.append({'file': files[file_id], 'row': row, 'tcin': tcin, 'tcout': tcout, 'character': speaker, 'actor': actor, 'line': line})
+                if limit is not None and len(collect) >= limit:
+                    return collect
+
+    return collect
@@ -0,0 +1 @@
+from .containers import *
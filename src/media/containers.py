@@ -0,0 +1,273 @@
+import os
+import struct
+from fractions import Fraction
+from chrono import FPS_DEFAULT
+
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+#  @SECTION: Globals
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+
+
+MP4_CONTAINER_BOXES = [b'moov', b'trak', b'mdia', b'minf', b'stbl']
+MXF_KEY_PREFIX = bytes.fromhex('060e2b34')
+MXF_PARTITION_PACK_KEY = bytes.fromhex('060e2b34020501010d010201')
+MXF_INDEX_SEGMENT_KEY = bytes.fromhex('060e2b34025301010d01020101100100')
+MXF_TAG_INDEX_EDIT_RATE = 0x3F0B
+MXF_TAG_INDEX_START_POSITION = 0x3F0C
+MXF_TAG_INDEX_DURATION = 0x3F0D
+MXF_TAG_INDEX_SID = 0x3F06
+MXF_RUN_IN_MAX = 65536
+BEXT_TIME_REFERENCE_OFFSET = 338
+
+
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+#  @SECTION: QuickTime/MP4
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+
+
+def mp4_iter_boxes(file, start, end):
+    offset = start
+    while offset + 8 <= end:
+        file.seek(offset)
+        size, box_type = struct.unpack('>I4s', file.read(8))
+        header_size = 8
+        if size == 1:
+            size = struct.unpack('>Q', file.read(8))[0]
+            header_size = 16
+        elif size == 0:
+            size = end - offset
+
+        if size < header_size:
+            raise Exception(f'malformed box {box_type} @ {offset}')
+
+        yield box_type, offset + header_size, min(offset + size, end)
+        offset += size
+
+
+def mp4_read_media_header(file, start):
+    # mvhd and mdhd share the layout of version, times, timescale and duration
+    file.seek(start)
+    version = file.read(4)[0]
+    if version == 1:
+        _, _, timescale, duration = struct.unpack('>QQIQ', file.read(28))
+    else:
+        _, _, timescale, duration = struct.unpack('>IIII', file.read(16))
+
+    return timescale, duration
+
+
+def mp4_read_stts(file, start):
+    file.seek(start + 4)
+    entry_count = struct.unpack('>I', file.read(4))[0]
+    data = file.read(entry_count * 8)
+    return [struct.unpack_from('>II', data, i * 8) for i in range(entry_count)]
+
+
+def mp4_find_video_track(file, start, end):
+    for box_type, box_start, box_end in mp4_iter_boxes(file, start, end):
+        if box_type != b'trak':
+            continue
+
+        handler = None
+        timescale = 0
+        stts = []
+        pending = [(box_start, box_end)]
+        while len(pending) > 0:
+            child_start, child_end = pending.pop()
+            for child_type, grandchild_start, grandchild_end in mp4_iter_boxes(file, child_start, child_end):
+                if child_type in MP4_CONTAINER_BOXES:
+                    pending.append((grandchild_start, grandchild_end))
+                elif child_type == b'hdlr':
+                    file.seek(grandchild_start + 8)
+                    handler = file.read(4)
+                elif child_type == b'mdhd':
+                    timescale, _ = mp4_read_media_header(file, grandchild_start)
+                elif child_type == b'stts':
+                    stts = mp4_read_stts(file, grandchild_start)
+
+        if handler == b'vide' and timescale > 0 and len(stts) > 0:
+            return timescale, stts
+
+    return None
+
+
+def read_mp4_runtime(path):
+    file_size = os.path.getsize(path)
+    with open(path, 'rb') as file:
+        for box_type, box_start, box_end in mp4_iter_boxes(file, 0, file_size):
+            if box_type != b'moov':
+                continue
+
+            track = mp4_find_video_track(file, box_start, box_end)
+            if track is None:
+                return None
+
+            timescale, stts = track
+            frames = sum(x[0] for x in stts)
+            media_duration = sum(x[0] * x[1] for x in stts)
+            if frames == 0 or media_duration == 0:
+                return None
+
+            frame_rate = Fraction(timescale, stts[0][1]) if len(stts) == 1 else Fraction(frames * timescale, media_duration).limit_denominator(1001)
+            return {'frames': frames, 'fps': frame_rate, 'start_frames': None}
+
+    return None
+
+
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+#  @SECTION: WAV/BWF
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+
+
+def read_wav_runtime(path, fps=FPS_DEFAULT):
+    file_size = os.path.getsize(path)
+    with open(path, 'rb') as file:
+        riff_id, _, wave_id = struct.unpack('<4sI4s', file.read(12))
+        if riff_id not in [b'RIFF', b'RF64', b'BW64'] or wave_id != b'WAVE':
+            return None
+
+        sample_rate = 0
+        block_align = 0
+        data_size = None
+        ds64_data_size = None
+        time_reference = None
+
+        offset = 12
+        while offset + 8 <= file_size:
+            file.seek(offset)
+            chunk_id, chunk_size = struct.unpack('<4sI', file.read(8))
+
+            if chunk_id == b'ds64':
+                _, ds64_data_size = struct.unpack('<QQ', file.read(16))
+            elif chunk_id == b'fmt ':
+                _, _, sample_rate, _, block_align = struct.unpack('<HHIIH', file.read(14))
+            elif chunk_id == b'bext' and chunk_size >= BEXT_TIME_REFERENCE_OFFSET + 8:
+                file.seek(offset + 8 + BEXT_TIME_REFERENCE_OFFSET)
+                time_reference = struct.unpack('<Q', file.read(8))[0]
+            elif chunk_id == b'data':
+                data_size = ds64_data_size if chunk_size == 0xFFFFFFFF and ds64_data_size is not None else chunk_size
+                chunk_size = data_size
+
+            offset += 8 + chunk_size + (chunk_size & 1)
+
+        if sample_rate == 0 or block_align == 0 or data_size is None:
+            return None
+
+        frame_rate = Fraction(fps).limit_denominator(1001)
+        samples = data_size // block_align
+        frames = round(Fraction(samples, sample_rate) * frame_rate)
+        start_frames = None if time_reference is None else round(Fraction(time_reference, sample_rate) * frame_rate)
+
+        return {'frames': frames, 'fps': frame_rate, 'start_frames': start_frames}
+
+
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+#  @SECTION: MXF
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+
+
+def mxf_read_klv(file, offset):
+    file.seek(offset)
+    key = file.read(16)
+    if len(key) < 16:
+        return None
+
+    length = file.read(1)[0]
+    header_size = 17
+    if length & 0x80:
+        length_size = length & 0x7F
+        length = int.from_bytes(file.read(length_size), 'big')
+        header_size += length_size
+
+    return key, offset + header_size, length
+
+
+def mxf_read_index_segment(file, start, length):
+    file.seek(start)
+    data = file.read(length)
+    segment = {}
+    i = 0
+    while i + 4 <= len(data):
+        tag, size = struct.unpack_from('>HH', data, i)
+        value = data[i + 4:i + 4 + size]
+        if tag == MXF_TAG_INDEX_EDIT_RATE:
+            segment['edit_rate'] = Fraction(*struct.unpack('>ii', value))
+        elif tag == MXF_TAG_INDEX_START_POSITION:
+            segment['start'] = struct.unpack('>q', value)[0]
+        elif tag == MXF_TAG_INDEX_DURATION:
+            segment['duration'] = struct.unpack('>q', value)[0]
+        elif tag == MXF_TAG_INDEX_SID:
+            segment['sid'] = struct.unpack('>I', value)[0]
+        i += 4 + size
+
+    return segment
+
+
+def read_mxf_runtime(path):
+    with open(path, 'rb') as file:
+        run_in = file.read(MXF_RUN_IN_MAX).find(MXF_PARTITION_PACK_KEY)
+        if run_in < 0:
+            return None
+
+        # partitions are visited from the footer backwards; every KLV of a partition's header metadata
+        # and index tables is stepped over by its length, and only index table segments are read
+        header = mxf_read_klv(file, run_in)
+        file.seek(header[1] + 24)
+        partition_offset = struct.unpack('>Q', file.read(8))[0]
+        if partition_offset == 0:
+            return None
+
+        segments = {}
+        visited = set()
+        while partition_offset not in visited:
+            visited.add(partition_offset)
+            klv = mxf_read_klv(file, run_in + partition_offset)
+            if klv is None or not klv[0].startswith(MXF_PARTITION_PACK_KEY):
+                return None
+
+            key, value_start, length = klv
+            file.seek(value_start + 16)
+            previous_partition, _, header_bytes, index_bytes = struct.unpack('>QQQQ', file.read(32))
+
+            offset = value_start + length
+            region_end = offset + header_bytes + index_bytes
+            while offset < region_end:
+                klv = mxf_read_klv(file, offset)
+                if klv is None or not klv[0].startswith(MXF_KEY_PREFIX):
+                    break
+                if klv[0] == MXF_INDEX_SEGMENT_KEY:
+                    segment = mxf_read_index_segment(file, klv[1], klv[2])
+                    if 'edit_rate' in segment and segment.get('duration', 0) > 0:
+                        segments[(segment.get('sid', 0), segment.get('start', 0))] = segment
+                offset = klv[1] + klv[2]
+
+            if partition_offset == 0:
+                break
+            partition_offset = previous_partition
+
+        if len(segments) == 0:
+            return None
+
+        sid = min(x[0] for x in segments.keys())
+        sid_segments = [v for k, v in segments.items() if k[0] == sid]
+        frames = sum(x['duration'] for x in sid_segments)
+        return {'frames': frames, 'fps': sid_segments[0]['edit_rate'], 'start_frames': None}
+
+
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+#  @SECTION: Dispatch
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+
+
+def read_native_runtime(path, fps=FPS_DEFAULT):
+    with open(path, 'rb') as file:
+        magic = file.read(12)
+
+    if magic[0:4] in [b'RIFF', b'RF64', b'BW64']:
+        return read_wav_runtime(path, fps)
+    if magic[4:8] in [b'ftyp', b'moov', b'mdat', b'free', b'wide', b'skip']:
+        return read_mp4_runtime(path)
+    if magic[0:4] == MXF_KEY_PREFIX:
+        return read_mxf_runtime(path)
+
+    return None
@@ -1 +1,2 @@
 from .procedures import *
+from .castings import *
@@ -0,0 +1,194 @@
+import json
+import os
+from utils import round_nearest
+from debug.metrics import metrics_count, metrics_stage
+
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+#  @SECTION: Globals
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+
+
+CASTING_INDEX_VERSION = 1
+
+
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+#  @SECTION: Parsing
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+
+# character lines are 'name:nickname:...\tignore:...' and casting lines 'name\t<gender><lo>-<hi>',
+# e.g. 'john\tM30-40'; castings are matched to characters by lowercased name
+
+
+def parse_character_line(line):
+    names = line.split("\t")
+    valid_names = names[0].split(":")
+    ignore_names = names[1].split(":") if len(names) > 1 else []
+    return valid_names[0].strip(), [x.strip() for x in valid_names[1:]], [x.strip() for x in ignore_names]
+
+
+def parse_casting_line(line):
+    # returns (name, gender, lo, hi), or None for a line without a readable casting
+    split_casting = line.split('\t')
+    if len(split_casting) < 2:
+        return None
+
+    try:
+        casting_range = split_casting[1].split('-')
+        gender = casting_range[0][0].strip()
+        lo = int(casting_range[0][1:].strip())
+        hi = int(casting_range[1].strip())
+    except (IndexError, ValueError):
+        return None
+
+    return split_casting[0].strip().lower(), gender, lo, hi
+
+
+def casting_range(mode_gender, mean_lo, mean_hi):
+    avg_lo = round_nearest(mean_lo, 5)
+    avg_hi = round_nearest(mean_hi, 5)
+    if avg_lo >= avg_hi:
+        age_dt = 5 if (mode_gender.upper() == 'M' or mode_gender.upper() == 'F') else 3
+        avg_lo = avg_hi - age_dt
+
+    return mode_gender.upper(), int(avg_lo), int(avg_hi)
+
+
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+#  @SECTION: Casting Index
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+
+# instead of every casting line, the index keeps running totals per source file and name:
+#   [count, sum of lo, sum of hi, {gender: [count, smallest line]}]
+# which is all aggregation needs; the most common gender wins and ties go to the gender with the
+# smallest line, the one statistics.mode would meet first over the sorted lines
+#
+# sources are indexed by path and re-read only when their size or mtime changes, so a persisted
+# index takes each new episode's castings in without reading earlier ones again; only the sources
+# given to the latest update are aggregated, others stay cached for later runs until they are
+# missing on disk, when they are pruned
+
+
+def casting_stats(lines):
+    names = {}
+    for line in lines:
+        parsed = parse_casting_line(line)
+        if parsed is None:
+            metrics_count('casting_lines_skipped')
+            continue
+
+        name, gender, lo, hi = parsed
+        stats = names.setdefault(name, [0, 0, 0, {}])
+        stats[0] += 1
+        stats[1] += lo
+        stats[2] += hi
+        first = stats[3].setdefault(gender, [0, line])
+        first[0] += 1
+        first[1] = min(first[1], line)
+
+    return names
+
+
+def merge_casting_stats(into, stats):
+    into[0] += stats[0]
+    into[1] += stats[1]
+    into[2] += stats[2]
+    for gender, (count, line) in stats[3].items():
+        first = into[3].setdefault(gender, [0, line])
+        first[0] += count
+        first[1] = min(first[1], line)
+    return into
+
+
+def aggregate_casting_stats(stats):
+    count, sum_lo, sum_hi, genders = stats
+    mode_gender = min(genders.items(), key=lambda x: (-x[1][0], x[1][1]))[0]
+    return casting_range(mode_gender, sum_lo / count, sum_hi / count)
+
+
+class CastingIndex:
+    _path = None
+    _sources = {}
+    _active = set()
+
+    def __init__(self, path=None):
+        self._path = path
+        self._sources = {}
+        self._active = set()
+
+        if path is not None and os.path.isfile(path):
+            try:
+                with open(path, 'r') as file:
+                    data = json.load(file)
+                if data.get('version') == CASTING_INDEX_VERSION:
+                    self._sources = data['sources']
+            except Exception:
+                pass
+
+    def update(self, signatures):
+        # signatures as from utils.file_signatures, the sources to aggregate from now on; returns the
+        # number of sources (re)indexed and the paths of cached sources pruned as missing on disk
+        pruned = [p for p, s in self._sources.items() if s['size'] is not None and p not in signatures and not os.path.isfile(p)]
+        for p in pruned:
+            del self._sources[p]
+
+        self._active = set(signatures)
+        indexed = 0
+        for path, (size, mtime_ns) in signatures.items():
+            known = self._sources.get(path)
+            if known is not None and known['size'] == size and known['mtime_ns'] == mtime_ns:
+                continue
+
+            with open(path, 'r') as file:
+                self._sources[path] = {'size': size, 'mtime_ns': mtime_ns, 'names': casting_stats(file)}
+            indexed += 1
+
+        return indexed, pruned
+
+    def add_lines(self, lines, source=''):
+        # lines not backed by a file are aggregated but never persisted
+        self._sources[source] = {'size': None, 'mtime_ns': None, 'names': casting_stats(lines)}
+        self._active.add(source)
+
+    def active_sources(self):
+        return [self._sources[p] for p in self._active if p in self._sources]
+
+    def names(self):
+        return set(n for s in self.active_sources() for n in s['names'])
+
+    def stats(self, name):
+        key = name.strip().lower()
+        found = [s['names'][key] for s in self.active_sources() if key in s['names']]
+        if len(found) == 0:
+            return None
+
+        merged = [0, 0, 0, {}]
+        for stats in found:
+            merge_casting_stats(merged, stats)
+        return merged
+
+    def save(self):
+        if self._path is None:
+            return
+
+        directory = os.path.dirname(self._path)
+        if directory != '' and not os.path.isdir(directory):
+            os.makedirs(directory)
+
+        tmp_path = f'{self._path}.tmp'
+        with open(tmp_path, 'w') as file:
+            json.dump({'version': CASTING_INDEX_VERSION, 'sources': {p: s for p, s in self._sources.items() if s['size'] is not None}}, file)
+        os.replace(tmp_path, self._path)
+
+
+@metrics_stage('castings', rows_in=lambda characters, index: len(characters), rows_out=len)
+def index_character_castings(characters, index):
+    # map_characters_to_castings and aggregate_castings in one, looking characters up in a CastingIndex;
+    # returns the same (character, nicknames, ignore, gender, lo, hi) tuples
+    aggregated = []
+    for ch in characters:
+        character, nicknames, ignore = parse_character_line(ch)
+        stats = index.stats(character)
+        if stats is not None:
+            aggregated.append((character, nicknames, ignore, *aggregate_casting_stats(stats)))
+
+    return aggregated
@@ -1,10 +1,11 @@
 from statistics import mean, mode
-from fuzzywuzzy import fuzz as fzw
+from functools import lru_cache
 import re
 import json
-from docx import Document
 import os
-from utils import round_nearest, tbl_contains_all_fields
+from pft.castings import casting_range, parse_casting_line, parse_character_line
+from utils import tbl_contains_all_fields
+from debug.metrics import metrics_count, metrics_stage
 
 
 # ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
@@ -31,6 +32,14 @@ SPEAKER_VARIATION_WORDS = [
     ' +mind +voice',
     ' +reading'
 ]
+SPEAKER_GLOB_WORDS = [
+    'everyone',
+    'multiple',
+    'multiple +voice',
+    'multiple +voices'
+]
+SPEAKER_RULES_CACHE_SIZE = 16
+SPEAKER_CLASSIFY_CACHE_SIZE = 4096
 
 # ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
 #  @SECTION: Characters & Castings
@@ -42,28 +51,20 @@ def aggregate_castings(data):
     for d in data:
         character = d[0]
         if len(d[3]) > 0:
-            mode_gender = mode([x[0] for x in d[3]])
-            avg_lo = round_nearest(mean([x[1] for x in d[3]]), 5)
-            avg_hi = round_nearest(mean([x[2] for x in d[3]]), 5)
-            if avg_lo >= avg_hi:
-                age_dt = 5 if (mode_gender.upper() == 'M' or mode_gender.upper() == 'F') else 3
-                avg_lo = avg_hi - age_dt
-            aggregated.append((character, list.copy(d[1]), list.copy(d[2]), mode_gender.upper(), int(avg_lo), int(avg_hi)))
+            casting = casting_range(mode([x[0] for x in d[3]]), mean([x[1] for x in d[3]]), mean([x[2] for x in d[3]]))
+            aggregated.append((character, list.copy(d[1]), list.copy(d[2]), *casting))
 
     return aggregated
 
 
 def extract_variation_word(speaker):
-    cleaned_speaker = speaker.lower().strip()
-
-    for v in SPEAKER_VARIATION_WORDS:
-        if re.search(f"{v}", cleaned_speaker) is not None:
-            return v
-
-    return None
+    return speaker_rules().classify(speaker)[1]
 
 
+@metrics_stage('aliases', rows_in=lambda targets, names_list, *args, **kwargs: len(names_list), rows_out=len)
 def find_speaker_aliases(targets, names_list, ratio=LEVENSHTEIN_DT_DEFAULT):
+    from fuzzywuzzy import fuzz as fzw
+
     data = []
     for t in targets:
         collect = []
@@ -71,6 +72,7 @@ def find_speaker_aliases(targets, names_list, ratio=LEVENSHTEIN_DT_DEFAULT):
         for n in names_list:
             alias_not_used = len([x for x in used if x.lower() == n.lower()]) == 0
             current_ratio = fzw.ratio(t.lower(), n.lower())
+            metrics_count('fuzzy_comparisons')
 
             gte_ratio = current_ratio >= ratio
             ne_current_name = t.lower() != n.lower()
@@ -93,55 +95,42 @@ def fix_tc_frame_rate(tc, fps):
 
 
 def is_globbed_speaker(speaker):
-    cleaned_speaker = speaker.lower().strip()
-    return re.search("everyone|multiple|multiple +voice|multiple +voices", cleaned_speaker) is not None
+    return speaker_rules().classify(speaker)[0]
 
 
 def is_variation_of_speaker(speaker):
-    cleaned_speaker = speaker.lower().strip()
-
-    for v in SPEAKER_VARIATION_WORDS:
-        if re.search(f"{v}", cleaned_speaker) is not None:
-            return True
-
-    return False
+    return speaker_rules().classify(speaker)[1] is not None
 
 
 def is_regular_speaker(speaker):
-    cleaned_speaker = speaker.lower().strip()
-    return not is_globbed_speaker(cleaned_speaker) and not is_variation_of_speaker(cleaned_speaker)
+    globbed, variation, _ = speaker_rules().classify(speaker)
+    return not globbed and variation is None
 
 
+@metrics_stage('castings', rows_in=lambda characters, castings: len(castings), rows_out=len)
 def map_characters_to_castings(characters, castings):
-    list.sort(castings)
+    # castings are parsed once into lists per name, in sorted line order as mode's tie-break relies on
+    by_name = {}
+    for casting in sorted(castings):
+        parsed = parse_casting_line(casting)
+        if parsed is not None:
+            by_name.setdefault(parsed[0], []).append(parsed[1:])
+
     mapping = []
     for ch in characters:
-        collect = []
-        names = ch.split("\t")
-        ignore_names = []
-        valid_names = ch.split("\t")[0].split(":")
-        if len(names) > 1:
-            ignore_names = names[1].split(":")
-
-        for casting in castings:
-            split_casting = casting.split('\t')
-            if valid_names[0].strip().lower() == split_casting[0].strip().lower():
-                casting_range = split_casting[1].split('-')
-                gender = casting_range[0][0].strip()
-                lo = int(casting_range[0][1:].strip())
-                hi = int(casting_range[1].strip())
-                collect.append((gender, lo, hi))
-        mapping.append((valid_names[0].strip(), list.copy([x.strip() for x in valid_names[1:]]), list.copy([x.strip() for x in ignore_names]), list.copy(collect)))
-        collect.clear()
+        character, nicknames, ignore = parse_character_line(ch)
+        mapping.append((character, nicknames, ignore, list(by_name.get(character.lower(), []))))
 
     return mapping
 
 
 def speaker_to_casting(speaker, config, ratio=LEVENSHTEIN_DT_DEFAULT):
+    from fuzzywuzzy import fuzz as fzw
+
     assert len(speaker) > 0, speaker
     assert 'speakers' in config
 
-    cfg_data = [x for x in config['speakers']]
+    cfg_data = config['speakers']
 
     age_casting = SPEAKER_CASTING_DEFAULT
     for entry in cfg_data:
@@ -154,10 +143,12 @@ def speaker_to_casting(speaker, config, ratio=LEVENSHTEIN_DT_DEFAULT):
         if speaker.lower() == entry['name'].lower() or speaker.lower() in nicknames:
             return entry['name'], f'{gender}{lo}-{hi}'
 
+    scored = [(x, fzw.ratio(speaker, x["name"])) for x in cfg_data]
     fuzzed_names = sorted([(x["name"],
-                            fzw.ratio(speaker, x["name"]),
-                            f'{x["casting"]["gender"]}{str(x["casting"]["lo"]).rjust(2, "0")}-{str(x["casting"]["hi"]).rjust(2, "0")}') for x in cfg_data if fzw.ratio(speaker, x["name"]) > ratio],
+                            r,
+                            f'{x["casting"]["gender"]}{str(x["casting"]["lo"]).rjust(2, "0")}-{str(x["casting"]["hi"]).rjust(2, "0")}') for x, r in scored if r > ratio],
                           reverse=True, key=lambda x: x[1])
+    metrics_count('fuzzy_comparisons', len(cfg_data))
 
     if len(fuzzed_names) > 0:
         fuzzed_name = fuzzed_names[0][0]
@@ -173,19 +164,87 @@ def speaker_to_casting(speaker, config, ratio=LEVENSHTEIN_DT_DEFAULT):
     return speaker, age_casting
 
 
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+#  @SECTION: Speaker Rules
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+
+# glob words mark a speaker cell voicing several characters and variation words a character's
+# alternative voice, e.g. 'john on phone'; both are regexes matched without case against the lowercased
+# speaker, and speaker configs may add their own under 'globs' and 'variations'
+#
+# rules are compiled into one alternation so a regular speaker is classified by a single search; rules
+# with groups, whose backreferences the alternation would renumber, and rules that cannot be nested
+# are searched on their own; only speakers a rule matches are checked rule by rule, to keep the first
+# variation word in list order winning, and the latest distinct speaker strings are classified once
+
+
+def compile_alternation(words):
+    # returns the patterns to search for any of the words: their alternation and the words it cannot hold
+    joined = []
+    alone = []
+    for x in words:
+        pattern = re.compile(x, re.IGNORECASE)
+        nestable = pattern.groups == 0
+        if nestable:
+            try:
+                re.compile(f'(?:{x})')
+            except re.error:
+                nestable = False
+
+        if nestable:
+            joined.append(x)
+        else:
+            alone.append(pattern)
+
+    return [*([re.compile('|'.join(f'(?:{x})' for x in joined), re.IGNORECASE)] if len(joined) > 0 else []), *alone]
+
+
+def search_any(patterns, text):
+    return any(x.search(text) is not None for x in patterns)
+
+
+class SpeakerRules:
+    _any = []
+    _globs = []
+    _variations = []
+
+    def __init__(self, variation_words=SPEAKER_VARIATION_WORDS, glob_words=SPEAKER_GLOB_WORDS):
+        self._any = compile_alternation([*glob_words, *variation_words])
+        self._globs = compile_alternation(glob_words)
+        self._variations = [(v, re.compile(v, re.IGNORECASE)) for v in variation_words]
+        self.classify = lru_cache(maxsize=SPEAKER_CLASSIFY_CACHE_SIZE)(self.classify)
+
+    def classify(self, speaker):
+        # returns (globbed, variation word or None, speaker without its variation word)
+        cleaned_speaker = speaker.lower().strip()
+        if not search_any(self._any, cleaned_speaker):
+            return (False, None, speaker)
+
+        globbed = search_any(self._globs, cleaned_speaker)
+        variation = next(((v, p) for v, p in self._variations if p.search(cleaned_speaker) is not None), None)
+        if variation is None:
+            return (globbed, None, speaker)
+
+        return (globbed, variation[0], variation[1].sub('', speaker.lower()).strip())
+
+
+@lru_cache(maxsize=SPEAKER_RULES_CACHE_SIZE)
+def speaker_rules_of(variations, globs):
+    return SpeakerRules([*SPEAKER_VARIATION_WORDS, *variations], [*SPEAKER_GLOB_WORDS, *globs])
+
+
+def speaker_rules(config=None):
+    # the rules of a speaker config, built once per distinct set of extra words
+    extra = {} if config is None else config
+    return speaker_rules_of(tuple(extra.get('variations', [])), tuple(extra.get('globs', [])))
+
+
 # ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
 #  @SECTION: Dubbing/ADR Script Parsing
 # ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
 
 
 def normalised_script(path, schema_path, speaker_config_path, ratio=LEVENSHTEIN_DT_DEFAULT):
-    parsed_lines = [{'id': '#',
-                     'start': 'Time IN',
-                     'end': 'Time OUT',
-                     'character': 'Character',
-                     'age': 'Actor Name',
-                     'line': 'English Subtitle'}]
-
     data = None
     config = None
     try:
@@ -194,92 +253,111 @@ def normalised_script(path, schema_path, speaker_config_path, ratio=LEVENSHTEIN_
     except Exception as e:
         raise e
 
+    return normalise_script_list(data, config, ratio)
+
+
+@metrics_stage('normalise', rows_in=lambda data, *args, **kwargs: max(0, len(data) - 1), rows_out=lambda x: len(x) - 1)
+def normalise_script_list(data, config, ratio=LEVENSHTEIN_DT_DEFAULT, casting_cache=None):
+    parsed_lines = [{'id': '#',
+                     'start': 'Time IN',
+                     'end': 'Time OUT',
+                     'character': 'Character',
+                     'age': 'Actor Name',
+                     'line': 'English Subtitle'}]
+
+    for line in data[1:]:
+        for c in normalise_script_row(line, config, ratio, casting_cache):
+            parsed_lines.append({'id': str(len(parsed_lines)), **c})
+
+    return parsed_lines
+
+
+def speaker_names(value):
+    # speaker cells list comma separated speakers, each optionally addressing someone: 'john to mary'
+    characters_raw = [SPEAKER_NAME_DEFAULT] if value.strip() == '' else [x.replace("\n", " ") for x in value.split(',') if x.strip() != '']
+    return [c[0].lower().strip() if c.strip() == '' else c.lower().split(' to ')[0].strip() for c in characters_raw]
+
+
+def canonical_speaker_name(name, rules=None):
+    return (speaker_rules() if rules is None else rules).classify(name)[2]
+
+
+def normalise_script_row(line, config, ratio=LEVENSHTEIN_DT_DEFAULT, casting_cache=None):
+    # casting_cache maps canonical speakers to their resolved (name, casting) for this config
+    rules = speaker_rules(config)
     collect = []
     additional = {}
     prev_start = ''
     prev_end = ''
 
-    data.pop(0)
-
-    for j, line in enumerate(data):
-        for title, value in line:
-            if title == 'tcin':
-                prev_start = fix_tc_frame_rate(value.strip(), '25')
-
-            if title == 'tcout':
-                prev_end = fix_tc_frame_rate(value.strip(), '25')
-
-            if title == 'speaker':
-                characters_raw = [SPEAKER_NAME_DEFAULT] if value.strip() == '' else [x.replace("\n", " ") for x in value.split(',') if x.strip() != '']
-                for c in characters_raw:
-                    names = c[0].lower().strip() if c.strip() == '' else c.lower().split(' to ')[0].strip()
-                    additional['start'] = prev_start
-                    additional['end'] = prev_end
-
-                    canonical_speaker = names
-                    if is_variation_of_speaker(names):
-                        variation_word = extract_variation_word(names)
-
-                        if variation_word is None:
-                            raise Exception("variation word could not be found")
-
-                        canonical_speaker = re.sub(variation_word.lower(), "", names.lower()).strip()
-
-                    corrected_speaker, age_range = speaker_to_casting(canonical_speaker.strip(), config)
-                    additional['character'] = corrected_speaker.upper()
-                    additional['age'] = age_range
-                    additional['line'] = ''
-                    collect.append(dict.copy(additional))
-                    additional.clear()
-
-            if title == 'line':
-                lines_raw = value.split('- ')
-                li = 0
-                glob_character_index = 0
-                for ll in lines_raw:
-                    collect_index = min(li, len(collect) - 1)
-                    current_speaker = collect[collect_index]['character']
-                    existing_line = collect[collect_index]['line']
-                    # stripped = ll.strip().replace('\n', ' ').replace("'", "").replace('"', '')
-                    stripped = "".join([x for x in ll.strip() if x not in "'\""]).replace("\n", " ")
-
-                    if existing_line == '':
-                        collect[collect_index]['line'] = f'[{current_speaker}] {stripped}'
+    for title, value in line:
+        if title == 'tcin':
+            prev_start = fix_tc_frame_rate(value.strip(), '25')
+
+        if title == 'tcout':
+            prev_end = fix_tc_frame_rate(value.strip(), '25')
+
+        if title == 'speaker':
+            for names in speaker_names(value):
+                additional['start'] = prev_start
+                additional['end'] = prev_end
+
+                canonical_speaker = canonical_speaker_name(names, rules)
+                resolved = None if casting_cache is None else casting_cache.get(canonical_speaker.strip())
+                if casting_cache is not None:
+                    metrics_count('casting_cache_misses' if resolved is None else 'casting_cache_hits')
+                if resolved is None:
+                    resolved = speaker_to_casting(canonical_speaker.strip(), config)
+                    if casting_cache is not None:
+                        casting_cache[canonical_speaker.strip()] = resolved
+
+                corrected_speaker, age_range = resolved
+                additional['character'] = corrected_speaker.upper()
+                additional['age'] = age_range
+                additional['line'] = ''
+                collect.append(dict.copy(additional))
+                additional.clear()
+
+        if title == 'line':
+            lines_raw = value.split('- ')
+            li = 0
+            glob_character_index = 0
+            for ll in lines_raw:
+                collect_index = min(li, len(collect) - 1)
+                current_speaker = collect[collect_index]['character']
+                existing_line = collect[collect_index]['line']
+                # stripped = ll.strip().replace('\n', ' ').replace("'", "").replace('"', '')
+                stripped = "".join([x for x in ll.strip() if x not in "'\""]).replace("\n", " ")
+
+                if existing_line == '':
+                    collect[collect_index]['line'] = f'[{current_speaker}] {stripped}'
+                else:
+                    if rules.classify(current_speaker)[0]:
+                        collect[glob_character_index]['line'] += f' - {stripped}'
                     else:
-                        if is_globbed_speaker(current_speaker):
-                            collect[glob_character_index]['line'] += f' - {stripped}'
-                        else:
-                            collect.append({
-                                               'start': collect[collect_index]['start'],
-                                               'end': collect[collect_index]['end'],
-                                               'character': SPEAKER_NAME_DEFAULT,
-                                               'age': SPEAKER_CASTING_DEFAULT,
-                                               'line': f'[{SPEAKER_NAME_DEFAULT}] {stripped}'
-                                           })
-
-                    li += 1
-                    if is_globbed_speaker(current_speaker):
-                        glob_character_index = collect_index
-
-                if li < len(collect):
-                    for ii in range(li, len(collect)):
-                        collect[ii]['line'] = f'[{collect[ii]["character"]}] (NO LINE)'
-
-        id_start = len(parsed_lines)
-        offset = 0
-        for i, c in enumerate(collect):
-            if re.search("\(NO LINE\)", c['line']) is not None:
-                offset -= 1
-            else:
-                parsed_lines.append({ 'id': str(id_start + i + offset), **dict.copy(c) })
-
-        collect.clear()
-        additional.clear()
+                        collect.append({
+                                           'start': collect[collect_index]['start'],
+                                           'end': collect[collect_index]['end'],
+                                           'character': SPEAKER_NAME_DEFAULT,
+                                           'age': SPEAKER_CASTING_DEFAULT,
+                                           'line': f'[{SPEAKER_NAME_DEFAULT}] {stripped}'
+                                       })
 
-    return parsed_lines
+                li += 1
+                if rules.classify(current_speaker)[0]:
+                    glob_character_index = collect_index
 
+            if li < len(collect):
+                for ii in range(li, len(collect)):
+                    collect[ii]['line'] = f'[{collect[ii]["character"]}] (NO LINE)'
 
+    return [dict.copy(c) for c in collect if re.search("\(NO LINE\)", c['line']) is None]
+
+
+@metrics_stage('parse', rows_out=len)
 def script_to_list(path, schema_path):
+    from docx import Document
+
     absolute_path = os.path.abspath(path).replace('\\', '/')
     absolute_schema = os.path.abspath(schema_path).replace('\\', '/')
     assert os.path.isfile(absolute_path), 'error: invalid path to .docx file: path is not a file'
@@ -0,0 +1,2 @@
+from .budget import *
+from .results import *
@@ -0,0 +1,186 @@
+import json
+import os
+import sys
+import concurrent.futures as cf
+from concurrent.futures.process import BrokenProcessPool
+from debug.memory import MB, RssSampler
+from debug.metrics import enable_metrics, metrics_file
+
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+#  @SECTION: Globals
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+
+
+MEMORY_HISTORY_DEFAULT = os.path.join(os.path.expanduser('~'), '.cache', 'adrtools', 'memory-history.json')
+MEMORY_HISTORY_VERSION = 1
+COST_BASE_DEFAULT = 128 * MB
+COST_PER_BYTE_DEFAULT = 24.0
+COST_WEIGHT = 0.3
+COST_FAILURE_FACTOR = 2.0
+BUDGET_POLL_SECONDS = 0.1
+
+
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+#  @SECTION: Cost Estimates
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+
+# a file is expected to peak its worker at base + per_byte * size bytes resident, where base is the
+# worker's resident size before the file and per_byte is learned per tool from past runs; files
+# seen before at the same size and mtime reuse their recorded peak
+
+
+class MemoryHistory:
+    _path = None
+    _tools = {}
+    _files = {}
+
+    def __init__(self, path=MEMORY_HISTORY_DEFAULT):
+        self._path = path
+        self._tools = {}
+        self._files = {}
+
+        if path is not None and os.path.isfile(path):
+            try:
+                with open(path, 'r') as file:
+                    data = json.load(file)
+                if data.get('version') == MEMORY_HISTORY_VERSION:
+                    self._tools = data['tools']
+                    self._files = data['files']
+            except Exception:
+                pass
+
+    def model(self, tool):
+        return self._tools.get(tool, {'base': COST_BASE_DEFAULT, 'per_byte': COST_PER_BYTE_DEFAULT})
+
+    def estimate(self, tool, path, size, mtime_ns):
+        known = self._files.get(tool, {}).get(path)
+        if known is not None and known['size'] == size and known['mtime_ns'] == mtime_ns:
+            return known['peak']
+
+        model = self.model(tool)
+        return int(model['base'] + model['per_byte'] * size)
+
+    def record(self, tool, path, size, mtime_ns, start_rss, peak_rss):
+        model = dict(self.model(tool))
+        model['base'] = (1 - COST_WEIGHT) * model['base'] + COST_WEIGHT * start_rss
+        if size > 0:
+            model['per_byte'] = (1 - COST_WEIGHT) * model['per_byte'] + COST_WEIGHT * max(0, peak_rss - start_rss) / size
+        self._tools[tool] = model
+        self._files.setdefault(tool, {})[path] = {'size': size, 'mtime_ns': mtime_ns, 'peak': peak_rss}
+
+    def record_failure(self, tool, path, size, mtime_ns, estimate):
+        # a worker died while this file was in flight; plan for a larger peak next time
+        self._files.setdefault(tool, {})[path] = {'size': size, 'mtime_ns': mtime_ns, 'peak': int(estimate * COST_FAILURE_FACTOR)}
+
+    def save(self):
+        if self._path is None:
+            return
+
+        directory = os.path.dirname(self._path)
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+        tmp_path = f'{self._path}.tmp'
+        with open(tmp_path, 'w') as file:
+            json.dump({'version': MEMORY_HISTORY_VERSION, 'tools': self._tools, 'files': self._files}, file)
+        os.replace(tmp_path, self._path)
+
+
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+#  @SECTION: Scheduling
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+
+
+def init_budget_worker(tool, metrics_channel):
+    if metrics_channel is not None:
+        enable_metrics(tool, metrics_channel)
+
+
+def run_budget_job(target, path, args):
+    sampler = RssSampler().start()
+    with metrics_file(path):
+        result = target(*args)
+    sampler.stop()
+    return result, sampler.start_rss, sampler.peak_rss
+
+
+def run_budgeted(tool, target, jobs, process_count, budget, history, collector=None, log=print, files=None):
+    # jobs are [(path, args)] run as target(*args); a job is only started while the estimated peaks of
+    # the jobs in flight, plus its own, fit the budget in bytes, but one job always runs so oversized
+    # files still complete on their own; files maps paths to utils.discover_files entries so their
+    # size and mtime are not stat'ed again; returns {path: result}, None for jobs whose worker died
+    #
+    # a killed worker breaks the whole pool without saying which job it ran, so the jobs in flight are
+    # requeued on a fresh pool to run alone; only a job whose worker dies while it runs alone is failed
+    # and has its estimate raised
+    files = {} if files is None else files
+    pending = []
+    for path, args in jobs:
+        entry = files.get(path)
+        if entry is None:
+            stat = os.stat(path)
+            entry = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+        pending.append({'path': path, 'args': args, 'size': entry['size'], 'mtime_ns': entry['mtime_ns'],
+                        'cost': history.estimate(tool, path, entry['size'], entry['mtime_ns']), 'alone': False})
+
+    # largest first, so the biggest files do not end up running alone at the end of the batch
+    pending.sort(key=lambda x: x['cost'], reverse=True)
+    results = {}
+    channel = None if collector is None else collector.channel
+
+    while len(pending) > 0:
+        in_flight = {}
+        used = 0
+        executor = cf.ProcessPoolExecutor(process_count, initializer=init_budget_worker, initargs=(tool, channel))
+        try:
+            while len(pending) > 0 or len(in_flight) > 0:
+                admitted = True
+                while admitted and len(in_flight) < process_count:
+                    admitted = False
+                    for i, job in enumerate(pending):
+                        if len(in_flight) > 0 and (job['alone'] or any(x['alone'] for x in in_flight.values())):
+                            break
+                        if len(in_flight) == 0 or used + job['cost'] <= budget:
+                            if job['cost'] > budget:
+                                log(f"{tool}: {job['path']} is estimated at {job['cost'] / MB:.0f} MB, over the budget; running it alone")
+                            in_flight[executor.submit(run_budget_job, target, job['path'], job['args'])] = job
+                            used += job['cost']
+                            pending.pop(i)
+                            admitted = True
+                            break
+
+                done, _ = cf.wait(list(in_flight.keys()), timeout=BUDGET_POLL_SECONDS, return_when=cf.FIRST_COMPLETED)
+                if collector is not None:
+                    collector.poll()
+
+                for future in done:
+                    result, start_rss, peak_rss = future.result()
+                    job = in_flight.pop(future)
+                    used -= job['cost']
+                    history.record(tool, job['path'], job['size'], job['mtime_ns'], start_rss, peak_rss)
+                    results[job['path']] = result
+
+        except BrokenProcessPool:
+            # collect whatever finished before the break, then blame or isolate the rest
+            for future, job in list(in_flight.items()):
+                if future.done() and not future.cancelled() and future.exception() is None:
+                    result, start_rss, peak_rss = future.result()
+                    history.record(tool, job['path'], job['size'], job['mtime_ns'], start_rss, peak_rss)
+                    results[job['path']] = result
+                    del in_flight[future]
+
+            if len(in_flight) == 1:
+                job = list(in_flight.values())[0]
+                print(f"{tool}: a worker died while processing {job['path']} (estimated {job['cost'] / MB:.0f} MB)", file=sys.stderr)
+                history.record_failure(tool, job['path'], job['size'], job['mtime_ns'], job['cost'])
+                results[job['path']] = None
+            elif len(in_flight) > 1:
+                log(f"{tool}: a worker died with {len(in_flight)} files in flight; retrying each of them alone")
+                pending = [{**x, 'alone': True} for x in in_flight.values()] + pending
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    if collector is not None:
+        collector.poll(drain=True)
+
+    return results
@@ -0,0 +1,152 @@
+import os
+import queue
+import sys
+import multiprocessing as mp
+from array import array
+from itertools import accumulate
+from multiprocessing import resource_tracker, shared_memory
+
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+#  @SECTION: Globals
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+
+
+RESULTS_POLL_SECONDS = 0.1
+RESULT_KINDS = {'int': 'q', 'float': 'd'}
+
+
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+#  @SECTION: Encoding
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+
+# a result is a dict of equal or unequal length columns; every column is packed into one shared memory
+# block per result and only the block's name and layout go through the queue:
+#   {'event': 'result', 'file', 'pid', 'block', 'columns': [(name, kind, count, nbytes)]}
+# 'str' columns are count int64 end offsets followed by their utf-8 bytes, 'int' and 'float' columns
+# are int64 and float64 arrays; the kind of a column is taken from its first value
+
+
+def column_kind(values):
+    if len(values) == 0 or isinstance(values[0], str):
+        return 'str'
+    return 'float' if isinstance(values[0], float) else 'int'
+
+
+def encode_column(values):
+    kind = column_kind(values)
+    if kind != 'str':
+        return kind, [array(RESULT_KINDS[kind], values).tobytes()]
+
+    encoded = [x.encode('utf-8') for x in values]
+    return kind, [array('q', accumulate(len(x) for x in encoded)).tobytes(), b''.join(encoded)]
+
+
+def decode_column(kind, count, data):
+    if kind != 'str':
+        values = array(RESULT_KINDS[kind])
+        values.frombytes(data)
+        return values.tolist()
+
+    ends = array('q')
+    ends.frombytes(data[:count * 8])
+    text = data[count * 8:]
+    return [text[a:b].decode('utf-8') for a, b in zip([0, *ends[:-1]], ends)]
+
+
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+#  @SECTION: Channel
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+
+# blocks are created by the worker and unlinked by the parent once copied out, so the worker stops
+# tracking its block; otherwise its resource tracker could remove the block before it is read
+
+
+def create_block(size):
+    try:
+        return shared_memory.SharedMemory(create=True, size=max(1, size), track=False)
+    except TypeError:
+        block = shared_memory.SharedMemory(create=True, size=max(1, size))
+        resource_tracker.unregister(block._name, 'shared_memory')
+        return block
+
+
+class ResultChannel:
+    # handed to workers by a ResultCollector
+    queue = None
+
+    def __init__(self, queue):
+        self.queue = queue
+
+    def send(self, file, columns):
+        layout = []
+        chunks = []
+        for name, values in columns.items():
+            kind, data = encode_column(list(values))
+            layout.append((name, kind, len(values), sum(len(x) for x in data)))
+            chunks.extend(data)
+
+        block = create_block(sum(len(x) for x in chunks))
+        offset = 0
+        for c in chunks:
+            block.buf[offset:offset + len(c)] = c
+            offset += len(c)
+        name = block.name
+        block.close()
+
+        self.queue.put({'event': 'result', 'file': file, 'pid': os.getpid(), 'block': name, 'columns': layout})
+
+
+def read_block(record):
+    block = shared_memory.SharedMemory(name=record['block'])
+    try:
+        columns = {}
+        offset = 0
+        for name, kind, count, nbytes in record['columns']:
+            columns[name] = decode_column(kind, count, bytes(block.buf[offset:offset + nbytes]))
+            offset += nbytes
+        return columns
+    finally:
+        block.close()
+        block.unlink()
+
+
+class ResultCollector:
+    _queue = None
+    _results = []
+
+    def __init__(self):
+        self._queue = mp.Queue()
+        self._results = []
+
+    @property
+    def channel(self):
+        return ResultChannel(self._queue)
+
+    def poll(self, timeout=0, drain=False):
+        # copies results that have arrived out of their blocks; as MetricsCollector.poll
+        while True:
+            try:
+                record = self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                if drain and not self._queue.empty():
+                    continue
+                return
+
+            try:
+                self._results.append({'file': record['file'], 'pid': record['pid'], 'columns': read_block(record)})
+            except FileNotFoundError:
+                print(f"result of {record['file']} from worker {record['pid']} was lost", file=sys.stderr)
+
+    def wait(self, pool, metrics=None):
+        # collects results while the workers run, also draining a MetricsCollector so no worker blocks
+        # on either queue; returns [{'file', 'pid', 'columns'}] in the order they arrived
+        while any(p.is_alive() for p in pool):
+            self.poll(RESULTS_POLL_SECONDS)
+            if metrics is not None:
+                metrics.poll()
+
+        for p in pool:
+            p.join()
+        self.poll(drain=True)
+
+        return self._results
@@ -1,3 +1,4 @@
+import fnmatch
 import os
 
 # ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
@@ -57,21 +58,84 @@ def file_names(path):
     return ('DEFAULT', 'PROD')
 
 
-def get_ext_files(paths, ext):
-    validated_paths = []
+def normalise_exts(ext):
+    # 'docx', '.DOCX' or a list of either, as lower-case suffixes for str.endswith
+    exts = [ext] if isinstance(ext, str) else ext
+    return tuple(f".{e.lstrip('.').lower()}" for e in exts)
+
+
+def match_globs(rel_path, patterns):
+    # patterns containing a '/' match the path relative to the searched directory, others the name
+    name = rel_path.rsplit('/', 1)[-1]
+    for pattern in patterns:
+        if fnmatch.fnmatch(rel_path if '/' in pattern else name, pattern):
+            return True
+    return False
+
+
+def discover_files(paths, ext, recursive=False, include=None, exclude=None):
+    # returns [{'path', 'size', 'mtime_ns'}] for files with one of the extensions, compared without
+    # case, in argument order and sorted by name within each directory; a file is only stat'ed once
+    # it passes the extension and glob filters, and excluded directories are not descended into;
+    # symlinked directories are not followed while recursing so link cycles cannot recurse forever
+    exts = normalise_exts(ext)
+    include = [] if include is None else include
+    exclude = [] if exclude is None else exclude
+    found = []
+    seen = set()
+
+    def accept(path, rel_path, stat):
+        if path in seen or not path.lower().endswith(exts):
+            return
+        if (len(include) > 0 and not match_globs(rel_path, include)) or match_globs(rel_path, exclude):
+            return
+        st = stat()
+        seen.add(path)
+        found.append({'path': path, 'size': st.st_size, 'mtime_ns': st.st_mtime_ns})
+
+    def walk(directory, rel_root):
+        try:
+            with os.scandir(directory) as it:
+                entries = sorted(it, key=lambda x: x.name)
+        except OSError:
+            return
+
+        for entry in entries:
+            rel_path = entry.name if rel_root == '' else f'{rel_root}/{entry.name}'
+            try:
+                if entry.is_file():
+                    accept(entry.path, rel_path, entry.stat)
+                elif recursive and entry.is_dir(follow_symlinks=False) and not match_globs(rel_path, exclude):
+                    walk(entry.path, rel_path)
+            except OSError:
+                continue
+
     for p in paths:
-        if validate_ext(p, ext):
-            f_abs = os.path.abspath(p)
-            validated_paths.append(f_abs)
-        elif os.path.isdir(p):
-            p_abs = os.path.abspath(p)
-            files_ls = os.listdir(p)
-            for ff in files_ls:
-                ff_abs = os.path.join(p_abs, ff)
-                if validate_ext(ff_abs, ext):
-                    validated_paths.append(ff_abs)
+        p_abs = os.path.abspath(p)
+        if os.path.isdir(p_abs):
+            walk(p_abs, '')
+        elif os.path.isfile(p_abs):
+            accept(p_abs, os.path.basename(p_abs), lambda: os.stat(p_abs))
 
-    return validated_paths
+    return found
+
+
+def file_signatures(paths, files=None):
+    # {path: (size, mtime_ns)}; files maps paths to discover_files entries, which are reused as is
+    files = {} if files is None else files
+    signatures = {}
+    for p in paths:
+        entry = files.get(p)
+        if entry is None:
+            stat = os.stat(p)
+            signatures[p] = (stat.st_size, stat.st_mtime_ns)
+        else:
+            signatures[p] = (entry['size'], entry['mtime_ns'])
+    return signatures
+
+
+def get_ext_files(paths, ext, recursive=False, include=None, exclude=None):
+    return [x['path'] for x in discover_files(paths, ext, recursive, include, exclude)]
 
 
 def validate_directory(path):
@@ -81,11 +145,7 @@ def validate_directory(path):
 
 
 def validate_ext(file, ext):
-    absolute = os.path.abspath(file)
-    type = os.path.splitext(os.path.basename(absolute))
-    if (os.path.isfile(absolute) and type[1] == f'.{ext}'):
-        return True
-    return False
+    return file.lower().endswith(normalise_exts(ext)) and os.path.isfile(file)
 
 
 # ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
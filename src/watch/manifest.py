@@ -0,0 +1,180 @@
+import hashlib
+import json
+import os
+import time
+
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+#  @SECTION: Globals
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+
+
+MANIFEST_NAME = '.adrtools-manifest.json'
+MANIFEST_VERSION = 1
+WATCH_INTERVAL_DEFAULT = 2.0
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+#  @SECTION: Fingerprints
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+
+
+def file_sha1(path):
+    digest = hashlib.sha1()
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def file_fingerprint(path, previous=None):
+    # the content hash is only recomputed when size or mtime moved; None for a missing file
+    try:
+        stat = os.stat(path)
+        if previous is not None and previous['size'] == stat.st_size and previous['mtime_ns'] == stat.st_mtime_ns:
+            return previous
+
+        return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha1': file_sha1(path)}
+    except FileNotFoundError:
+        return None
+
+
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+#  @SECTION: Manifest
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+
+# a job is {'input': path, 'outputs': [paths], 'deps': [paths], 'params': {...}}; every output
+# records the fingerprints of the dependencies and the parameters it was built from; a dependency
+# deleted while watching leaves its jobs stale but they are not built until it is back
+
+
+class BuildManifest:
+    _path = ''
+    _outputs = {}
+    _fingerprints = {}
+    _failed = {}
+
+    def __init__(self, path):
+        self._path = path
+        self._outputs = {}
+        self._fingerprints = {}
+        self._failed = {}
+
+        if os.path.isfile(path):
+            try:
+                with open(path, 'r') as file:
+                    data = json.load(file)
+                if data.get('version') == MANIFEST_VERSION:
+                    self._outputs = data['outputs']
+            except Exception:
+                self._outputs = {}
+
+    def begin_pass(self):
+        self._fingerprints = {}
+
+    def fingerprint(self, path, previous=None):
+        if path not in self._fingerprints:
+            self._fingerprints[path] = file_fingerprint(path, previous)
+        return self._fingerprints[path]
+
+    def is_stale(self, job):
+        for output in job['outputs']:
+            entry = self._outputs.get(output)
+            if entry is None or not os.path.isfile(output) or entry['params'] != job['params']:
+                return True
+
+            if sorted(entry['inputs'].keys()) != sorted(job['deps']):
+                return True
+
+            for dep in job['deps']:
+                previous = entry['inputs'][dep]
+                current = self.fingerprint(dep, previous)
+                if current is None or current['sha1'] != previous['sha1']:
+                    return True
+                # touched but unchanged; remember the new stat so it is not hashed again
+                entry['inputs'][dep] = current
+
+        return False
+
+    def is_missing(self, job):
+        return any(not os.path.isfile(x) for x in job['deps'])
+
+    def dep_stats(self, job):
+        try:
+            return [(s.st_size, s.st_mtime_ns) for s in [os.stat(x) for x in job['deps']]]
+        except FileNotFoundError:
+            return None
+
+    def is_failing(self, job):
+        # a failed job is not retried until one of its dependencies is touched
+        return job['input'] in self._failed and self._failed[job['input']] == self.dep_stats(job)
+
+    def snapshot(self, job):
+        # fingerprints of the dependencies as a build starts; recording them rather than fingerprints
+        # taken after the build keeps a dependency changed while it ran stale for the next pass
+        entry = self._outputs.get(job['outputs'][0]) if len(job['outputs']) > 0 else None
+        previous = {} if entry is None else entry['inputs']
+        return {x: self.fingerprint(x, previous.get(x)) for x in job['deps']}
+
+    def failed(self, job, inputs):
+        self._failed[job['input']] = None if any(x is None for x in inputs.values()) else [(x['size'], x['mtime_ns']) for x in inputs.values()]
+
+    def record(self, job, inputs):
+        if any(x is None for x in inputs.values()):
+            return
+
+        self._failed.pop(job['input'], None)
+        for output in job['outputs']:
+            self._outputs[output] = {'inputs': inputs, 'params': job['params']}
+
+    def save(self):
+        tmp_path = f'{self._path}.tmp'
+        with open(tmp_path, 'w') as file:
+            json.dump({'version': MANIFEST_VERSION, 'outputs': self._outputs}, file, indent=1)
+        os.replace(tmp_path, self._path)
+
+
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+#  @SECTION: Incremental Builds
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+
+
+def build_target(target, *args):
+    # an exception in one file must not end the pass, or a watch, for every other file
+    try:
+        return target(*args)
+    except Exception as e:
+        print(f'[!] exception was raised for file @ {args[0]}: {e}')
+        return False
+
+
+def build_stale(pool, manifest, jobs, target, target_args, record=True):
+    # target(input, *target_args) runs in the pool and returns True when its outputs were written;
+    # returns the number of stale jobs built and the jobs skipped for a missing dependency
+    manifest.begin_pass()
+    stale = []
+    missing = []
+    for job in jobs:
+        if manifest.is_missing(job):
+            missing.append(job)
+        elif manifest.is_stale(job) and not manifest.is_failing(job):
+            stale.append(job)
+
+    snapshots = [manifest.snapshot(x) for x in stale]
+    results = pool.starmap(build_target, [(target, x['input'], *target_args) for x in stale]) if len(stale) > 0 else []
+    for job, inputs, ok in zip(stale, snapshots, results):
+        if not ok:
+            manifest.failed(job, inputs)
+        elif record:
+            manifest.record(job, inputs)
+    if record:
+        manifest.save()
+
+    return len(stale), missing
+
+
+def watch(build_pass, interval=WATCH_INTERVAL_DEFAULT):
+    # polling keeps this portable; build_pass is expected to be cheap when nothing changed
+    while True:
+        build_pass()
+        time.sleep(interval)
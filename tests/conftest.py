@@ -0,0 +1,5 @@
+import os
+import sys
+
+# the packages live under src without being installed, as the cltools run them
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
@@ -0,0 +1,70 @@
+import random
+from pft import CastingIndex, aggregate_castings, index_character_castings, map_characters_to_castings
+from utils import file_signatures
+
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+#  @SECTION: Helpers
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+
+# aggregate_castings, statistics.mode and mean over every casting line, is the oracle; lines are drawn
+# from few genders and ages so gender ties and ranges rounding to the same age are common
+
+
+CHARACTERS = ['ANNA:annie:nan\tnurse', 'Ben', 'CARL', 'dina', 'ELI']
+
+
+def random_castings(count, rng):
+    lines = []
+    for _ in range(count):
+        if rng.random() < 0.05:
+            lines.append(rng.choice(['anna\n', 'ben\tX-\n', 'carl\tM3x-40\n', '\n']))
+            continue
+        lo = rng.randrange(5, 60)
+        name = rng.choice(['anna', 'Anna', 'BEN', 'carl ', 'dina'])
+        lines.append(f"{name}\t{rng.choice(['M', 'F', 'B'])}{lo}-{lo + rng.randrange(0, 12)}\n")
+    return lines
+
+
+def write_sources(tmp_path, sources):
+    paths = []
+    for i, lines in enumerate(sources):
+        path = tmp_path / f'ep{i:02}.castings'
+        path.write_text(''.join(lines))
+        paths.append(str(path))
+    return paths
+
+
+def oracle(sources):
+    return aggregate_castings(map_characters_to_castings(CHARACTERS, [x for lines in sources for x in lines]))
+
+
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+#  @SECTION: Casting Index
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+
+
+def test_index_matches_mode_and_mean(tmp_path):
+    for seed in range(30):
+        rng = random.Random(seed)
+        sources = [random_castings(rng.randrange(1, 40), rng) for _ in range(4)]
+        index = CastingIndex()
+        index.update(file_signatures(write_sources(tmp_path, sources[:3])))
+        index.add_lines(sources[3], 'episode')
+        assert index_character_castings(CHARACTERS, index) == oracle(sources)
+
+
+def test_persisted_index(tmp_path):
+    rng = random.Random(1)
+    sources = [random_castings(30, rng) for _ in range(3)]
+    paths = write_sources(tmp_path, sources)
+
+    index = CastingIndex(str(tmp_path / 'index' / 'castings.json'))
+    assert index.update(file_signatures(paths)) == (3, [])
+    index.save()
+
+    # a reloaded index reads only the source that changed, and leaves out sources not given to it
+    sources[1] = random_castings(30, rng)
+    (tmp_path / 'ep01.castings').write_text(''.join(sources[1]))
+    index = CastingIndex(str(tmp_path / 'index' / 'castings.json'))
+    assert index.update(file_signatures(paths[:2])) == (1, [])
+    assert index_character_castings(CHARACTERS, index) == oracle(sources[:2])
@@ -0,0 +1,98 @@
+import random
+from cues import CONFLICT_KINDS, find_conflicts
+
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+#  @SECTION: Oracle
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+
+# pairwise and tick-by-tick checks, quadratic but plainly correct; cues are drawn on a coarse grid so
+# starts, ends and zero length cues collide often
+
+
+def random_cues(count, seed):
+    rng = random.Random(seed)
+    cues = []
+    for i in range(count):
+        start = rng.randrange(0, 60) * 1000
+        cues.append({
+                        'start': start,
+                        'end': start + rng.randrange(0, 12) * 1000,
+                        'character': rng.choice(['ANNA', ' ANNA', 'BEN', 'CARL', 'DINA', 'UNKNOWN']),
+                        'actor': 'ADULT',
+                        'line': f'line {i}',
+                    })
+    return cues
+
+
+def brute_overlaps(cues, kept):
+    overlaps = []
+    for a in kept:
+        for b in kept:
+            x, y = cues[a], cues[b]
+            if a < b and x['character'].strip() == y['character'].strip() and max(x['start'], y['start']) < min(x['end'], y['end']):
+                overlaps.append(('overlap', max(x['start'], y['start']), min(x['end'], y['end']), (x['character'].strip(),), (a, b)))
+    return overlaps
+
+
+def brute_crowds(cues, kept, max_speakers):
+    # every stretch between two consecutive cue boundaries either is crowded or is not
+    ticks = sorted({t for i in kept for t in [cues[i]['start'], cues[i]['end']]})
+    crowded = []
+    for t, u in zip(ticks, ticks[1:]):
+        speaking = {cues[i]['character'].strip() for i in kept if cues[i]['start'] <= t < cues[i]['end']}
+        if len(speaking) > max_speakers:
+            if len(crowded) > 0 and crowded[-1][1] == t:
+                crowded[-1][1] = u
+            else:
+                crowded.append([t, u])
+
+    regions = []
+    for start, end in crowded:
+        running = [i for i in kept if cues[i]['start'] < end and cues[i]['end'] > start and cues[i]['end'] > cues[i]['start']]
+        regions.append(('crowd', start, end, tuple(sorted({cues[i]['character'].strip() for i in running})), tuple(sorted(running))))
+    return regions
+
+
+def brute_conflicts(cues, max_speakers, run_end, ignore):
+    kept = [i for i, x in enumerate(cues) if x['character'].strip() not in ignore]
+    conflicts = brute_overlaps(cues, kept) + brute_crowds(cues, kept, max_speakers)
+    if run_end is not None:
+        conflicts.extend(('overrun', cues[i]['start'], cues[i]['end'], (cues[i]['character'].strip(),), (i,)) for i in kept if cues[i]['end'] > run_end)
+    return sorted(conflicts)
+
+
+def conflict_tuples(conflicts):
+    return sorted((x['kind'], x['start'], x['end'], tuple(x['characters']), tuple(sorted(x['cues']))) for x in conflicts)
+
+
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+#  @SECTION: Sweeps
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+
+
+def test_sweeps_match_pairwise_checks():
+    for seed in range(40):
+        cues = random_cues(60, seed)
+        for max_speakers in [1, 2, 3]:
+            conflicts = find_conflicts(cues, max_speakers, 50 * 1000, ['UNKNOWN'], start=0)
+            assert conflict_tuples(conflicts) == brute_conflicts(cues, max_speakers, 50 * 1000, ['UNKNOWN'])
+            assert conflicts == sorted(conflicts, key=lambda x: (x['start'], CONFLICT_KINDS.index(x['kind'])))
+
+
+def test_touching_cues_do_not_conflict():
+    cues = [
+        {'start': 0, 'end': 5000, 'character': 'ANNA', 'actor': 'ADULT', 'line': 'a'},
+        {'start': 5000, 'end': 9000, 'character': 'ANNA', 'actor': 'ADULT', 'line': 'b'},
+        {'start': 5000, 'end': 9000, 'character': 'BEN', 'actor': 'ADULT', 'line': 'c'},
+        {'start': 0, 'end': 5000, 'character': 'CARL', 'actor': 'ADULT', 'line': 'd'},
+    ]
+    assert find_conflicts(cues, 2, 9000, start=0) == []
+
+
+def test_crowd_does_not_take_cues_starting_as_it_ends():
+    cues = [
+        {'start': 0, 'end': 5000, 'character': 'ANNA', 'actor': 'ADULT', 'line': 'a'},
+        {'start': 0, 'end': 5000, 'character': 'BEN', 'actor': 'ADULT', 'line': 'b'},
+        {'start': 5000, 'end': 9000, 'character': 'CARL', 'actor': 'ADULT', 'line': 'c'},
+    ]
+    assert conflict_tuples(find_conflicts(cues, 1)) == [('crowd', 0, 5000, ('ANNA', 'BEN'), (0, 1))]
@@ -0,0 +1,178 @@
+import json
+import os
+import stat
+import struct
+from fractions import Fraction
+from cltools.mediaruntime import probe_paths
+from media import MXF_INDEX_SEGMENT_KEY, MXF_PARTITION_PACK_KEY, read_mxf_runtime, read_native_runtime
+
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+#  @SECTION: Builders
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+
+# minimal containers holding only what the header readers look at; payloads are left out, as the
+# readers take run-times from the headers and never read media data
+
+
+def write_file(tmp_path, name, data):
+    path = tmp_path / name
+    path.write_bytes(data)
+    return str(path)
+
+
+def mp4_box(box_type, payload=b''):
+    return struct.pack('>I4s', 8 + len(payload), box_type) + payload
+
+
+def mp4_file(timescale, stts, handler=b'vide'):
+    mdhd = mp4_box(b'mdhd', struct.pack('>IIIII', 0, 0, 0, timescale, sum(x[0] * x[1] for x in stts)))
+    hdlr = mp4_box(b'hdlr', struct.pack('>II4s', 0, 0, handler) + bytes(12))
+    stts_box = mp4_box(b'stts', struct.pack('>II', 0, len(stts)) + b''.join(struct.pack('>II', *x) for x in stts))
+    minf = mp4_box(b'minf', mp4_box(b'stbl', stts_box))
+    moov = mp4_box(b'moov', mp4_box(b'trak', mp4_box(b'mdia', mdhd + hdlr + minf)))
+    return mp4_box(b'ftyp', b'isom' + bytes(4)) + moov + mp4_box(b'mdat')
+
+
+def wav_chunk(chunk_id, payload, size=None):
+    return struct.pack('<4sI', chunk_id, len(payload) if size is None else size) + payload + (b'\x00' if len(payload) & 1 else b'')
+
+
+def wav_file(sample_rate, block_align, data_size, time_reference=None, rf64=False):
+    fmt = wav_chunk(b'fmt ', struct.pack('<HHIIHH', 1, block_align // 3, sample_rate, sample_rate * block_align, block_align, 24))
+    bext = b'' if time_reference is None else wav_chunk(b'bext', bytes(338) + struct.pack('<Q', time_reference) + bytes(256))
+    if not rf64:
+        return b'RIFF' + struct.pack('<I', 0) + b'WAVE' + fmt + bext + wav_chunk(b'data', bytes(data_size))
+
+    # the data itself is left out; its size is only given by ds64
+    ds64 = wav_chunk(b'ds64', struct.pack('<QQQI', 0, data_size, data_size // block_align, 0))
+    return b'RF64' + struct.pack('<I', 0xFFFFFFFF) + b'WAVE' + ds64 + fmt + bext + struct.pack('<4sI', b'data', 0xFFFFFFFF)
+
+
+def mxf_klv(key, value):
+    return key + bytes([0x83]) + len(value).to_bytes(3, 'big') + value
+
+
+def mxf_partition(kind, this, previous, footer, header_bytes, index_bytes):
+    key = MXF_PARTITION_PACK_KEY + bytes([kind, 0x04, 0x00, 0x00])
+    return mxf_klv(key, struct.pack('>HHIQQQQQQIQI', 1, 3, 1, this, previous, footer, header_bytes, index_bytes, 0, 0, 0, 0))
+
+
+def mxf_index_segment(edit_rate, start, duration, sid):
+    local_set = b''.join(struct.pack('>HH', tag, len(value)) + value for tag, value in [
+        (0x3F0B, struct.pack('>ii', edit_rate.numerator, edit_rate.denominator)),
+        (0x3F0C, struct.pack('>q', start)),
+        (0x3F0D, struct.pack('>q', duration)),
+        (0x3F06, struct.pack('>I', sid)),
+    ])
+    return mxf_klv(MXF_INDEX_SEGMENT_KEY, local_set)
+
+
+def mxf_file(edit_rate, durations, run_in=b''):
+    # header metadata in the header partition, one index segment per duration in the footer
+    metadata = mxf_klv(bytes.fromhex('060e2b34025301010d01010101012f00'), bytes(32))
+    header_size = len(mxf_partition(0x02, 0, 0, 0, 0, 0)) + len(metadata)
+    footer_offset = header_size
+    index = b''.join(mxf_index_segment(edit_rate, sum(durations[:i]), d, 1) for i, d in enumerate(durations))
+
+    header = mxf_partition(0x02, 0, 0, footer_offset, len(metadata), 0) + metadata
+    footer = mxf_partition(0x04, footer_offset, 0, footer_offset, 0, len(index)) + index
+    return run_in + header + footer
+
+
+def fake_ffprobe(tmp_path, monkeypatch, output):
+    bin_path = tmp_path / 'bin'
+    bin_path.mkdir(exist_ok=True)
+    script = bin_path / 'ffprobe'
+    script.write_text(f'#!/bin/sh\ncat <<\'EOF\'\n{output}\nEOF\n')
+    script.chmod(script.stat().st_mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+    monkeypatch.setenv('PATH', f'{bin_path}{os.pathsep}{os.environ.get("PATH", "")}')
+
+
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+#  @SECTION: Native Readers
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+
+
+def test_mp4_constant_frame_rate(tmp_path):
+    path = write_file(tmp_path, 'clip.mp4', mp4_file(24000, [(240, 1001)]))
+    assert read_native_runtime(path) == {'frames': 240, 'fps': Fraction(24000, 1001), 'start_frames': None}
+
+
+def test_mp4_variable_frame_rate(tmp_path):
+    path = write_file(tmp_path, 'clip.mov', mp4_file(25, [(100, 1), (50, 1)]))
+    assert read_native_runtime(path) == {'frames': 150, 'fps': Fraction(25), 'start_frames': None}
+
+
+def test_mp4_without_video_track(tmp_path):
+    path = write_file(tmp_path, 'clip.mp4', mp4_file(48000, [(10, 1024)], handler=b'soun'))
+    assert read_native_runtime(path) is None
+
+
+def test_wav(tmp_path):
+    path = write_file(tmp_path, 'mix.wav', wav_file(48000, 6, 48000 * 6 * 2))
+    assert read_native_runtime(path, 25) == {'frames': 50, 'fps': Fraction(25), 'start_frames': None}
+
+
+def test_bwf_time_reference(tmp_path):
+    path = write_file(tmp_path, 'mix.wav', wav_file(48000, 6, 48000 * 6 * 2, time_reference=48000 * 3600 * 10))
+    assert read_native_runtime(path, 25)['start_frames'] == 25 * 3600 * 10
+
+
+def test_rf64_ds64_data_size(tmp_path):
+    # three hours of 96kHz 24-bit stereo, more than a RIFF size field holds
+    data_size = 96000 * 6 * 10800
+    path = write_file(tmp_path, 'mix.wav', wav_file(96000, 6, data_size, time_reference=96000 * 3600, rf64=True))
+    assert data_size > 0xFFFFFFFF
+    assert read_native_runtime(path, 25) == {'frames': 25 * 10800, 'fps': Fraction(25), 'start_frames': 25 * 3600}
+
+
+def test_mxf_index_segments(tmp_path):
+    path = write_file(tmp_path, 'clip.mxf', mxf_file(Fraction(25), [1000, 500]))
+    assert read_native_runtime(path) == {'frames': 1500, 'fps': Fraction(25), 'start_frames': None}
+
+
+def test_mxf_run_in(tmp_path):
+    path = write_file(tmp_path, 'clip.mxf', mxf_file(Fraction(30000, 1001), [900], run_in=bytes(64)))
+    assert read_mxf_runtime(path) == {'frames': 900, 'fps': Fraction(30000, 1001), 'start_frames': None}
+
+
+def test_unknown_container(tmp_path):
+    path = write_file(tmp_path, 'clip.mov', bytes(64))
+    assert read_native_runtime(path) is None
+
+
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+#  @SECTION: ffprobe Fallback
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+
+
+def test_ffprobe_fallback(tmp_path, monkeypatch):
+    fake_ffprobe(tmp_path, monkeypatch, json.dumps({'streams': [{'duration': '10.000000', 'r_frame_rate': '25/1'}]}))
+    native = write_file(tmp_path, 'clip.mp4', mp4_file(25, [(100, 1)]))
+    unknown = write_file(tmp_path, 'clip.mov', bytes(64))
+    cache = {}
+
+    results = probe_paths([native, unknown], jobs=1, cache=cache)
+    assert results[native]['frames'] == 100
+    assert results[unknown] == {'frames': 250, 'fps': '25', 'tc': '00:00:10:00', 'start_tc': None}
+    # only probed run-times are cached, native reads are cheap enough to repeat
+    assert list(cache.keys()) == [unknown]
+
+
+def test_ffprobe_forced(tmp_path, monkeypatch):
+    fake_ffprobe(tmp_path, monkeypatch, json.dumps({'streams': [{'duration': '2.0', 'r_frame_rate': '24000/1001'}]}))
+    path = write_file(tmp_path, 'clip.mp4', mp4_file(25, [(100, 1)]))
+
+    results = probe_paths([path], jobs=1, native=False)
+    assert results[path]['frames'] == 48
+    assert results[path]['fps'] == '24000/1001'
+
+
+def test_ffprobe_without_video_stream(tmp_path, monkeypatch):
+    fake_ffprobe(tmp_path, monkeypatch, json.dumps({'streams': []}))
+    path = write_file(tmp_path, 'clip.mov', bytes(64))
+    cache = {}
+
+    results = probe_paths([path], jobs=1, cache=cache)
+    assert isinstance(results[path], Exception)
+    assert cache == {}
@@ -0,0 +1,93 @@
+import bisect
+import random
+from chrono import TICKS_MAX_GAP
+from cues import analyse_gaps
+
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+#  @SECTION: Oracle
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+
+# a plain loop over the cues in start order, keeping the latest end so far; cues are drawn on a coarse
+# grid so overlaps, touching cues and gaps of a frame or two are common
+
+
+def random_cues(count, seed):
+    rng = random.Random(seed)
+    cues = []
+    for i in range(count):
+        start = rng.randrange(10, 400) * 1000
+        cues.append({
+                        'start': start,
+                        'end': start + rng.randrange(0, 30) * 1000,
+                        'character': rng.choice(['ANNA', 'ANNA ', 'BEN', 'CARL']),
+                        'actor': 'ADULT',
+                        'line': f'line {i}',
+                    })
+    return cues
+
+
+def loop_gaps(spans):
+    gaps = []
+    latest = None
+    for start, end in sorted(spans, key=lambda x: x[0]):
+        if latest is not None and start > latest:
+            gaps.append((latest, start))
+        latest = end if latest is None else max(latest, end)
+    return gaps
+
+
+def loop_analysis(cues, start, end, edges):
+    characters = sorted({x['character'].strip() for x in cues})
+    gaps = []
+    histograms = {}
+    for name in characters:
+        found = loop_gaps([(x['start'], x['end']) for x in cues if x['character'].strip() == name])
+        gaps.extend((name, s, e, e - s <= TICKS_MAX_GAP) for s, e in found)
+        histograms[name] = loop_histogram([e - s for s, e in found], edges)
+
+    silences = loop_gaps([(x['start'], x['end']) for x in cues])
+    first = min(x['start'] for x in cues)
+    last = max(x['end'] for x in cues)
+    silences = ([(start, first)] if start < first else []) + silences + ([(last, end)] if end > last else [])
+
+    return sorted(gaps), silences, histograms, loop_histogram([e - s for s, e in silences], edges)
+
+
+def loop_histogram(lengths, edges):
+    counts = [0] * (len(edges) - 1)
+    for x in lengths:
+        counts[bisect.bisect_right(edges, x) - 1] += 1
+    return counts
+
+
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+#  @SECTION: Gaps
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+
+
+def test_gaps_match_loop():
+    for seed in range(40):
+        cues = random_cues(80, seed)
+        analysis = analyse_gaps(cues, start=0, end=450 * 1000)
+        gaps, silences, histograms, silence_histogram = loop_analysis(cues, 0, 450 * 1000, analysis['edges'])
+
+        assert sorted((x['character'], x['start'], x['end'], x['shared']) for x in analysis['gaps']) == gaps
+        assert all(x['length'] == x['end'] - x['start'] > 0 for x in analysis['gaps'] + analysis['silences'])
+        assert [(x['start'], x['end']) for x in analysis['silences']] == silences
+        assert analysis['histograms'] == histograms
+        assert analysis['silence_histogram'] == silence_histogram
+
+
+def test_programme_bounds_inside_the_cues():
+    cues = [
+        {'start': 10000, 'end': 20000, 'character': 'ANNA', 'actor': 'ADULT', 'line': 'a'},
+        {'start': 30000, 'end': 40000, 'character': 'BEN', 'actor': 'ADULT', 'line': 'b'},
+    ]
+    analysis = analyse_gaps(cues, start=15000, end=35000)
+    assert [(x['start'], x['end']) for x in analysis['silences']] == [(20000, 30000)]
+    assert analysis['gaps'] == []
+
+
+def test_no_cues():
+    analysis = analyse_gaps([], start=0, end=1000)
+    assert (analysis['gaps'], analysis['silences'], analysis['histograms']) == ([], [], {})
@@ -0,0 +1,89 @@
+from multiprocessing.dummy import Pool
+from watch import BuildManifest, build_stale
+
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+#  @SECTION: Helpers
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+
+# jobs run on a thread pool so targets can be plain closures; each build copies its input to its output
+
+
+def copy_target(builds, edits=None):
+    def target(path):
+        builds.append(path)
+        with open(path, 'r') as file:
+            text = file.read()
+        with open(f'{path}.out', 'w') as file:
+            file.write(text)
+        # a dependency written to while its build runs, e.g. a script still being copied in
+        if edits is not None and path in edits:
+            with open(edits.pop(path), 'a') as file:
+                file.write(' and more')
+        return True
+    return target
+
+
+def jobs_of(paths, deps=[]):
+    return [{'input': p, 'outputs': [f'{p}.out'], 'deps': [p, *deps], 'params': {}} for p in paths]
+
+
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+#  @SECTION: Builds
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+
+
+def test_unchanged_outputs_are_not_rebuilt(tmp_path):
+    script = tmp_path / 'ep01.txt'
+    script.write_text('line')
+    manifest = BuildManifest(str(tmp_path / 'manifest.json'))
+    builds = []
+
+    with Pool(1) as pool:
+        assert build_stale(pool, manifest, jobs_of([str(script)]), copy_target(builds), ())[0] == 1
+        assert build_stale(pool, manifest, jobs_of([str(script)]), copy_target(builds), ())[0] == 0
+
+    assert builds == [str(script)]
+
+
+def test_input_changed_during_a_new_build(tmp_path):
+    script = tmp_path / 'ep01.txt'
+    script.write_text('line')
+    manifest = BuildManifest(str(tmp_path / 'manifest.json'))
+    builds = []
+
+    with Pool(1) as pool:
+        build_stale(pool, manifest, jobs_of([str(script)]), copy_target(builds, {str(script): str(script)}), ())
+        assert build_stale(pool, manifest, jobs_of([str(script)]), copy_target(builds), ())[0] == 1
+
+    assert (tmp_path / 'ep01.txt.out').read_text() == 'line and more'
+
+
+def test_later_dependency_changed_during_a_rebuild(tmp_path):
+    script = tmp_path / 'ep01.txt'
+    schema = tmp_path / 'schema.json'
+    config = tmp_path / 'speakers.json'
+    for path, text in [(script, 'line'), (schema, '{}'), (config, '{}')]:
+        path.write_text(text)
+    manifest = BuildManifest(str(tmp_path / 'manifest.json'))
+    jobs = jobs_of([str(script)], [str(schema), str(config)])
+    builds = []
+
+    with Pool(1) as pool:
+        build_stale(pool, manifest, jobs, copy_target(builds), ())
+        # the script makes the job stale, and the config, checked after it, changes while it rebuilds
+        script.write_text('new line')
+        build_stale(pool, manifest, jobs, copy_target(builds, {str(script): str(config)}), ())
+        assert build_stale(pool, manifest, jobs, copy_target(builds), ())[0] == 1
+
+
+def test_missing_dependency_skips_the_job(tmp_path):
+    script = tmp_path / 'ep01.txt'
+    script.write_text('line')
+    manifest = BuildManifest(str(tmp_path / 'manifest.json'))
+    jobs = jobs_of([str(script)], [str(tmp_path / 'speakers.json')])
+    builds = []
+
+    with Pool(1) as pool:
+        built, missing = build_stale(pool, manifest, jobs, copy_target(builds), ())
+
+    assert (built, missing, builds) == (0, jobs, [])
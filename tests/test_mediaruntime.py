@@ -0,0 +1,115 @@
+import json
+import os
+import stat
+from cltools.mediaruntime import probe_paths
+
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+#  @SECTION: Builders
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+
+# the stub ffprobe prints the contents of the file it is given, so every fake media file holds its own
+# probe result; each call is logged along with the number of stubs running when it started
+
+STUB_FFPROBE = """#!/bin/sh
+for path; do :; done
+touch "$STUB_LOG/running/$$"
+ls "$STUB_LOG/running" | wc -l >> "$STUB_LOG/concurrency"
+echo "$path" >> "$STUB_LOG/calls"
+sleep 0.2
+rm "$STUB_LOG/running/$$"
+case "$(head -c 4 "$path")" in
+    fail) echo '{}'; echo "$path: Invalid data found when processing input" >&2; exit 1 ;;
+esac
+cat "$path"
+"""
+
+
+def stub_ffprobe(tmp_path, monkeypatch):
+    bin_path = tmp_path / 'bin'
+    log_path = tmp_path / 'log'
+    (log_path / 'running').mkdir(parents=True)
+    bin_path.mkdir()
+    script = bin_path / 'ffprobe'
+    script.write_text(STUB_FFPROBE)
+    script.chmod(script.stat().st_mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+    monkeypatch.setenv('PATH', f'{bin_path}{os.pathsep}{os.environ.get("PATH", "")}')
+    monkeypatch.setenv('STUB_LOG', str(log_path))
+    return log_path
+
+
+def stub_calls(log_path):
+    calls = log_path / 'calls'
+    return calls.read_text().splitlines() if calls.is_file() else []
+
+
+def media_file(tmp_path, name, duration, frame_rate):
+    path = tmp_path / name
+    path.write_text(json.dumps({'streams': [{'duration': duration, 'r_frame_rate': frame_rate}]}))
+    return str(path)
+
+
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+#  @SECTION: Probing
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+
+
+def test_concurrency_limit(tmp_path, monkeypatch):
+    log_path = stub_ffprobe(tmp_path, monkeypatch)
+    paths = [media_file(tmp_path, f'clip{i}.mov', '1.000000', '25/1') for i in range(6)]
+
+    results = probe_paths(paths, jobs=2, native=False)
+    assert all(results[p]['frames'] == 25 for p in paths)
+    assert sorted(stub_calls(log_path)) == sorted(paths)
+    assert max(int(x) for x in (log_path / 'concurrency').read_text().split()) == 2
+
+
+def test_cache_hits_keyed_on_size_and_mtime(tmp_path, monkeypatch):
+    log_path = stub_ffprobe(tmp_path, monkeypatch)
+    touched = media_file(tmp_path, 'touched.mov', '1.000000', '25/1')
+    resized = media_file(tmp_path, 'resized.mov', '1.000000', '25/1')
+    kept = media_file(tmp_path, 'kept.mov', '1.000000', '25/1')
+    cache = {}
+
+    probe_paths([touched, resized, kept], jobs=1, cache=cache, native=False)
+    assert len(stub_calls(log_path)) == 3
+    probe_paths([touched, resized, kept], jobs=1, cache=cache, native=False)
+    assert len(stub_calls(log_path)) == 3
+
+    # same size with a new mtime, and a new size with the old mtime, are both probed again
+    mtime_ns = os.stat(touched).st_mtime_ns + 1000
+    os.utime(touched, ns=(mtime_ns, mtime_ns))
+    mtime_ns = os.stat(resized).st_mtime_ns
+    media_file(tmp_path, 'resized.mov', '10.000000', '25/1')
+    os.utime(resized, ns=(mtime_ns, mtime_ns))
+
+    results = probe_paths([touched, resized, kept], jobs=1, cache=cache, native=False)
+    assert sorted(stub_calls(log_path)[3:]) == sorted([touched, resized])
+    assert results[resized]['frames'] == 250
+    assert cache[touched]['mtime_ns'] == os.stat(touched).st_mtime_ns
+    assert cache[resized]['size'] == os.stat(resized).st_size
+
+
+def test_exact_frame_counts(tmp_path, monkeypatch):
+    stub_ffprobe(tmp_path, monkeypatch)
+    # ffprobe prints durations to six decimals; the frame counts are rounded from exact fractions
+    ntsc = media_file(tmp_path, 'ntsc.mov', '3599.996400', '30000/1001')
+    film = media_file(tmp_path, 'film.mov', '2.085417', '24000/1001')
+    pal = media_file(tmp_path, 'pal.mov', '5400.000000', '25/1')
+
+    results = probe_paths([ntsc, film, pal], jobs=3, native=False)
+    assert results[ntsc] == {'frames': 107892, 'fps': '30000/1001', 'tc': '00:59:56:12', 'start_tc': None}
+    assert results[film] == {'frames': 50, 'fps': '24000/1001', 'tc': '00:00:02:02', 'start_tc': None}
+    assert results[pal] == {'frames': 135000, 'fps': '25', 'tc': '01:30:00:00', 'start_tc': None}
+
+
+def test_failed_probe(tmp_path, monkeypatch):
+    stub_ffprobe(tmp_path, monkeypatch)
+    path = tmp_path / 'broken.mov'
+    path.write_text('fail')
+    cache = {}
+
+    results = probe_paths([str(path)], jobs=1, cache=cache, native=False)
+    assert isinstance(results[str(path)], Exception)
+    assert 'exited with 1' in str(results[str(path)])
+    assert 'Invalid data found' in str(results[str(path)])
+    assert cache == {}
@@ -0,0 +1,51 @@
+import multiprocessing as mp
+import os
+from scheduling import ResultCollector, decode_column, encode_column
+
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+#  @SECTION: Helpers
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+
+
+COLUMNS = {
+              'character': ['ANNA', '', 'ZOË', '角色', 'BEN\tSMITH'],
+              'count': [3, 0, -1, 2 ** 40, 7],
+              'share': [0.5, 1e-9, 0.0, -2.25, 1 / 3],
+              'empty': [],
+          }
+
+
+def shared_blocks():
+    return set(os.listdir('/dev/shm')) if os.path.isdir('/dev/shm') else set()
+
+
+def send_results(channel, files):
+    for f in files:
+        channel.send(f, {**COLUMNS, 'file': [f]})
+
+
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+#  @SECTION: Results
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+
+
+def test_columns_round_trip():
+    for values in COLUMNS.values():
+        kind, data = encode_column(values)
+        assert decode_column(kind, len(values), b''.join(data)) == values
+
+
+def test_channel_round_trip():
+    before = shared_blocks()
+    collector = ResultCollector()
+    files = [[f'ep{i:02}_{j}.docx' for j in range(4)] for i in range(3)]
+    pool = [mp.Process(target=send_results, args=(collector.channel, x)) for x in files]
+    for p in pool:
+        p.start()
+
+    results = collector.wait(pool)
+    assert sorted(x['file'] for x in results) == sorted(f for x in files for f in x)
+    assert all(x['columns'] == {**COLUMNS, 'file': [x['file']]} for x in results)
+    assert all(x['pid'] in [p.pid for p in pool] for x in results)
+    # every block was unlinked once copied out
+    assert shared_blocks() - before == set()
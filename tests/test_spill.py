@@ -0,0 +1,56 @@
+import os
+import random
+from cues import SPILL_MERGE_FAN_IN, merge_cues, merge_cues_chunked
+
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+#  @SECTION: Builders
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+
+# merge_cues is the oracle; cues come in script order with overlaps, shared starts and ignored characters
+
+
+def random_cues(count, characters, seed):
+    rng = random.Random(seed)
+    cues = []
+    for i in range(count):
+        start = rng.randrange(0, 25 * 600) * 1000
+        cues.append({
+                        'start': start,
+                        'end': start + rng.randrange(1, 25 * 4) * 1000,
+                        'character': rng.choice(characters),
+                        'actor': rng.choice(['ADULT', 'CHILD']),
+                        'line': f'line {i}',
+                    })
+    return cues
+
+
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+#  @SECTION: Chunked Merge
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+
+
+def test_chunked_merge_matches_merge_cues(tmp_path):
+    cues = random_cues(400, ['ANNA', 'BEN', 'CARL', 'UNKNOWN'], 1)
+    for chunk_rows in [1, 7, 64, 400, 1000]:
+        assert list(merge_cues_chunked(cues, chunk_rows=chunk_rows, spill_dir=str(tmp_path))) == merge_cues(cues)
+    assert os.listdir(tmp_path) == []
+
+
+def test_chunked_merge_shared_starts(tmp_path):
+    # cues starting on the same frame keep the order they came in, as the in-memory sort is stable
+    cues = [{'start': (i // 3) * 25000, 'end': (i // 3) * 25000 + 12000, 'character': 'ANNA', 'actor': 'ADULT', 'line': f'line {i}'}
+            for i in range(30)]
+    assert list(merge_cues_chunked(cues, chunk_rows=4, spill_dir=str(tmp_path))) == merge_cues(cues)
+
+
+def test_chunked_merge_more_runs_than_fan_in(tmp_path):
+    # a run per cue gives every character more segments than one k-way merge takes
+    cues = random_cues(SPILL_MERGE_FAN_IN * 2 + 50, ['ANNA', 'BEN'], 2)
+    assert list(merge_cues_chunked(cues, chunk_rows=1, spill_dir=str(tmp_path))) == merge_cues(cues)
+    assert os.listdir(tmp_path) == []
+
+
+def test_chunked_merge_more_characters_than_fan_in(tmp_path):
+    # one merged segment per character; more of them than the fan-in are grouped before the last merge
+    cues = random_cues(SPILL_MERGE_FAN_IN * 3, [f'CHAR{i}' for i in range(SPILL_MERGE_FAN_IN + 20)], 3)
+    assert list(merge_cues_chunked(cues, chunk_rows=50, spill_dir=str(tmp_path))) == merge_cues(cues)
@@ -0,0 +1,91 @@
+from cues import iter_edl_cues, iter_subtitle_cues, iter_timed_text_cues
+
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+#  @SECTION: Samples
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+
+# small hand written files with their cues worked out at 25 fps, one tick per thousandth of a frame
+
+SRT_SAMPLE = """1
+00:00:01,000 --> 00:00:02,520
+[Anna] Hello there.
+
+2
+00:00:03,040 --> 00:00:04,000
+- BEN: Who is it?
+-CARL: Only me.
+
+3
+00:00:05,000 --> 00:00:06,000
+<i>Nobody</i> &amp; nothing
+continues here"""
+
+VTT_SAMPLE = """WEBVTT
+
+NOTE written by hand
+
+intro
+00:01.000 --> 00:02.000 align:start
+<v Anna>Hi <b>Ben</b></v>
+
+01:00:00.520 --> 01:00:01.000
+<v.loud Ben Smith>Hello!
+
+00:02:00.000 --> 00:02:01.000
+"""
+
+EDL_SAMPLE = """TITLE: EP01 ADR
+FCM: NON-DROP FRAME
+
+001  AX       V     C        00:00:00:00 00:00:02:00 01:00:00:00 01:00:02:00
+* FROM CLIP NAME: ANNA: Take the road.
+002  AX       V     C        00:00:00:00 00:00:01:00 01:00:03:00 01:00:04:00
+002  BX       V     D    010 00:00:00:00 00:00:01:00 01:00:03:10 01:00:05:00
+* COMMENT: [BEN] Wait for me
+* FROM CLIP NAME: clip_b.mov
+003  AX       V     C        00:00:00:00 00:00:00:00 01:00:06:00 01:00:06:00
+* FROM CLIP NAME: CARL: Never said.
+004  AX       V     C        00:00:00:00 00:00:01:00 01:00:07:00 01:00:08:00
+* FROM CLIP NAME: clip_d.mov
+"""
+
+
+def cue(start_frames, end_frames, character, line):
+    return {'start': start_frames * 1000, 'end': end_frames * 1000, 'character': character, 'actor': 'CAST ME', 'line': line}
+
+
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+#  @SECTION: Parsers
+# ----+----+----+----+----+----+----+----+----+----+----+----+----+----+----+
+
+
+def test_srt():
+    assert list(iter_timed_text_cues(SRT_SAMPLE.splitlines(), 25)) == [
+        cue(25, 63, 'ANNA', 'Hello there.'),
+        cue(76, 100, 'BEN', 'Who is it?'),
+        cue(76, 100, 'CARL', 'Only me.'),
+        cue(125, 150, 'UNKNOWN', 'Nobody & nothing continues here'),
+    ]
+
+
+def test_vtt():
+    assert list(iter_timed_text_cues(VTT_SAMPLE.splitlines(), 25)) == [
+        cue(25, 50, 'ANNA', 'Hi Ben'),
+        cue(90013, 90025, 'BEN SMITH', 'Hello!'),
+        cue(3000, 3025, 'UNKNOWN', ''),
+    ]
+
+
+def test_edl():
+    # event 002 is a dissolve over two lines, 003 has no length and is dropped
+    assert list(iter_edl_cues(EDL_SAMPLE.splitlines(), 25)) == [
+        cue(90000, 90050, 'ANNA', 'Take the road.'),
+        cue(90075, 90125, 'BEN', 'Wait for me'),
+        cue(90175, 90200, 'UNKNOWN', 'clip_d.mov'),
+    ]
+
+
+def test_file_with_bom_and_crlf(tmp_path):
+    path = tmp_path / 'ep01.srt'
+    path.write_bytes(b'\xef\xbb\xbf' + SRT_SAMPLE.replace('\n', '\r\n').encode('utf-8'))
+    assert list(iter_subtitle_cues(str(path), 'srt', 25)) == list(iter_timed_text_cues(SRT_SAMPLE.splitlines(), 25))